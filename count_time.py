@@ -2,6 +2,7 @@ from pathlib import Path
 from pydub import AudioSegment
 import time
 from datetime import timedelta
+from crawlers.audio_check import INFO_FILE_NAME, load_audio_info as read_audio_info, recorded_duration
 
 def format_time(seconds):
     """將秒數轉換為時:分:秒格式"""
@@ -25,12 +26,20 @@ def get_audio_duration(file_path):
             print(f"無法讀取檔案 {file_path}: {error_msg}")
             return 0, True, error_msg
 
+def load_audio_info(audio_folder: Path, cache: dict):
+    """讀取爬蟲下載時記錄的 audio_info.txt（檔名 -> (時長, 大小, 修改時間)），
+    檔案之後沒被改過的才不必再解碼"""
+    if audio_folder not in cache:
+        cache[audio_folder] = read_audio_info(audio_folder.parent / INFO_FILE_NAME)
+    return cache[audio_folder]
+
 def count_audio_files(directory: Path):
     """計算目錄中所有音檔的數量和總時長"""
     total_files = 0
     total_duration = 0
     folder_stats = {}
     broken_files = []
+    info_cache = {}
 
     # 支援的音檔格式
     audio_extensions = {'.mp3', '.wav', '.m4a', '.flac', '.ogg'}
@@ -40,7 +49,11 @@ def count_audio_files(directory: Path):
     for file in directory.rglob('*'):
         if file.is_file() and file.suffix.lower() in audio_extensions:
             print(f"處理檔案: {file}")
-            duration, is_broken, error_msg = get_audio_duration(file)
+            recorded = recorded_duration(load_audio_info(file.parent, info_cache), file)
+            if recorded is not None:
+                duration, is_broken, error_msg = recorded, False, ""
+            else:
+                duration, is_broken, error_msg = get_audio_duration(file)
             total_files += 1
             total_duration += duration
             
@@ -9,9 +9,24 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import NoSuchElementException
 from .state import CREATED_FOLDERS
+from .checkpoint import Checkpoint
 from .utils import download_audio, save_label
+from .waits import wait_for_change
 from selenium.webdriver.support.ui import WebDriverWait
 
+def _word_changed_without_ch(driver, old_word):
+    """等待逾時後檢查：Ab 已換成新單字但 Ch 沒有變（兩個單字中文相同）時，
+    不要再點一次下一頁，直接用目前的 Ab 與 Ch，並留下警告方便核對。"""
+    try:
+        ab_text = driver.find_element(By.CSS_SELECTOR, "div.text > div.Ab").text.strip()
+        ch_text = driver.find_element(By.CSS_SELECTOR, "div.text > div.Ch").text.strip()
+    except NoSuchElementException:
+        return None
+    if not ab_text or ab_text == old_word:
+        return None
+    logging.warning(f"單字已換成 {ab_text}，但中文仍是 {ch_text}，請確認標註是否正確")
+    return {"value": ab_text, "fields": {"ch": ch_text}}
+
 def crawl_alphabet_words(driver, main_lang, dialect, folder_name):
     """爬取字母單字。"""
     # 先建立主題資料夾
@@ -30,57 +45,87 @@ def crawl_alphabet_words(driver, main_lang, dialect, folder_name):
         with open(label_txt, "w", encoding="utf-8") as f:
             f.write("")
     
-    # 根據現有檔案計算計數器
-    counter = len([f for f in os.listdir(audio_folder) if f.lower().endswith('.mp3')]) + 1
+    # 根據現有檔案計算計數器（有進度紀錄時接續上次的編號）
+    checkpoint = Checkpoint(topic_folder)
+    counter = checkpoint.next_file(len([f for f in os.listdir(audio_folder) if f.lower().endswith('.mp3')]) + 1)
 
+    actions = ActionChains(driver)
+    alpha_idx = 1
     while True:
-        # 1. 點擊「查看單字」按鈕
-        try:
-            view_word_btn = driver.find_element(By.CSS_SELECTOR, ".switcher.to_word")
-            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", view_word_btn)
-            actions = ActionChains(driver)
-            actions.move_to_element(view_word_btn).click().perform()
-            logging.info("已點擊「查看單字」按鈕")
-            time.sleep(1)
-        except Exception as e:
-            logging.error(f"點擊「查看單字」按鈕時出錯：{e}")
-            break
-
-        # 2. 處理單字
-        while True:
-            # 獲取單字和中文文字
+        # 以字母頁為單位記錄進度，已完成的字母頁直接翻到下一頁
+        alpha_key = f"第{alpha_idx}頁"
+        if checkpoint.is_done(alpha_key):
+            logging.info(f"字母頁 {alpha_idx} 已完成，跳過")
+        else:
+            _, counter = checkpoint.start_topic(alpha_key, label_txt, counter, fresh_label=False)
+            # 1. 點擊「查看單字」按鈕
             try:
-                ab_div = driver.find_element(By.CSS_SELECTOR, "div.text > div.Ab")
-                ch_div = driver.find_element(By.CSS_SELECTOR, "div.text > div.Ch")
-                ab_text = ab_div.text.strip()
-                ch_text = ch_div.text.strip()
-            except Exception:
-                ab_text = ""
-                ch_text = ""
+                view_word_btn = driver.find_element(By.CSS_SELECTOR, ".switcher.to_word")
+                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", view_word_btn)
+                actions = ActionChains(driver)
+                actions.move_to_element(view_word_btn).click().perform()
+                logging.info("已點擊「查看單字」按鈕")
+                time.sleep(1)
+            except Exception as e:
+                logging.error(f"點擊「查看單字」按鈕時出錯：{e}")
+                break
+
+            # 2. 處理單字
+            page_ok = True  # 有單字下載失敗就撤回整個字母頁，下次執行時重抓
+            changed = None  # 換頁時 wait_for_change 一起讀回的新單字
+            while True:
+                # 獲取單字和中文文字
+                if changed:
+                    ab_text = changed["value"] or ""
+                    ch_text = changed["fields"]["ch"] or ""
+                    changed = None
+                else:
+                    try:
+                        ab_div = driver.find_element(By.CSS_SELECTOR, "div.text > div.Ab")
+                        ch_div = driver.find_element(By.CSS_SELECTOR, "div.text > div.Ch")
+                        ab_text = ab_div.text.strip()
+                        ch_text = ch_div.text.strip()
+                    except Exception:
+                        ab_text = ""
+                        ch_text = ""
                 
-            logging.info(f"目前單字：{ab_text}, 中文：{ch_text}")
+                logging.info(f"目前單字：{ab_text}, 中文：{ch_text}")
             
-            if ab_text and ch_text:
-                label_line = f"{ch_text}({ab_text})"
-                mp3_name = str(counter).zfill(4) + ".mp3"
-                try:
-                    audio_tag = driver.find_element(By.CSS_SELECTOR, "a.sm2_button.audio")
-                    audio_url = audio_tag.get_attribute("href")
-                    download_audio(audio_url, mp3_name, audio_folder)
-                    with open(label_txt, "a", encoding="utf-8") as f:
-                        f.write(mp3_name + "\n")
-                        f.write(label_line + "\n")
-                        f.write("male\n")
-                        f.write("one\n")
-                        f.write("\n")
-                    counter += 1
-                except Exception as e:
-                    logging.warning(f"找不到或下載音檔失敗：{e}")
+                if ab_text and ch_text:
+                    label_line = f"{ch_text}({ab_text})"
+                    mp3_name = str(counter).zfill(4) + ".mp3"
+                    try:
+                        audio_tag = driver.find_element(By.CSS_SELECTOR, "a.sm2_button.audio")
+                        audio_url = audio_tag.get_attribute("href")
+                        if not download_audio(audio_url, mp3_name, audio_folder):
+                            raise Exception(f"下載 {audio_url} 失敗")
+                        with open(label_txt, "a", encoding="utf-8") as f:
+                            f.write(mp3_name + "\n")
+                            f.write(label_line + "\n")
+                            f.write("male\n")
+                            f.write("one\n")
+                            f.write("\n")
+                        counter += 1
+                    except Exception as e:
+                        logging.warning(f"找不到或下載音檔失敗：{e}")
+                        page_ok = False
 
-            # 檢查「下一頁」按鈕
-            try:
-                next_btn = driver.find_element(By.XPATH, '//*[@id="main"]/div[4]/div[3]/div[2]/div/div[2]/div[3]/div[2]')
-                if not next_btn.is_displayed():
+                # 檢查「下一頁」按鈕
+                try:
+                    next_btn = driver.find_element(By.XPATH, '//*[@id="main"]/div[4]/div[3]/div[2]/div/div[2]/div[3]/div[2]')
+                    if not next_btn.is_displayed():
+                        logging.info("已到達單字頁面最後一頁")
+                        # 點擊「返回字母」
+                        try:
+                            back_btn = driver.find_element(By.CSS_SELECTOR, "a.switcher.to_alphabet")
+                            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", back_btn)
+                            actions.move_to_element(back_btn).click().perform()
+                            logging.info("已點擊「返回字母」按鈕")
+                            time.sleep(1)
+                        except Exception as e:
+                            logging.error(f"點擊「返回字母」按鈕時出錯：{e}")
+                        break
+                except Exception:
                     logging.info("已到達單字頁面最後一頁")
                     # 點擊「返回字母」
                     try:
@@ -92,58 +137,48 @@ def crawl_alphabet_words(driver, main_lang, dialect, folder_name):
                     except Exception as e:
                         logging.error(f"點擊「返回字母」按鈕時出錯：{e}")
                     break
-            except Exception:
-                logging.info("已到達單字頁面最後一頁")
-                # 點擊「返回字母」
+
+                # 點擊「下一頁」按鈕
+                old_word = ab_text
+                old_ch = ch_text
                 try:
-                    back_btn = driver.find_element(By.CSS_SELECTOR, "a.switcher.to_alphabet")
-                    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", back_btn)
-                    actions.move_to_element(back_btn).click().perform()
-                    logging.info("已點擊「返回字母」按鈕")
-                    time.sleep(1)
+                    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", next_btn)
+                    time.sleep(0.2)
+                    rect = driver.execute_script("return arguments[0].getBoundingClientRect();", next_btn)
+                    center_x = int(rect['left'] + rect['width']/2)
+                    center_y = int(rect['top'] + rect['height']/2)
+                    covering = driver.execute_script("return document.elementFromPoint(arguments[0], arguments[1]);", center_x, center_y)
+                    if covering != next_btn:
+                        logging.warning("按鈕被遮擋，無法點擊")
+                        time.sleep(1)
+                        continue
+                    actions.move_to_element(next_btn).click().perform()
+                    # 等 Ab 與 Ch 都和舊值不同才讀回，避免新單字配到上一個單字的中文
+                    word_fields = {"ch": ("div.text > div.Ch", None, old_ch)}
+                    changed = wait_for_change(driver, "div.text > div.Ab", old_word, fields=word_fields, timeout=5)
+                    if changed is None:
+                        changed = _word_changed_without_ch(driver, old_word)
+                    if changed is None:
+                        driver.execute_script("""
+                        arguments[0].dispatchEvent(new MouseEvent('mousedown', {bubbles:true}));
+                        arguments[0].dispatchEvent(new MouseEvent('mouseup', {bubbles:true}));
+                        arguments[0].dispatchEvent(new MouseEvent('click', {bubbles:true}));
+                        """, next_btn)
+                        changed = wait_for_change(driver, "div.text > div.Ab", old_word, fields=word_fields, timeout=5)
+                        if changed is None:
+                            changed = _word_changed_without_ch(driver, old_word)
+                        if changed is None:
+                            logging.warning("等待新單字超時，嘗試下一頁")
+                            continue
                 except Exception as e:
-                    logging.error(f"點擊「返回字母」按鈕時出錯：{e}")
-                break
-
-            # 點擊「下一頁」按鈕
-            old_word = ab_text
-            try:
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", next_btn)
-                time.sleep(0.2)
-                rect = driver.execute_script("return arguments[0].getBoundingClientRect();", next_btn)
-                center_x = int(rect['left'] + rect['width']/2)
-                center_y = int(rect['top'] + rect['height']/2)
-                covering = driver.execute_script("return document.elementFromPoint(arguments[0], arguments[1]);", center_x, center_y)
-                if covering != next_btn:
-                    logging.warning("按鈕被遮擋，無法點擊")
+                    logging.error(f"下一頁按鈕出錯：{e.__class__.__name__}: {e}")
+                    driver.save_screenshot('next_error.png')
                     time.sleep(1)
                     continue
-                actions.move_to_element(next_btn).click().perform()
-                time.sleep(0.3)
-                try:
-                    WebDriverWait(driver, 5).until(
-                        lambda d: d.find_element(By.CSS_SELECTOR, "div.text > div.Ab").text.strip() != old_word
-                    )
-                    time.sleep(0.5)
-                except Exception:
-                    driver.execute_script("""
-                    arguments[0].dispatchEvent(new MouseEvent('mousedown', {bubbles:true}));
-                    arguments[0].dispatchEvent(new MouseEvent('mouseup', {bubbles:true}));
-                    arguments[0].dispatchEvent(new MouseEvent('click', {bubbles:true}));
-                    """, next_btn)
-                    try:
-                        WebDriverWait(driver, 5).until(
-                            lambda d: d.find_element(By.CSS_SELECTOR, "div.text > div.Ab").text.strip() != old_word
-                        )
-                        time.sleep(0.5)
-                    except Exception:
-                        logging.warning("等待新單字超時，嘗試下一頁")
-                        continue
-            except Exception as e:
-                logging.error(f"下一頁按鈕出錯：{e.__class__.__name__}: {e}")
-                driver.save_screenshot('next_error.png')
-                time.sleep(1)
-                continue
+            if page_ok:
+                checkpoint.mark_done(alpha_key, counter, label_txt)
+            else:
+                counter = checkpoint.rollback_topic(alpha_key, label_txt, audio_folder)
 
         # 返回字母頁面，嘗試點擊「下一頁」
         try:
@@ -155,6 +190,7 @@ def crawl_alphabet_words(driver, main_lang, dialect, folder_name):
             actions.move_to_element(next_alpha_btn).click().perform()
             logging.info("已點擊字母頁面下一頁按鈕")
             time.sleep(1)
+            alpha_idx += 1
         except Exception as e:
             logging.error(f"字母頁面下一頁按鈕出錯或已到最後一頁：{e}")
             break 
\ No newline at end of file
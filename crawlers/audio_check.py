@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+音檔即時驗證模組。
+音檔寫入正式路徑前先用 mutagen 檢查 MP3 標頭與 frame sync，
+擋下 HTML 錯誤頁或損壞的內容，並記錄時長、位元率與取樣率。
+"""
+
+import os
+import logging
+import threading
+from mutagen.mp3 import MP3, HeaderNotFoundError
+
+VALIDATE_AUDIO = True          # 是否在寫入時驗證 MP3
+INFO_FILE_NAME = "audio_info.txt"  # 記錄在主題資料夾（audio 的上一層）
+
+_lock = threading.Lock()
+
+class InvalidAudioError(Exception):
+    """下載到的內容不是有效的 MP3。"""
+
+def _looks_like_text(head):
+    """判斷檔頭是否像 HTML/JSON 等文字內容。"""
+    stripped = head.lstrip()
+    return stripped[:1] in (b"<", b"{", b"[") or stripped[:9].lower() == b"<!doctype"
+
+def validate_mp3(path):
+    """檢查 MP3 檔，回傳 {'duration', 'bitrate', 'sample_rate'}；無效時拋出 InvalidAudioError。"""
+    with open(path, "rb") as f:
+        head = f.read(16)
+    if not head:
+        raise InvalidAudioError("檔案為空")
+    if _looks_like_text(head):
+        raise InvalidAudioError("內容是文字（可能是錯誤頁面）")
+    if not (head[:3] == b"ID3" or (head[0] == 0xFF and head[1] & 0xE0 == 0xE0)):
+        raise InvalidAudioError("找不到 ID3 標頭或 MPEG frame sync")
+    try:
+        audio = MP3(path)
+    except HeaderNotFoundError as e:
+        raise InvalidAudioError(f"無法解析 MPEG 標頭: {e}")
+    except Exception as e:
+        raise InvalidAudioError(f"mutagen 讀取失敗: {e}")
+    if not audio.info.length or audio.info.length <= 0:
+        raise InvalidAudioError("時長為 0")
+    return {
+        "duration": audio.info.length,
+        "bitrate": audio.info.bitrate,
+        "sample_rate": audio.info.sample_rate,
+    }
+
+def check_audio_file(path, name=None):
+    """依檔名決定是否驗證（只驗證 .mp3），回傳音檔資訊或 None；無效時拋出 InvalidAudioError。"""
+    name = name or path
+    if not VALIDATE_AUDIO or not name.lower().endswith(".mp3"):
+        return None
+    return validate_mp3(path)
+
+def record_audio_info(audio_path, info):
+    """把音檔資訊附加到主題資料夾的 audio_info.txt。
+    同時記錄檔案大小與修改時間（ns），檔案之後被覆寫或截斷時紀錄就不再沿用。
+    要在檔案的最終內容（含音檔庫的硬連結）就位後呼叫。"""
+    if not info:
+        return
+    audio_folder, filename = os.path.split(audio_path)
+    info_file = os.path.join(os.path.dirname(audio_folder), INFO_FILE_NAME)
+    try:
+        st = os.stat(audio_path)
+    except OSError as e:
+        logging.warning(f"讀取音檔狀態失敗: {audio_path}, {e}")
+        return
+    line = (f"{filename}\t{info['duration']:.3f}\t{info['bitrate']}\t{info['sample_rate']}"
+            f"\t{st.st_size}\t{st.st_mtime_ns}\n")
+    try:
+        with _lock:
+            with open(info_file, "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        logging.warning(f"寫入音檔資訊失敗: {info_file}, {e}")
+
+def load_audio_info(info_file):
+    """讀取 audio_info.txt，回傳 {檔名: (時長, 大小, 修改時間 ns)}，同一檔名以最後一筆為準。
+    沒有大小與修改時間的舊紀錄不列入（無法確認檔案沒被改過）。"""
+    entries = {}
+    try:
+        with open(info_file, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) < 6:
+                    continue
+                try:
+                    entries[parts[0]] = (float(parts[1]), int(parts[4]), int(parts[5]))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return entries
+
+def recorded_duration(entries, audio_path):
+    """檔案目前的大小與修改時間和紀錄相同時回傳記錄的時長，否則回傳 None（需重新解碼）。"""
+    entry = entries.get(os.path.basename(audio_path))
+    if entry is None:
+        return None
+    duration, size, mtime_ns = entry
+    try:
+        st = os.stat(audio_path)
+    except OSError:
+        return None
+    if st.st_size != size or st.st_mtime_ns != mtime_ns:
+        return None
+    return duration
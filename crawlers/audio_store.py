@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+內容定址音檔庫模組（可選）。
+啟用後每個下載完成的音檔都以 SHA-256 存進 .audio_store，
+各資料夾裡的 NNNN.mp3 改成指向音檔庫的硬連結，相同錄音只佔一份空間。
+"""
+
+import os
+import shutil
+import hashlib
+import logging
+import threading
+
+STORE_DIR_NAME = ".audio_store"
+STORE_ROOT = None  # 呼叫 enable_audio_store() 後才會設定
+
+_lock = threading.Lock()
+_stats = {
+    "stored": 0,      # 新加入音檔庫的檔案數
+    "linked": 0,      # 因內容重複而改成硬連結的檔案數
+    "saved_bytes": 0, # 因去重複省下的空間
+    "failed": 0,      # 無法建立硬連結的檔案數（例如跨磁碟）
+}
+_duplicates = {}  # sha256 -> 指向同一份內容的路徑集合（重新爬取同一個檔案不會重複計入）
+_path_sha = {}    # 路徑 -> 目前內容的 sha256，內容改變時從舊的那一組移除
+
+def enable_audio_store(root="."):
+    """在指定的輸出根目錄啟用音檔庫。"""
+    global STORE_ROOT
+    STORE_ROOT = os.path.join(root, STORE_DIR_NAME)
+    os.makedirs(STORE_ROOT, exist_ok=True)
+    logging.info(f"啟用內容定址音檔庫: {STORE_ROOT}")
+
+def is_enabled():
+    return STORE_ROOT is not None
+
+def file_sha256(path, chunk_size=64 * 1024):
+    """計算檔案的 SHA-256。"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def blob_path(sha256, ext=".mp3"):
+    """音檔庫中某個 SHA-256 對應的檔案路徑。"""
+    return os.path.join(STORE_ROOT, sha256[:2], sha256 + ext)
+
+def link_or_copy(src, dst):
+    """優先建立硬連結，失敗時（跨磁碟、檔案系統不支援）改成一般複製。可作為 shutil.copytree 的 copy_function。"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+def _replace_with_link(blob, path):
+    """把 path 原子性地換成指向 blob 的硬連結。"""
+    folder, name = os.path.split(path)
+    temp_path = os.path.join(folder, f".{name}.link")
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    os.link(blob, temp_path)
+    os.replace(temp_path, path)
+
+def store_file(path, sha256=None):
+    """把檔案加入音檔庫，內容已存在時改成硬連結。未啟用時不做任何事，回傳 SHA-256 或 None。"""
+    if STORE_ROOT is None:
+        return None
+    try:
+        if sha256 is None:
+            sha256 = file_sha256(path)
+        ext = os.path.splitext(path)[1].lower() or ".mp3"
+        blob = blob_path(sha256, ext)
+        with _lock:
+            key = os.path.normpath(path)
+            previous = _path_sha.get(key)
+            if previous is not None and previous != sha256:
+                _duplicates.get(previous, set()).discard(key)
+            _path_sha[key] = sha256
+            _duplicates.setdefault(sha256, set()).add(key)
+            if os.path.exists(blob):
+                if os.path.samefile(blob, path):
+                    return sha256
+                size = os.path.getsize(path)
+                _replace_with_link(blob, path)
+                _stats["linked"] += 1
+                _stats["saved_bytes"] += size
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                try:
+                    os.link(path, blob)
+                    _stats["stored"] += 1
+                except FileExistsError:
+                    # 平行模式下其他行程剛好存入相同內容
+                    size = os.path.getsize(path)
+                    _replace_with_link(blob, path)
+                    _stats["linked"] += 1
+                    _stats["saved_bytes"] += size
+        return sha256
+    except OSError as e:
+        with _lock:
+            _stats["failed"] += 1
+        logging.warning(f"加入音檔庫失敗: {path}, {e}")
+        return sha256
+
+def dedupe_tree(root_dir):
+    """把既有輸出資料夾裡所有 audio/*.mp3 加入音檔庫（適用於啟用前已爬好的資料）。"""
+    if STORE_ROOT is None:
+        enable_audio_store(root_dir)
+    store_abs = os.path.abspath(STORE_ROOT)
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        if os.path.abspath(dirpath).startswith(store_abs):
+            continue
+        if os.path.basename(dirpath) != "audio":
+            continue
+        for fname in sorted(filenames):
+            if fname.lower().endswith(".mp3"):
+                store_file(os.path.join(dirpath, fname))
+
+def write_dedupe_report(report_path):
+    """輸出去重複報告：統計數字與每組重複內容的路徑。"""
+    with _lock:
+        stats = dict(_stats)
+        groups = {sha: paths for sha, paths in _duplicates.items() if len(paths) > 1}
+    lines = [
+        "=== 音檔去重複報告 ===\n",
+        f"音檔庫位置: {STORE_ROOT}\n",
+        f"新加入音檔庫: {stats['stored']} 個\n",
+        f"改為硬連結: {stats['linked']} 個\n",
+        f"節省空間: {stats['saved_bytes'] / (1024 * 1024):.2f} MB\n",
+        f"無法建立硬連結: {stats['failed']} 個\n",
+        "=" * 50 + "\n",
+    ]
+    for sha, paths in sorted(groups.items(), key=lambda item: -len(item[1])):
+        lines.append(f"{sha[:16]} ({len(paths)} 份)\n")
+        for path in sorted(paths):
+            lines.append(f"  {path}\n")
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    logging.info(f"去重複報告已保存至: {report_path}")
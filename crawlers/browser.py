@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+瀏覽器設定模組。
+提供 headless 精簡爬取設定：靜音、關閉 GPU、可選擇把設定檔放在 /dev/shm，
+並依篇章擋掉爬蟲用不到的圖片、字型、CSS 與影片請求。
+"""
+
+import os
+import shutil
+import logging
+import tempfile
+
+# 需要完整畫面的篇章：即使指定 --headless 也用有畫面的瀏覽器執行
+# 字母篇用 elementFromPoint 判斷按鈕是否被遮擋，需要真實版面
+HEADED_SECTIONS = {'字母篇'}
+
+# 精簡模式下各類資源對應的網址樣式（Network.setBlockedURLs 用）
+RESOURCE_PATTERNS = {
+    'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico'],
+    'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'stylesheet': ['*.css'],
+    'video': ['*.mp4', '*.webm', '*.ogv', '*.m3u8'],
+}
+
+# 未列出的篇章只擋字型與影片：多數篇章靠點擊圖片進入主題、靠 CSS 判斷顯示狀態
+LEAN_BLOCK_DEFAULT = ('font', 'video')
+LEAN_BLOCK_SECTIONS = {
+    '十二年國教課程': ('font', 'video', 'image'),
+    '圖畫故事篇': ('font', 'video', 'image'),
+    '閱讀文本': ('font', 'video', 'image'),
+    'LIMA有聲書': ('font', 'video', 'image', 'stylesheet'),
+}
+
+_profile_dirs = {}  # id(driver) -> 暫存設定檔資料夾
+
+def add_lean_options(chrome_options, headless=False, shm_profile=False):
+    """加入 headless 精簡模式的 Chrome 參數，回傳暫存設定檔資料夾（沒有時為 None）。"""
+    profile_dir = None
+    if headless:
+        chrome_options.add_argument('--headless=new')
+        chrome_options.add_argument('--window-size=1920,1080')
+        chrome_options.add_argument('--mute-audio')
+        chrome_options.add_argument('--disable-gpu')
+        # Chrome 無法完全略過音訊解碼，只能關掉硬體影片解碼與其他背景功能
+        chrome_options.add_argument('--disable-accelerated-video-decode')
+        chrome_options.add_argument('--disable-extensions')
+        chrome_options.add_argument('--disable-background-networking')
+        chrome_options.add_experimental_option('prefs', {
+            'profile.default_content_setting_values.notifications': 2,
+        })
+    if shm_profile and os.path.isdir('/dev/shm'):
+        profile_dir = tempfile.mkdtemp(prefix='klokah-profile-', dir='/dev/shm')
+        chrome_options.add_argument(f'--user-data-dir={profile_dir}')
+        logging.info(f"Chrome 設定檔放在記憶體: {profile_dir}")
+    return profile_dir
+
+def register_profile_dir(driver, profile_dir):
+    """記錄 driver 使用的暫存設定檔，quit_driver() 時一併刪除。"""
+    if profile_dir:
+        _profile_dirs[id(driver)] = profile_dir
+
+def quit_driver(driver):
+    """關閉瀏覽器並清掉暫存設定檔，成功時回傳 True。
+    session 已失效時 driver.quit() 可能拋出例外，這裡只記錄錯誤，讓呼叫端的清理繼續進行。"""
+    try:
+        driver.quit()
+        return True
+    except Exception as e:
+        logging.error(f"關閉瀏覽器失敗: {e}")
+        return False
+    finally:
+        profile_dir = _profile_dirs.pop(id(driver), None)
+        if profile_dir:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+
+def apply_resource_blocking(driver, resource_types):
+    """透過 DevTools 擋掉指定類型的資源請求，傳入空集合則解除封鎖。"""
+    patterns = []
+    for resource_type in resource_types:
+        patterns += RESOURCE_PATTERNS.get(resource_type, [])
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        logging.info(f"精簡模式封鎖資源: {', '.join(resource_types) or '無'}")
+    except Exception as e:
+        logging.warning(f"設定資源封鎖失敗: {e}")
+
+def lean_block_for(section_name):
+    """取得某篇章在精簡模式下要封鎖的資源類型。"""
+    return LEAN_BLOCK_SECTIONS.get(section_name, LEAN_BLOCK_DEFAULT)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+網路攔截音檔模組。
+selenium-wire 已經保存了瀏覽器播放音檔時的回應內容 (request.response.body)，
+這裡直接把攔截到的內容寫入硬碟，只有內容缺漏時才再用 HTTP 下載一次。
+攔截範圍限定在 mp3/wav/json，其餘請求（圖片、JS、CSS）不保存，避免長時間爬取時記憶體不斷增加。
+也可以改用 DevTools 攔截（見 devtools_capture.py），頁面請求不必經過 proxy。
+"""
+
+import os
+import logging
+from selenium import webdriver as chrome_webdriver
+from seleniumwire import webdriver as wire_webdriver
+from seleniumwire.utils import decode
+from .utils import download_audio, save_audio_bytes
+from .devtools_capture import get_store, enable_devtools_capture, chrome_logging_prefs
+
+# 攔截方式：'wire'（selenium-wire proxy）或 'devtools'（Chrome performance log）
+# 存在環境變數裡，spawn 出來的工作行程也會沿用
+CAPTURE_BACKEND_ENV = "KLOKAH_CAPTURE_BACKEND"
+CAPTURE_BACKENDS = ('wire', 'devtools')
+
+# 只攔截爬蟲會用到的內容
+CAPTURE_SCOPES = [r'.*\.(mp3|wav|json)(\?.*)?$']
+# 記憶體中最多保留的請求數，超過時 selenium-wire 會丟掉最舊的
+CAPTURE_MAX_REQUESTS = 100
+
+def capture_options():
+    """建立 driver 時傳入的 seleniumwire_options：只存在記憶體並限制筆數。"""
+    return {
+        'request_storage': 'memory',
+        'request_storage_max_size': CAPTURE_MAX_REQUESTS,
+    }
+
+def capture_backend():
+    return os.environ.get(CAPTURE_BACKEND_ENV, 'wire')
+
+def set_capture_backend(backend):
+    if backend not in CAPTURE_BACKENDS:
+        raise ValueError(f"未知的攔截方式: {backend}")
+    os.environ[CAPTURE_BACKEND_ENV] = backend
+
+def create_driver(service, chrome_options):
+    """依攔截方式建立 Chrome driver：devtools 用一般的 selenium driver 並開啟 performance log。"""
+    if capture_backend() == 'devtools':
+        chrome_options.set_capability('goog:loggingPrefs', chrome_logging_prefs())
+        return chrome_webdriver.Chrome(service=service, options=chrome_options)
+    return wire_webdriver.Chrome(service=service, options=chrome_options,
+                                 seleniumwire_options=capture_options())
+
+def apply_capture_scope(driver):
+    """設定攔截範圍，範圍外的請求直接放行、不保存。"""
+    if capture_backend() == 'devtools':
+        enable_devtools_capture(driver, CAPTURE_SCOPES, CAPTURE_MAX_REQUESTS)
+    else:
+        driver.scopes = CAPTURE_SCOPES
+
+def captured_requests(driver):
+    """目前攔截到的請求（由舊到新），兩種攔截方式都有 request.url 與 request.response。"""
+    store = get_store(driver)
+    if store is not None:
+        return store.requests()
+    return driver.requests
+
+def clear_captured(driver):
+    """清空已攔截的請求。driver.requests 回傳的是複本，對它呼叫 clear() 不會釋放任何東西。"""
+    store = get_store(driver)
+    if store is not None:
+        store.clear()
+    else:
+        del driver.requests
+
+def url_path(url):
+    """去掉查詢字串後的網址，用來比對副檔名。"""
+    return url.split('?')[0].split('#')[0]
+
+def find_latest_request(driver, suffixes=('.mp3',), name=None):
+    """從 network 記錄中找出最新一筆符合副檔名（及檔名）的請求。"""
+    for request in reversed(captured_requests(driver)):  # 反向找最新的
+        if not request.response:
+            continue
+        path = url_path(request.url)
+        if not path.lower().endswith(suffixes):
+            continue
+        if name and not path.endswith(name):
+            continue
+        return request
+    return None
+
+def _is_complete(response):
+    """判斷回應是否為完整檔案（206 只在涵蓋整個檔案時才算完整）。"""
+    if response.status_code == 200:
+        return True
+    if response.status_code == 206:
+        content_range = response.headers.get('Content-Range', '')
+        try:
+            span, total = content_range.split(' ', 1)[1].split('/')
+            start, end = span.split('-')
+            return int(start) == 0 and int(end) + 1 == int(total)
+        except (IndexError, ValueError):
+            return False
+    return False
+
+def get_captured_body(request):
+    """取得攔截到的回應內容（已依 Content-Encoding 解壓），不完整或缺漏時回傳 None。"""
+    response = request.response
+    if not response or not response.body or not _is_complete(response):
+        return None
+    encoding = response.headers.get('Content-Encoding', 'identity')
+    try:
+        return decode(response.body, encoding)
+    except Exception as e:
+        logging.warning(f"解碼攔截內容失敗 ({encoding}): {e}, URL: {request.url}")
+        return None
+
+def save_captured_audio(request, filename, audio_folder):
+    """把攔截到的音檔直接寫入資料夾，內容缺漏時才重新下載。成功時回傳 True。"""
+    body = get_captured_body(request)
+    content_type = request.response.headers.get('Content-Type', '') if request.response else ''
+    if body and (not content_type or content_type.startswith('audio') or 'octet-stream' in content_type):
+        if save_audio_bytes(body, filename, audio_folder):
+            logging.info(f"使用攔截內容儲存音檔: {filename}")
+            return True
+    logging.info(f"攔截內容不可用，重新下載: {request.url}")
+    return download_audio(request.url, filename, audio_folder)
+
+def download_mp3_from_network(driver, audio_folder, mp3_name):
+    """從 network 記錄中取最新的 mp3 並儲存。成功時回傳 True。"""
+    request = find_latest_request(driver, ('.mp3',))
+    if request is None:
+        logging.warning(f"network 中找不到 mp3，無法儲存 {mp3_name}")
+        return False
+    return save_captured_audio(request, mp3_name, audio_folder)
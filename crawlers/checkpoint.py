@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+斷點續爬模組。
+每個篇章（某方言）在自己的根目錄保存 .checkpoint.json，記錄已完成的主題、
+進行中主題最後寫入的項目、下一個音檔編號與 label.txt 的長度。
+重新執行時跳過已完成的主題，進行中的主題從最後寫入的項目之後繼續，
+label.txt 會切回最後一次記錄的長度，編號不會重複或跳號。
+主題失敗時用 rollback_topic 撤回這個主題寫入的 label 與音檔，之後的主題沿用原本的編號，
+失敗的主題下次執行時重抓，不會留下重複的 label 或音檔。
+要整個篇章重新爬取時刪除 .checkpoint.json 即可。
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from .supervisor import note_progress
+
+CHECKPOINT_FILE = ".checkpoint.json"
+
+def _as_list(label_file):
+    """label_file 可以是單一路徑或多個路徑（例如 label.txt 與 audio_map.txt）。"""
+    if not label_file:
+        return []
+    if isinstance(label_file, (list, tuple)):
+        return list(label_file)
+    return [label_file]
+
+def _truncate_label(label_file, size):
+    """把 label 檔切回指定長度，檔案不存在時建立空檔。"""
+    with open(label_file, "a", encoding="utf-8"):
+        pass
+    if os.path.getsize(label_file) > size:
+        with open(label_file, "r+b") as f:
+            f.truncate(size)
+
+class Checkpoint:
+    """單一篇章的進度紀錄，每次更新都以原子性改名寫回檔案。"""
+
+    def __init__(self, root_folder):
+        self.path = os.path.join(root_folder, CHECKPOINT_FILE)
+        self._lock = threading.Lock()
+        self.state = {"done": [], "topics": {}, "labels": {}, "next_file": None}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.state.update(json.load(f))
+                logging.info(f"讀取進度紀錄: {self.path}（已完成 {len(self.state['done'])} 個主題）")
+            except (OSError, ValueError) as e:
+                logging.warning(f"進度紀錄損壞，從頭開始: {self.path}, {e}")
+
+    def _save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+    def is_done(self, topic):
+        return topic in self.state["done"]
+
+    def next_file(self, default=1):
+        """整個篇章共用流水號時，下一個音檔編號。"""
+        return self.state["next_file"] or default
+
+    def restore_labels(self, label_file, fresh_label=True):
+        """把 label 檔切回最後記錄的長度，去掉中斷前寫了一半的內容。"""
+        with self._lock:
+            for path in _as_list(label_file):
+                size = self.state["labels"].get(path)
+                if size is None and not fresh_label and os.path.exists(path):
+                    size = os.path.getsize(path)
+                _truncate_label(path, size or 0)
+                # 記下目前長度，主題失敗時 rollback_topic 切回這裡
+                self.state["labels"][path] = os.path.getsize(path)
+
+    def start_topic(self, topic, label_file=None, next_file=1, fresh_label=True):
+        """開始（或繼續）一個主題，回傳 (最後完成的項目, 下一個音檔編號)。
+        label_file 會切回最後記錄的長度；沒有紀錄時 fresh_label=True 會清空（每個主題各自的 label），
+        否則保留原內容（整個篇章共用的 label）。"""
+        self.restore_labels(label_file, fresh_label)
+        with self._lock:
+            progress = self.state["topics"].get(topic)
+            if progress:
+                logging.info(f"繼續主題 {topic}：從第 {progress['item'] + 1} 項、音檔 {progress['next_file']:04d} 開始")
+                return progress["item"], progress["next_file"]
+            # 記下主題開始時的編號與 label 長度，失敗時 rollback_topic 整個主題撤回到這裡
+            self.state["topics"][topic] = {"item": 0, "next_file": next_file, "start": {
+                "next_file": next_file,
+                "labels": {path: self.state["labels"].get(path) for path in _as_list(label_file)},
+            }}
+            return 0, next_file
+
+    def commit_item(self, topic, item, next_file, label_file=None):
+        """項目的音檔與 label 都寫入後呼叫。"""
+        with self._lock:
+            self.state["topics"].setdefault(topic, {}).update(item=item, next_file=next_file)
+            self.state["next_file"] = next_file
+            for path in _as_list(label_file):
+                self.state["labels"][path] = os.path.getsize(path)
+            self._save()
+        note_progress()
+
+    def mark_done(self, topic, next_file=None, label_file=None):
+        """主題全部完成（背景下載也已結束）後呼叫。"""
+        with self._lock:
+            self.state["topics"].pop(topic, None)
+            if topic not in self.state["done"]:
+                self.state["done"].append(topic)
+            if next_file is not None:
+                self.state["next_file"] = next_file
+            for path in _as_list(label_file):
+                self.state["labels"][path] = os.path.getsize(path)
+            self._save()
+        note_progress()
+        logging.info(f"主題完成: {topic}")
+
+    def rollback_topic(self, topic, label_file=None, audio_folder=None, default=1):
+        """主題沒有完成時呼叫，撤回這個主題寫入的內容，回傳之後要沿用的下一個音檔編號。
+        用 start_topic 開始的主題撤回到開始時的狀態（包括已 commit_item 的項目），
+        否則撤回到最後記錄的狀態；label 檔切回當時的長度，並刪除 audio_folder 中
+        編號不小於當時編號的 NNNN.mp3。主題本身不記為完成，下次執行時從頭重新爬取。"""
+        with self._lock:
+            start = (self.state["topics"].pop(topic, None) or {}).get("start") or {}
+            next_file = start.get("next_file") or self.state["next_file"] or default
+            self.state["next_file"] = next_file
+            for path in _as_list(label_file):
+                size = start.get("labels", {}).get(path)
+                if size is None:
+                    size = self.state["labels"].get(path)
+                if size is not None:
+                    _truncate_label(path, size)
+                    self.state["labels"][path] = size
+            if audio_folder and os.path.isdir(audio_folder):
+                for name in os.listdir(audio_folder):
+                    match = re.fullmatch(r"(\d+)\.mp3", name)
+                    if match and int(match.group(1)) >= next_file:
+                        os.remove(os.path.join(audio_folder, name))
+            self._save()
+        logging.warning(f"主題未完成，已撤回寫入的內容: {topic}（下一個音檔編號 {next_file:04d}）")
+        return next_file
@@ -11,6 +11,10 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, ElementClickInterceptedException
 from crawlers.utils import download_audio, save_label, clean_romaji
+from crawlers.checkpoint import Checkpoint
+from crawlers.capture import find_latest_request, save_captured_audio, clear_captured
+from crawlers.waits import wait_for_audio_request
+from crawlers.extract import extract_read_blocks, extract_one, VOCABULARY_FIELDS, READ_SENTENCE_FIELDS
 
 def switch_to_tab(driver, tab_name, max_retries=3):
     """嘗試切換到指定的頁籤，如果失敗會重試幾次"""
@@ -68,13 +72,17 @@ def wait_for_vocabulary_content(driver, timeout=10):
         logging.warning(f"等待單字內容超時: {e}")
         return False
 
-def verify_audio_download(mp3_url, mp3_name, audio_folder, max_retries=3):
-    """驗證音檔是否成功下載，如果失敗則重試"""
+def verify_audio_download(mp3_url, mp3_name, audio_folder, max_retries=3, request=None):
+    """驗證音檔是否成功下載，如果失敗則重試（第一次優先使用攔截到的內容）"""
     for attempt in range(max_retries):
         try:
-            download_audio(mp3_url, mp3_name, audio_folder)
+            if request is not None and attempt == 0:
+                ok = save_captured_audio(request, mp3_name, audio_folder)
+            else:
+                ok = download_audio(mp3_url, mp3_name, audio_folder)
+            # 下載層已經驗證過 MP3 標頭，這裡只確認檔案確實存在
             audio_path = os.path.join(audio_folder, mp3_name)
-            if os.path.exists(audio_path) and os.path.getsize(audio_path) > 0:
+            if ok and os.path.exists(audio_path) and os.path.getsize(audio_path) > 0:
                 return True
             else:
                 logging.warning(f"音檔下載可能不完整，重試第{attempt + 1}次: {mp3_name}")
@@ -111,132 +119,144 @@ def crawl_culture(driver, main_lang, dialect, folder_name):
         logging.error(f"找不到進入圖片: {e}")
         return
 
-    counter = [1]
-    with open(label_file, "w", encoding="utf-8") as label_f:
+    # 以大輪為單位記錄進度：已完成的大輪只翻頁不重抓，label.txt 與編號接續
+    checkpoint = Checkpoint(base_folder)
+    checkpoint.restore_labels(label_file)
+    counter = [checkpoint.next_file()]
+    with open(label_file, "a", encoding="utf-8") as label_f:
         round_idx = 1
         while True:
-            logging.info(f"=== 開始第 {round_idx} 大輪 ===")
+            round_key = f"第{round_idx}大輪"
+            if checkpoint.is_done(round_key):
+                logging.info(f"=== 第 {round_idx} 大輪已完成，跳過 ===")
+            else:
+                logging.info(f"=== 開始第 {round_idx} 大輪 ===")
+                round_ok = True  # 有任何項目失敗就不記為完成
             
-            # 1. 確保在文章頁
-            if not switch_to_tab(driver, "文章"):
-                break
+                # 1. 確保在文章頁
+                if not switch_to_tab(driver, "文章"):
+                    break
             
-            # 處理所有文章段落
-            try:
-                # 切換到 iframe
-                WebDriverWait(driver, 10).until(
-                    EC.frame_to_be_available_and_switch_to_it((By.ID, "text-frame"))
-                )
+                # 處理所有文章段落
+                try:
+                    # 切換到 iframe
+                    WebDriverWait(driver, 10).until(
+                        EC.frame_to_be_available_and_switch_to_it((By.ID, "text-frame"))
+                    )
                 
-                # 等待文章內容載入
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "div#read-main > div"))
-                )
+                    # 等待文章內容載入
+                    WebDriverWait(driver, 10).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, "div#read-main > div"))
+                    )
                 
-                articles = driver.find_elements(By.CSS_SELECTOR, "div#read-main > div")
-                for block in articles:
-                    try:
-                        play_btn = block.find_element(By.CSS_SELECTOR, "button.read-play-btn")
-                        mp3_name = f"{counter[0]:04d}.mp3"
-                        # 羅馬拼音：只抓 div.read-sentence.Ab > div.word
-                        ab_words = block.find_elements(By.CSS_SELECTOR, "div.read-sentence.Ab > div.word")
-                        romaji = " ".join([w.text.strip() for w in ab_words if w.text.strip()]).strip()
-                        romaji_clean = clean_romaji(romaji)
-                        # 中文：抓同一區塊內的 div.read-sentence.Ch
+                    # 一次讀回所有段落的文字與播放按鈕
+                    articles = extract_read_blocks(driver, READ_SENTENCE_FIELDS)
+                    for block in articles:
                         try:
-                            ch_div = block.find_element(By.CSS_SELECTOR, "div.read-sentence.Ch")
-                            chinese = ch_div.get_attribute('textContent').strip()
-                        except Exception:
-                            chinese = ""
+                            play_btn = block["play_btn"]
+                            if play_btn is None:
+                                raise NoSuchElementException("找不到播放按鈕")
+                            mp3_name = f"{counter[0]:04d}.mp3"
+                            romaji_clean = clean_romaji(block["romaji"])
+                            chinese = block["chinese"] or ""
                             
-                        driver.requests.clear()
-                        play_btn.click()
-                        time.sleep(1.5)
-                        # mp3 攔截
-                        mp3_url = None
-                        for req in driver.requests:
-                            if req.response and req.url.endswith('.mp3'):
-                                mp3_url = req.url
-                                break
+                            clear_captured(driver)
+                            play_btn.click()
+                            # mp3 攔截：請求一出現就繼續
+                            mp3_req = wait_for_audio_request(driver, timeout=5, point="culture/article_audio")
+                            mp3_url = mp3_req.url if mp3_req else None
                         
-                        if mp3_url and verify_audio_download(mp3_url, mp3_name, audio_folder):
-                            if chinese:
-                                label_f.write(f"{mp3_name}\n{chinese}({romaji_clean})\nmale\none\n\n")
+                            if mp3_url and verify_audio_download(mp3_url, mp3_name, audio_folder, request=mp3_req):
+                                if chinese:
+                                    label_f.write(f"{mp3_name}\n{chinese}({romaji_clean})\nmale\none\n\n")
+                                else:
+                                    label_f.write(f"{mp3_name}\n({romaji_clean})\nmale\none\n\n")
+                                logging.info(f"[文章] 已爬取: {mp3_name} {chinese}({romaji_clean})")
+                                counter[0] += 1
                             else:
-                                label_f.write(f"{mp3_name}\n({romaji_clean})\nmale\none\n\n")
-                            logging.info(f"[文章] 已爬取: {mp3_name} {chinese}({romaji_clean})")
-                            counter[0] += 1
-                        else:
-                            logging.error(f"[文章] 音檔下載失敗: {mp3_name}")
-                    except Exception as e:
-                        logging.warning(f"[文章] 解析失敗: {e}")
-                
-                # 切回主頁面
-                driver.switch_to.default_content()
+                                logging.error(f"[文章] 音檔下載失敗: {mp3_name}")
+                                round_ok = False
+                        except Exception as e:
+                            logging.warning(f"[文章] 解析失敗: {e}")
+                            round_ok = False
                 
-            except Exception as e:
-                logging.error(f"[文章] 區塊解析失敗: {e}")
-                # 確保切回主頁面
-                try:
+                    # 切回主頁面
                     driver.switch_to.default_content()
-                except:
-                    pass
+                
+                except Exception as e:
+                    logging.error(f"[文章] 區塊解析失敗: {e}")
+                    round_ok = False
+                    # 確保切回主頁面
+                    try:
+                        driver.switch_to.default_content()
+                    except:
+                        pass
             
-            # 2. 切換到單詞頁
-            if not switch_to_tab(driver, "單詞"):
-                break
+                # 2. 切換到單詞頁
+                if not switch_to_tab(driver, "單詞"):
+                    break
                 
-            # 處理所有單詞
-            while True:
-                try:
-                    # 等待單字內容完全加載
-                    if not wait_for_vocabulary_content(driver):
-                        logging.error("單字內容加載失敗，跳過此單字")
-                        break
+                # 處理所有單詞
+                while True:
+                    try:
+                        # 等待單字內容完全加載
+                        if not wait_for_vocabulary_content(driver):
+                            logging.error("單字內容加載失敗，跳過此單字")
+                            round_ok = False
+                            break
                         
-                    ab = driver.find_element(By.CSS_SELECTOR, "div.wrapper.view_vocabulary > div.Ab").get_attribute("textContent").strip()
-                    ab_clean = clean_romaji(ab)
-                    ch = driver.find_element(By.CSS_SELECTOR, "div.wrapper.view_vocabulary > div.Ch").get_attribute("textContent").strip()
-                    play_btn = driver.find_element(By.CSS_SELECTOR, "a.audio_1")
-                    mp3_name = f"{counter[0]:04d}.mp3"
+                        word = extract_one(driver, VOCABULARY_FIELDS)
+                        if word["ab"] is None or word["ch"] is None or word["play_btn"] is None:
+                            raise NoSuchElementException("找不到單字內容或播放按鈕")
+                        ab = word["ab"]
+                        ab_clean = clean_romaji(ab)
+                        ch = word["ch"]
+                        play_btn = word["play_btn"]
+                        mp3_name = f"{counter[0]:04d}.mp3"
                     
-                    if not ab.strip() or not ch.strip():
-                        logging.warning(f"單字內容為空，重試: Ab='{ab}', Ch='{ch}'")
-                        time.sleep(1)
-                        continue
+                        if not ab.strip() or not ch.strip():
+                            logging.warning(f"單字內容為空，重試: Ab='{ab}', Ch='{ch}'")
+                            time.sleep(1)
+                            continue
                         
-                    driver.requests.clear()
-                    play_btn.click()
-                    time.sleep(1.2)
-                    mp3_url = None
-                    for req in driver.requests:
-                        if req.response and req.url.endswith('.mp3'):
-                            mp3_url = req.url
-                            break
+                        clear_captured(driver)
+                        play_btn.click()
+                        mp3_req = wait_for_audio_request(driver, timeout=5, point="culture/word_audio")
+                        mp3_url = mp3_req.url if mp3_req else None
                             
-                    if mp3_url and verify_audio_download(mp3_url, mp3_name, audio_folder):
-                        label_f.write(f"{mp3_name}\n{ch}({ab_clean})\nmale\none\n\n")
-                        logging.info(f"[單詞] 已爬取: {mp3_name} {ch}({ab_clean})")
-                        counter[0] += 1
-                    else:
-                        logging.error(f"[單詞] 音檔下載失敗: {mp3_name}")
+                        if mp3_url and verify_audio_download(mp3_url, mp3_name, audio_folder, request=mp3_req):
+                            label_f.write(f"{mp3_name}\n{ch}({ab_clean})\nmale\none\n\n")
+                            logging.info(f"[單詞] 已爬取: {mp3_name} {ch}({ab_clean})")
+                            counter[0] += 1
+                        else:
+                            logging.error(f"[單詞] 音檔下載失敗: {mp3_name}")
+                            round_ok = False
                         
-                except Exception as e:
-                    logging.warning(f"[單詞] 解析失敗: {e}")
+                    except Exception as e:
+                        logging.warning(f"[單詞] 解析失敗: {e}")
+                        round_ok = False
                     
-                # 檢查下一個單詞按鈕
-                try:
-                    next_btn = driver.find_element(By.CSS_SELECTOR, "div.next_1")
-                    if next_btn.get_attribute("style") and "hidden" in next_btn.get_attribute("style"):
+                    # 檢查下一個單詞按鈕
+                    try:
+                        next_btn = driver.find_element(By.CSS_SELECTOR, "div.next_1")
+                        if next_btn.get_attribute("style") and "hidden" in next_btn.get_attribute("style"):
+                            break
+                        next_btn.click()
+                        time.sleep(1.5)  # 增加等待時間，確保新內容加載
+                    except Exception:
                         break
-                    next_btn.click()
-                    time.sleep(1.5)  # 增加等待時間，確保新內容加載
-                except Exception:
-                    break
                     
-            # 3. 回到文章頁
-            if not switch_to_tab(driver, "文章"):
-                break
+                # 3. 回到文章頁
+                if not switch_to_tab(driver, "文章"):
+                    break
+                
+                label_f.flush()
+                if round_ok:
+                    checkpoint.mark_done(round_key, counter[0], label_file)
+                else:
+                    logging.warning(f"=== 第 {round_idx} 大輪有項目失敗，下次執行時重新爬取 ===")
+                    # 撤回這一大輪寫入的 label 與音檔，之後的大輪沿用原本的編號
+                    counter[0] = checkpoint.rollback_topic(round_key, label_file, audio_folder)
                 
             # 4. 檢查有沒有下一大輪
             try:
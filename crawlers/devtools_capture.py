@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+DevTools 網路攔截模組。
+不經過 selenium-wire 的 MITM proxy，改從 Chrome 的 performance log 讀取
+Network.responseReceived 事件，需要內容時再用 Network.getResponseBody 向瀏覽器取回。
+提供和 selenium-wire 相同的 request.url / request.response 介面，給 capture.py 使用。
+"""
+
+import re
+import json
+import base64
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from requests.structures import CaseInsensitiveDict
+
+# driver -> DevToolsStore；store 與 response 只保留 driver 的弱參照，
+# 否則值會一直參照到鍵，driver 關閉後整筆記錄都不會被回收
+_stores = weakref.WeakKeyDictionary()
+
+class DevToolsResponse:
+    """仿 selenium-wire 的 response：status_code、headers，body 在第一次讀取時才向瀏覽器要。"""
+
+    def __init__(self, driver_ref, request_id, status_code, headers):
+        self._driver_ref = driver_ref
+        self._request_id = request_id
+        self._body = None
+        self.status_code = status_code
+        # 瀏覽器回傳的內容已經解壓，拿掉 Content-Encoding 避免再解一次
+        self.headers = CaseInsensitiveDict(headers)
+        self.headers.pop('Content-Encoding', None)
+
+    @property
+    def body(self):
+        if self._body is None:
+            driver = self._driver_ref()
+            if driver is None:
+                return b''
+            try:
+                result = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': self._request_id})
+            except Exception as e:
+                # 瀏覽器已經丟掉內容（例如媒體串流），交給呼叫端重新下載
+                logging.debug(f"無法取得回應內容 {self._request_id}: {e}")
+                return b''
+            data = result.get('body', '')
+            self._body = base64.b64decode(data) if result.get('base64Encoded') else data.encode('utf-8')
+        return self._body
+
+class DevToolsRequest:
+    """仿 selenium-wire 的 request，只保留爬蟲會用到的 url 與 response。"""
+
+    def __init__(self, url, response):
+        self.url = url
+        self.response = response
+
+class DevToolsStore:
+    """依序保存範圍內的回應，超過上限時丟掉最舊的。"""
+
+    def __init__(self, driver, scopes, max_requests):
+        self._driver_ref = weakref.ref(driver)
+        self._scopes = [re.compile(scope) for scope in scopes]
+        self._max_requests = max_requests
+        self._requests = OrderedDict()  # requestId -> DevToolsRequest
+        self._lock = threading.Lock()
+
+    def _in_scope(self, url):
+        return any(scope.match(url) for scope in self._scopes)
+
+    def poll(self):
+        """讀取新的 performance log（讀過即消失），把範圍內的回應加入記錄。"""
+        driver = self._driver_ref()
+        if driver is None:
+            return
+        try:
+            entries = driver.get_log('performance')
+        except Exception as e:
+            logging.warning(f"讀取 performance log 失敗: {e}")
+            return
+        with self._lock:
+            for entry in entries:
+                try:
+                    message = json.loads(entry['message'])['message']
+                except (KeyError, ValueError):
+                    continue
+                if message.get('method') != 'Network.responseReceived':
+                    continue
+                params = message.get('params', {})
+                response = params.get('response', {})
+                url = response.get('url', '')
+                if not self._in_scope(url):
+                    continue
+                request_id = params.get('requestId')
+                self._requests[request_id] = DevToolsRequest(
+                    url, DevToolsResponse(self._driver_ref, request_id, response.get('status'), response.get('headers', {})))
+                self._requests.move_to_end(request_id)
+                while len(self._requests) > self._max_requests:
+                    self._requests.popitem(last=False)
+
+    def requests(self):
+        self.poll()
+        with self._lock:
+            return list(self._requests.values())
+
+    def clear(self):
+        self.poll()
+        with self._lock:
+            self._requests.clear()
+
+def chrome_logging_prefs():
+    """建立 driver 前要設定的 capability：開啟 performance log。"""
+    return {'performance': 'ALL'}
+
+def enable_devtools_capture(driver, scopes, max_requests):
+    """啟用 Network domain 並為 driver 建立記錄。"""
+    driver.execute_cdp_cmd('Network.enable', {})
+    _stores[driver] = DevToolsStore(driver, scopes, max_requests)
+
+def get_store(driver):
+    """取得 driver 的 DevTools 記錄，不是用 DevTools 攔截時回傳 None。"""
+    return _stores.get(driver)
@@ -10,6 +10,14 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 from crawlers.utils import download_audio, save_label, clean_romaji
+from crawlers.downloader import submit_download, drain_downloads
+from crawlers.checkpoint import Checkpoint
+from crawlers.capture import clear_captured, captured_requests
+from crawlers.extract import (extract_grouped, extract_audio_map, extract_one, DIALOGUE_FIELDS,
+                              DIALOGUE_SEASON_SELECTOR, DIALOGUE_FRAME_SELECTOR, DIALOGUE_ROW_SELECTOR)
+from crawlers.waits import (wait_until, wait_page_ready, wait_present, wait_visible, wait_invisible,
+                            wait_clickable, wait_text_change, wait_attribute_change,
+                            wait_for_audio_request, wait_frame_ready, wait_for_change)
 import subprocess
 import tempfile
 import requests
@@ -65,10 +73,8 @@ def setup_folder_structure(root_folder, folder_name):
         audio_folder = os.path.join(topic_folder, "audio")
         os.makedirs(audio_folder, exist_ok=True)
         
-        # 創建並初始化 label.txt
+        # label.txt 由 Checkpoint.start_topic 建立或清空
         label_file = os.path.join(topic_folder, "label.txt")
-        with open(label_file, "w", encoding="utf-8") as f:
-            f.write("")
             
         logging.info(f"創建資料夾結構: {topic_folder}")
         return topic_folder, audio_folder, label_file
@@ -80,57 +86,47 @@ def setup_folder_structure(root_folder, folder_name):
 def get_audio_mapping(driver):
     audio_map = {}
     try:
-        audio_set = driver.find_element(By.ID, "audioSet")
-        audio_tags = audio_set.find_elements(By.CSS_SELECTOR, "audio.player-ab")
-        for audio in audio_tags:
-            data_value = audio.get_attribute("data-value")
-            try:
-                source = audio.find_element(By.TAG_NAME, "source")
-                src = source.get_attribute("src")
-                audio_map[data_value] = src
-            except Exception:
-                continue
+        audio_map = extract_audio_map(driver)
+        if not audio_map:
+            logging.warning("audioSet 中沒有音檔")
     except Exception as e:
         logging.warning(f"找不到 audioSet: {e}")
     return audio_map
 
+def dialogue_sort_key(record):
+    try:
+        return int(record["num"])
+    except (TypeError, ValueError):
+        return 9999
+
 def crawl_dialogue_texts(driver, label_file, audio_folder, start_idx=1):
+    """讀取顯示中學習季的對話練習，回傳 (下一個編號, 是否全部成功)。"""
     label_idx = start_idx
+    ok = True
     audio_map = get_audio_mapping(driver)
-    season_divs = driver.find_elements(By.CSS_SELECTOR, "div.dia-season-div[style*='display: block']")
-    for season_div in season_divs:
+    # 一次讀回所有顯示中學習季的對話，不再逐一 find_element；
+    # 和原本一樣只讀每個學習季第一個 frame-inner，隱藏或重複的 frame 不會多出對話
+    try:
+        seasons = extract_grouped(driver, DIALOGUE_SEASON_SELECTOR, DIALOGUE_ROW_SELECTOR, DIALOGUE_FIELDS,
+                                  scope=DIALOGUE_FRAME_SELECTOR)
+    except Exception as e:
+        print(f"解析失敗: {e}")
+        return label_idx, False
+    for records in seasons:
         try:
-            frame_inner = season_div.find_element(By.CSS_SELECTOR, "div[class^='dia-frame-'][class$='-inner']")
-            sections = frame_inner.find_elements(By.CSS_SELECTOR, "div.section")
-            all_items = []
-            for section in sections:
-                items = section.find_elements(By.XPATH, './div')
-                for item in items:
-                    try:
-                        num = int(item.find_element(By.CSS_SELECTOR, ".dia-num").text.strip())
-                    except Exception:
-                        num = 9999
-                    all_items.append((num, item))
-            all_items.sort(key=lambda x: x[0])
-            for num, item in all_items:
-                try:
-                    ab = item.find_element(By.CSS_SELECTOR, ".dia-show-ab").text.strip()
-                except Exception:
-                    ab = ""
-                try:
-                    ch = item.find_element(By.CSS_SELECTOR, ".dia-show-ch").text.strip()
-                except Exception:
-                    ch = ""
-                try:
-                    data_value = item.find_element(By.CSS_SELECTOR, ".dia-sound").get_attribute("data-value")
-                except Exception:
-                    data_value = None
+            if records is None:
+                raise NoSuchElementException("找不到 dia-frame-inner")
+            for record in sorted(records, key=dialogue_sort_key):
+                ab = record["ab"] or ""
+                ch = record["ch"] or ""
+                data_value = record["data_value"]
                 mp3_name = f"{label_idx:04d}.mp3"
                 if data_value and data_value in audio_map:
                     audio_src = audio_map[data_value]
-                    download_audio(audio_src, mp3_name, audio_folder)
+                    submit_download(audio_src, mp3_name, audio_folder)
                 else:
                     print(f"找不到音檔 data-value: {data_value}")
+                    ok = False
                 # clean 文字
                 ab_clean = clean_text(ab)
                 ch_clean = clean_text(ch)
@@ -139,31 +135,38 @@ def crawl_dialogue_texts(driver, label_file, audio_folder, start_idx=1):
                 label_idx += 1
         except Exception as e:
             print(f"解析失敗: {e}")
+            ok = False
             continue
-    return label_idx
+    return label_idx, ok
 
 def crawl_all_season_dialogues(driver, label_file, audio_folder, label_idx):
+    """依序爬取學習一到三的對話練習，回傳 (下一個編號, 是否全部成功)。"""
+    ok = True
     for season_idx in [1, 2, 3]:
         try:
             season_btn = driver.find_element(By.ID, f"dia-season-{season_idx}")
             if not season_btn.is_displayed():
                 continue
             season_btn.click()
-            time.sleep(1)
         except Exception:
             continue
         try:
-            part = driver.find_element(By.ID, f"partTitle-{season_idx}")
+            part = wait_clickable(driver, (By.ID, f"partTitle-{season_idx}"), 5)
+            if part is None:
+                part = driver.find_element(By.ID, f"partTitle-{season_idx}")
             part.click()
-            time.sleep(1)
-            label_idx = crawl_dialogue_texts(driver, label_file, audio_folder, start_idx=label_idx)
-            time.sleep(1)
+            wait_present(driver, (By.CSS_SELECTOR, "div.dia-season-div[style*='display: block'] div.section"), 5)
+            label_idx, season_ok = crawl_dialogue_texts(driver, label_file, audio_folder, start_idx=label_idx)
+            ok = ok and season_ok
         except Exception as e:
             print(f"處理 season {season_idx} 對話練習失敗: {e}")
-    return label_idx
+            ok = False
+    return label_idx, ok
 
 def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_iframe_src=None):
+    """爬取 iframe 中的單詞練習，回傳 (下一個編號, 是否全部成功)。"""
     label_idx = start_idx
+    ok = True
     print(f"開始單詞練習爬取，起始index: {label_idx}")
     
     # 在進入iframe前，先獲取音檔映射
@@ -172,17 +175,7 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
     try:
         # 切回主頁面獲取audioSet
         driver.switch_to.default_content()
-        audio_set = driver.find_element(By.ID, "audioSet")
-        audio_tags = audio_set.find_elements(By.CSS_SELECTOR, "audio.player-ab")
-        for audio in audio_tags:
-            data_value = audio.get_attribute("data-value")
-            try:
-                source = audio.find_element(By.TAG_NAME, "source")
-                src = source.get_attribute("src")
-                main_audio_map[data_value] = src
-                print(f"音檔映射: {data_value} -> {src}")
-            except Exception:
-                continue
+        main_audio_map = extract_audio_map(driver)
         print(f"獲取到 {len(main_audio_map)} 個音檔映射")
     except Exception as e:
         print(f"獲取audioSet失敗: {e}")
@@ -221,8 +214,9 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
         if not container_found:
             try:
                 print("嘗試方法3：等待更長時間...")
-                time.sleep(5)
-                container = driver.find_element(By.CSS_SELECTOR, "div.dia-frame-inner")
+                container = wait_present(driver, (By.CSS_SELECTOR, "div.dia-frame-inner"), 5)
+                if container is None:
+                    container = driver.find_element(By.CSS_SELECTOR, "div.dia-frame-inner")
                 print(f"方法3成功：找到container，style: {container.get_attribute('style')}")
                 container_found = True
             except Exception as e:
@@ -246,15 +240,10 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
         if original_iframe_src and original_iframe_src == iframe_src:
             print("檢測到iframe還是之前的內容，等待更新...")
             # 等待iframe src更新
-            max_wait = 10
-            for i in range(max_wait):
-                time.sleep(1)
-                iframe = driver.find_element(By.ID, "dia-frame-show")
-                iframe_src = iframe.get_attribute('src')
-                print(f"等待第{i+1}秒，iframe src: {iframe_src}")
-                if original_iframe_src != iframe_src:
-                    print("iframe已更新到正確內容")
-                    break
+            new_src = wait_attribute_change(driver, (By.ID, "dia-frame-show"), "src", original_iframe_src, 10)
+            if new_src:
+                iframe_src = new_src
+                print(f"iframe已更新到正確內容: {iframe_src}")
             else:
                 print("iframe未更新，但繼續嘗試...")
         elif original_iframe_src:
@@ -264,13 +253,9 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
         
         # 確保iframe完全載入
         print("等待iframe完全載入...")
-        WebDriverWait(driver, 15).until(
-            EC.frame_to_be_available_and_switch_to_it((By.ID, "dia-frame-show"))
-        )
+        if not wait_frame_ready(driver, (By.ID, "dia-frame-show"), 15):
+            raise TimeoutException("iframe 載入逾時")
         print("成功切換到iframe")
-         
-        print("等待iframe內容完全載入...")
-        time.sleep(5) # 增加更多緩衝時間，特別是對學習三
         
         # 確保iframe內容完全載入 - 等待body元素完全加載
         try:
@@ -281,10 +266,8 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
             print("iframe body已載入")
             
             # 等待至少有一些基本元素
-            WebDriverWait(driver, 10).until(
-                lambda d: len(d.find_elements(By.TAG_NAME, "div")) > 5
-            )
-            print("iframe內div元素已載入")
+            if wait_until(driver, lambda d: len(d.find_elements(By.TAG_NAME, "div")) > 5, 10, "frame_divs"):
+                print("iframe內div元素已載入")
             
         except Exception as e:
             print(f"等待iframe內容載入時出錯: {e}")
@@ -305,7 +288,7 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
             
             if len(block_divs) == 0:
                 print("沒有找到display:block的div，等待更長時間...")
-                time.sleep(5)
+                wait_present(driver, (By.CSS_SELECTOR, 'div[style*="display: block"]'), 5)
                 block_divs = driver.find_elements(By.CSS_SELECTOR, 'div[style*="display: block"]')
                 print(f"等待後找到 {len(block_divs)} 個display:block的div")
                 
@@ -377,7 +360,7 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
                 
                 if len(word_elements) == 0:
                     print("沒有找到.word元素，等待更長時間...")
-                    time.sleep(3)
+                    wait_present(block_div, (By.CSS_SELECTOR, ".word"), 3)
                     word_elements = block_div.find_elements(By.CSS_SELECTOR, ".word")
                     print(f"等待後找到 {len(word_elements)} 個.word元素")
                     
@@ -399,7 +382,7 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
                 ch_btn = WebDriverWait(block_div, 5).until(EC.element_to_be_clickable((By.CSS_SELECTOR, ".read-chinese-btn")))
                 ch_btn.click()
                 print("成功點擊中文按鈕")
-                time.sleep(0.2)
+                wait_visible(block_div, (By.CSS_SELECTOR, ".read-sentence.Ch"), 2)
             except Exception as e:
                 print(f"點擊中文按鈕失敗: {e}")
 
@@ -425,28 +408,29 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
                 if play_data_value and play_data_value in main_audio_map:
                     mp3_url = main_audio_map[play_data_value]
                     print(f"從audioSet找到音檔URL: {mp3_url}")
-                    download_audio(mp3_url, mp3_name, audio_folder)
-                    print(f"音檔下載完成: {mp3_name}")
+                    submit_download(mp3_url, mp3_name, audio_folder)
+                    print(f"音檔已加入下載佇列: {mp3_name}")
                 else:
                     print(f"未在audioSet中找到data-value: {play_data_value}")
                     # 備用方案：點擊播放按鈕並監控network
                     print("使用備用方案：監控network請求...")
-                    driver.requests.clear()
+                    clear_captured(driver)
                     play_btn.click()
-                    time.sleep(1.2)
-                    
-                    for req in driver.requests:
-                        if req.response and req.url.endswith('.mp3'):
-                            mp3_url = req.url
-                            print(f"從network找到mp3 URL: {mp3_url}")
-                            break
+                    request = wait_for_audio_request(driver, timeout=3, point="dialogue/word_audio")
+                    if request is not None:
+                        mp3_url = request.url
+                        print(f"從network找到mp3 URL: {mp3_url}")
                     
                     if mp3_url:
-                        download_audio(mp3_url, mp3_name, audio_folder)
-                        print(f"音檔下載完成: {mp3_name}")
+                        submit_download(mp3_url, mp3_name, audio_folder)
+                        print(f"音檔已加入下載佇列: {mp3_name}")
+                    else:
+                        print(f"找不到 {mp3_name} 的音檔")
+                        ok = False
                         
             except Exception as e:
                 print(f"下載音檔失敗: {e}")
+                ok = False
                 mp3_name = f"{label_idx:04d}.mp3" # 即使下載失敗也要確保檔名正確
             
             ab_clean = clean_text(ab)
@@ -482,10 +466,11 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
                     current_word_text = word_element.text.strip()  # 記錄當前單詞文本
                     print(f"當前單詞文本: '{current_word_text}'，等待變化...")
                     
-                    WebDriverWait(driver, 10).until(
-                        lambda d: d.find_element(By.CSS_SELECTOR, 'div[style*="display: block"] .word').text.strip() != current_word_text
-                    )
-                    print("新單詞已載入（基於文本變化）")
+                    # 頁面內的 MutationObserver 在單詞變化時立刻回傳，不必一直輪詢
+                    changed = wait_for_change(driver, 'div[style*="display: block"] .word', current_word_text, timeout=10)
+                    if changed is None:
+                        raise TimeoutException("單詞文字沒有變化")
+                    print(f"新單詞已載入（基於文本變化）: '{changed['value']}'")
                 except TimeoutException:
                     print("等待新單詞載入超時，檢查是否到達最後一個單詞...")
                     # 檢查是否下一個按鈕變為隱藏（表示已到最後一個）
@@ -499,12 +484,12 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
                             break
                         else:
                             print("下一個按鈕仍可見，可能是載入問題，繼續嘗試...")
-                            time.sleep(3)  # 給更多時間
-                            # 再次檢查是否有新的單詞載入（基於文本變化）
+                            # 再多等一段時間看單詞是否變化
                             try:
-                                new_word_text = driver.find_element(By.CSS_SELECTOR, 'div[style*="display: block"] .word').text.strip()
+                                new_word_text = wait_text_change(
+                                    driver, (By.CSS_SELECTOR, 'div[style*="display: block"] .word'), current_word_text, 3)
                                 print(f"延遲檢查 - 當前單詞文本: '{new_word_text}'")
-                                if new_word_text != current_word_text:
+                                if new_word_text:
                                     print("新單詞已載入（延遲檢查成功，基於文本變化）")
                                 else:
                                     print("仍未檢測到新單詞，可能真的到達最後一個，結束循環")
@@ -515,8 +500,6 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
                     except Exception as e:
                         print(f"檢查下一個按鈕狀態時出錯: {e}，結束循環")
                         break
-
-                time.sleep(0.5)
             except Exception as e:
                 print(f"導航到下一個單詞失敗: {e}")
                 break
@@ -528,12 +511,15 @@ def crawl_word_practice(driver, audio_folder, label_file, start_idx, original_if
     except Exception as e:
         print(f"單詞練習解析失敗: {e}")
         driver.switch_to.default_content() # 確保離開 iframe
+        ok = False
         
     print(f"單詞練習爬取完成，最終index: {label_idx}")
-    return label_idx
+    return label_idx, ok
 
 def try_crawl_word_practice(driver, audio_folder, label_file, start_idx):
+    """有單詞練習時爬取，回傳 (下一個編號, 是否成功)；沒有單詞練習也算成功。"""
     label_idx = start_idx
+    ok = True
     print(f"檢查是否有單詞練習，當前label_idx: {label_idx}")
     
     # 在點擊前記錄當前iframe的src（如果存在）
@@ -559,25 +545,28 @@ def try_crawl_word_practice(driver, audio_folder, label_file, start_idx):
                     print("點擊單詞練習按鈕...")
                     part.click()
                     print("等待頁面內容載入...")
-                    time.sleep(3)  # 增加等待時間，特別是對學習三
+                    wait_present(driver, (By.CSS_SELECTOR, "div.dia-frame-inner"), 3)
                     print("成功點擊單詞練習按鈕，開始爬取...")
-                    label_idx = crawl_word_practice(driver, audio_folder, label_file, label_idx, original_iframe_src)
+                    label_idx, practice_ok = crawl_word_practice(driver, audio_folder, label_file, label_idx, original_iframe_src)
+                    ok = ok and practice_ok
                     print(f"單詞練習爬取完成，返回label_idx: {label_idx}")
                     break
             except Exception as e:
                 print(f"處理partTitle[{i}]時出錯: {e}")
+                ok = False
                 continue
     except Exception as e:
         print(f"檢查單詞練習失敗: {e}")
+        ok = False
     
     print(f"try_crawl_word_practice 完成，最終label_idx: {label_idx}")
-    return label_idx
+    return label_idx, ok
 
 def crawl_dialogue(driver, main_lang, dialect, folder_name):
-    """爬取情境族語內容"""
+    """爬取情境族語內容，已完成的大輪依 .checkpoint.json 跳過"""
     base_url = "https://web.klokah.tw/dialogue/"
     driver.get(base_url)
-    time.sleep(2)
+    wait_page_ready(driver)
     
     root_folder = os.path.join(main_lang, dialect, folder_name)
     os.makedirs(root_folder, exist_ok=True)
@@ -587,6 +576,7 @@ def crawl_dialogue(driver, main_lang, dialect, folder_name):
     if not os.path.exists(jump_file):
         with open(jump_file, "w", encoding="utf-8") as f:
             f.write("")
+    checkpoint = Checkpoint(root_folder)
     
     current_number = 1
     while True:
@@ -595,41 +585,58 @@ def crawl_dialogue(driver, main_lang, dialect, folder_name):
             if not current_folder:
                 logging.info("找不到下一個大輪，結束爬取")
                 break
+            if checkpoint.is_done(current_folder):
+                logging.info(f"大輪 {current_folder} 已完成，跳過")
+                current_number += 1
+                continue
             logging.info(f"準備處理大輪: {current_folder}")
             topic_folder, audio_folder, label_file = setup_folder_structure(root_folder, current_folder)
             if not topic_folder:
                 break
-            print(f"清空前 network 請求數量: {len(driver.requests)}")
-            driver.requests.clear()
-            print(f"清空後 network 請求數量: {len(driver.requests)}")
+            # 音檔在背景下載，進度以整個大輪為單位記錄
+            checkpoint.start_topic(current_folder, label_file)
+            print(f"清空前 network 請求數量: {len(captured_requests(driver))}")
+            clear_captured(driver)
+            print(f"清空後 network 請求數量: {len(captured_requests(driver))}")
             img_selector = f"img[src*='{current_number:02d}.png']"
             img = WebDriverWait(driver, 10).until(
                 EC.element_to_be_clickable((By.CSS_SELECTOR, img_selector))
             )
             img.click()
-            time.sleep(2)
+            wait_clickable(driver, (By.CSS_SELECTOR, "button#dia-back"))
             logging.info(f"點擊第 {current_number:02d} 大輪圖片")
-            time.sleep(1)
             label_idx = 1
-            label_idx = crawl_all_season_dialogues(driver, label_file, audio_folder, label_idx)
+            label_idx, round_ok = crawl_all_season_dialogues(driver, label_file, audio_folder, label_idx)
             # 對話練習都爬完後，檢查學習二、三的單詞練習，label_idx 接續
             for season_idx in [2, 3]:
                 try:
                     season_btn = driver.find_element(By.ID, f"dia-season-{season_idx}")
+                except NoSuchElementException:
+                    continue
+                try:
                     if not season_btn.is_displayed():
                         continue
                     season_btn.click()
-                    time.sleep(1)
-                    label_idx = try_crawl_word_practice(driver, audio_folder, label_file, label_idx)
-                except Exception:
-                    continue
+                    wait_present(driver, (By.CSS_SELECTOR, ".partTitle"), 3)
+                    label_idx, practice_ok = try_crawl_word_practice(driver, audio_folder, label_file, label_idx)
+                    round_ok = round_ok and practice_ok
+                except Exception as e:
+                    print(f"處理學習{season_idx}單詞練習失敗: {e}")
+                    round_ok = False
+            # 對話與單詞練習都爬完、背景下載也全部成功才記為完成
+            done, failed = drain_downloads()
+            if round_ok and not failed:
+                checkpoint.mark_done(current_folder, label_file=label_file)
+            else:
+                logging.warning(f"大輪 {current_folder} 未完整完成，下次執行時重新爬取")
             back_btn = WebDriverWait(driver, 10).until(
                 EC.element_to_be_clickable((By.CSS_SELECTOR, "button#dia-back"))
             )
             back_btn.click()
-            time.sleep(1.5)
+            wait_invisible(driver, (By.CSS_SELECTOR, "button#dia-back"))
             logging.info("返回主頁面")
             current_number += 1
         except Exception as e:
             logging.error(f"處理大輪時出錯: {e}")
-            break 
\ No newline at end of file
+            break
+    drain_downloads() 
\ No newline at end of file
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+背景下載佇列模組。
+爬蟲在走訪 DOM 時把 (音檔網址, 檔名, 資料夾) 丟進佇列，由背景執行緒下載，
+讓瀏覽器操作與音檔下載同時進行。每個主題結束時呼叫 drain() 等待全部完成。
+每個 host 的並行數由 AdaptiveLimiter 依延遲與錯誤率以 AIMD 自動調整。
+"""
+
+import time
+import threading
+import logging
+from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor
+from .utils import download_audio_status, BASE_DOMAIN
+
+# 佇列設定
+MAX_WORKERS = 16   # 下載執行緒數，也是每個 host 並行數的上限
+MAX_PENDING = 64   # 佇列中最多等待的工作數，超過時 submit() 會阻塞（backpressure）
+
+# 自動調整並行數（AIMD）設定
+INITIAL_CONCURRENCY = 4   # 每個 host 起始並行數
+MIN_CONCURRENCY = 1
+INCREASE_STEP = 1.0       # 每一輪成功約增加的並行數（加法增加）
+DECREASE_FACTOR = 0.5     # 遇到 429/5xx/連線錯誤/過慢時乘上的倍率（乘法減少）
+DECREASE_COOLDOWN = 2.0   # 兩次減少之間至少間隔的秒數，避免同一波錯誤連續砍半
+SLOW_LATENCY = 8.0        # 收到回應標頭（首位元組）超過此秒數視為壅塞；不看整個檔案的下載時間，長音檔不會被誤判
+THROTTLE_RETRIES = 2      # 被限流（429/5xx）時重試的次數
+LOG_INTERVAL = 30.0       # 定期記錄有效並行數的間隔秒數
+
+def is_throttled(status):
+    """429、5xx 與連線錯誤（狀態碼 None）視為伺服器壓力訊號；內容錯誤（STATUS_BAD_CONTENT）不算。"""
+    return status is None or status == 429 or status >= 500
+
+class AdaptiveLimiter:
+    """單一 host 的 AIMD 並行數控制器。"""
+
+    def __init__(self, host, initial=INITIAL_CONCURRENCY, ceiling=MAX_WORKERS):
+        self.host = host
+        self.ceiling = ceiling
+        self.limit = float(min(initial, ceiling))
+        self.in_flight = 0
+        self.ewma_latency = None
+        self.successes = 0
+        self.errors = 0
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+        self._last_log = 0.0
+
+    @property
+    def concurrency(self):
+        return max(MIN_CONCURRENCY, int(self.limit))
+
+    def acquire(self):
+        """等到目前並行數低於上限才放行。"""
+        with self._cond:
+            while self.in_flight >= self.concurrency:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, status):
+        """回報一次下載的延遲（首位元組時間）與結果，並調整並行數上限。"""
+        with self._cond:
+            self.in_flight -= 1
+            before = self.concurrency
+            self.ewma_latency = latency if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * latency
+            now = time.monotonic()
+            if is_throttled(status) or latency > SLOW_LATENCY:
+                self.errors += 1
+                if now - self._last_decrease >= DECREASE_COOLDOWN:
+                    self.limit = max(MIN_CONCURRENCY, self.limit * DECREASE_FACTOR)
+                    self._last_decrease = now
+            else:
+                self.successes += 1
+                self.limit = min(self.ceiling, self.limit + INCREASE_STEP / self.limit)
+            after = self.concurrency
+            if after != before or now - self._last_log >= LOG_INTERVAL:
+                self._last_log = now
+                logging.info(f"[{self.host}] 有效並行數 {after}（延遲 {self.ewma_latency:.2f}s，"
+                             f"成功 {self.successes}，錯誤 {self.errors}）")
+            self._cond.notify_all()
+
+class DownloadQueue:
+    """有上限的背景下載佇列。"""
+
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._futures = []
+        self._failed = []
+        self._limiters = {}
+
+    def submit(self, audio_url, filename, audio_folder):
+        """加入一個下載工作；佇列已滿時會等到有空位為止。"""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._run, audio_url, filename, audio_folder)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures.append(future)
+        return future
+
+    def limiter_for(self, audio_url):
+        """取得網址所屬 host 的並行數控制器。"""
+        host = urlparse(urljoin(f"https://{BASE_DOMAIN}/", audio_url)).netloc
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = AdaptiveLimiter(host, ceiling=self.max_workers)
+            return self._limiters[host]
+
+    def _run(self, audio_url, filename, audio_folder):
+        limiter = self.limiter_for(audio_url)
+        try:
+            for attempt in range(THROTTLE_RETRIES + 1):
+                limiter.acquire()
+                start = time.monotonic()
+                ok, status = False, None
+                timing = {}
+                try:
+                    ok, status = download_audio_status(audio_url, filename, audio_folder, timing=timing)
+                finally:
+                    # 沒有收到回應（連線錯誤）時才用整段經過時間
+                    latency = timing.get("ttfb", time.monotonic() - start)
+                    limiter.release(latency, 200 if ok else status)
+                if ok or not is_throttled(status):
+                    break
+                logging.info(f"伺服器忙碌，稍後重試 {filename}（第 {attempt + 1} 次）")
+                time.sleep(DECREASE_COOLDOWN * (attempt + 1))
+            if not ok:
+                with self._lock:
+                    self._failed.append((audio_url, filename, audio_folder))
+            return ok
+        finally:
+            self._slots.release()
+
+    def drain(self):
+        """等待目前所有工作完成，回傳 (成功數, 失敗清單)。"""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        done = 0
+        for future in futures:
+            try:
+                if future.result():
+                    done += 1
+            except Exception as e:
+                logging.error(f"背景下載工作出錯: {e}")
+        with self._lock:
+            failed, self._failed = self._failed, []
+        if futures:
+            logging.info(f"下載佇列清空: 成功 {done} 個，失敗 {len(failed)} 個")
+            with self._lock:
+                limiters = list(self._limiters.values())
+            for limiter in limiters:
+                logging.info(f"[{limiter.host}] 目前有效並行數 {limiter.concurrency}")
+        return done, failed
+
+    def shutdown(self):
+        """清空佇列並結束所有下載執行緒。"""
+        self.drain()
+        self._executor.shutdown(wait=True)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def configure_downloads(max_workers=None):
+    """調整共用佇列的下載執行緒數（也是每個 host 並行數的上限），下一次建立佇列時生效。"""
+    global MAX_WORKERS
+    if max_workers is not None:
+        MAX_WORKERS = max_workers
+
+def get_download_queue():
+    """取得共用的下載佇列，第一次呼叫時建立。"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = DownloadQueue(max_workers=MAX_WORKERS)
+    return _queue
+
+def submit_download(audio_url, filename, audio_folder):
+    """把下載工作交給共用佇列。"""
+    return get_download_queue().submit(audio_url, filename, audio_folder)
+
+def drain_downloads():
+    """等待共用佇列中的下載全部完成。"""
+    if _queue is None:
+        return 0, []
+    return _queue.drain()
+
+def shutdown_downloads():
+    """關閉共用佇列。"""
+    global _queue
+    with _queue_lock:
+        if _queue is not None:
+            _queue.shutdown()
+            _queue = None
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ChromeDriver 路徑快取模組。
+依本機 Chrome 的主版本號記錄已確認可用的 chromedriver 路徑，
+之後啟動（包括平行模式的每個工作行程）直接讀快取，不必再連網呼叫 WebDriverManager。
+Chrome 版本號也依執行檔的路徑與修改時間快取，執行檔沒有變動時不必再執行 --version。
+"""
+
+import os
+import re
+import json
+import shutil
+import logging
+import subprocess
+import threading
+
+CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "klokah-crawler", "chromedriver.json")
+
+# 離線模式：只使用快取與本機路徑，不呼叫 WebDriverManager（子行程透過環境變數繼承）
+OFFLINE_ENV = "KLOKAH_DRIVER_OFFLINE"
+
+# 依序嘗試的 chromedriver 位置
+MANUAL_DRIVER_PATHS = [
+    r"C:\chromedriver-win64\chromedriver.exe",
+    r"C:\chromedriver\chromedriver.exe",
+    r".\chromedriver.exe",
+    "./chromedriver",
+    "/usr/bin/chromedriver",
+    "/usr/local/bin/chromedriver",
+    "/usr/lib/chromium/chromedriver",
+    "/usr/lib/chromium-browser/chromedriver",
+    "/snap/bin/chromium.chromedriver",
+]
+
+# 用來查詢 Chrome 版本的指令
+CHROME_VERSION_COMMANDS = [
+    ["google-chrome", "--version"],
+    ["google-chrome-stable", "--version"],
+    ["chromium", "--version"],
+    ["chromium-browser", "--version"],
+    ["/Applications/Google Chrome.app/Contents/MacOS/Google Chrome", "--version"],
+    ["reg", "query", r"HKEY_CURRENT_USER\Software\Google\Chrome\BLBeacon", "/v", "version"],
+]
+
+# 快取檔中記錄 Chrome 執行檔版本的欄位：{實際路徑: {"mtime_ns", "size", "version"}}
+BINARY_CACHE_KEY = "chrome_binaries"
+
+_VERSION_RE = re.compile(r"(\d+)\.\d+\.\d+(?:\.\d+)?")
+_lock = threading.Lock()
+_chrome_version = None  # 同一行程只查詢一次
+
+def is_offline():
+    return os.environ.get(OFFLINE_ENV) == "1"
+
+def set_offline(offline=True):
+    """設定離線模式；寫在環境變數裡，spawn 出來的工作行程也會沿用。"""
+    if offline:
+        os.environ[OFFLINE_ENV] = "1"
+    else:
+        os.environ.pop(OFFLINE_ENV, None)
+
+def _run_version_command(command):
+    """執行版本查詢指令，回傳完整版本字串或 None。"""
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = _VERSION_RE.search(output or "")
+    return match.group(0) if match else None
+
+def _chrome_binary(command):
+    """版本查詢指令對應的 Chrome 執行檔實際路徑與 stat；不是執行檔的指令（例如 reg）回傳 None。"""
+    binary = command[0] if os.path.isabs(command[0]) else shutil.which(command[0])
+    if not binary or command[-1] != "--version":
+        return None
+    binary = os.path.realpath(binary)
+    try:
+        return binary, os.stat(binary)
+    except OSError:
+        return None
+
+def _cached_binary_version(binary, stat):
+    """執行檔的路徑、修改時間與大小都和快取相同時回傳快取的版本號。"""
+    entry = _load_cache().get(BINARY_CACHE_KEY, {}).get(binary)
+    if entry and entry.get("mtime_ns") == stat.st_mtime_ns and entry.get("size") == stat.st_size:
+        return entry.get("version")
+    return None
+
+def _remember_binary_version(binary, stat, version):
+    with _lock:
+        cache = _load_cache()
+        cache.setdefault(BINARY_CACHE_KEY, {})[binary] = {
+            "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "version": version,
+        }
+        try:
+            _save_cache(cache)
+        except OSError as e:
+            logging.warning(f"寫入 Chrome 版本快取失敗: {e}")
+
+def chrome_version():
+    """取得本機 Chrome 的完整版本號（例如 126.0.6478.126），找不到時回傳 None。
+    執行檔和上次相同（路徑、修改時間、大小）時直接使用快取，不執行 --version。"""
+    global _chrome_version
+    if _chrome_version is None:
+        for command in CHROME_VERSION_COMMANDS:
+            binary = _chrome_binary(command)
+            version = _cached_binary_version(*binary) if binary else None
+            if version:
+                _chrome_version = version
+                break
+            version = _run_version_command(command)
+            if version:
+                if binary:
+                    _remember_binary_version(*binary, version)
+                _chrome_version = version
+                break
+        else:
+            _chrome_version = ""
+    return _chrome_version or None
+
+def major_version(version):
+    return version.split(".")[0] if version else None
+
+def _load_cache():
+    try:
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache):
+    """原子性地寫入快取檔（多個工作行程可能同時寫入）。"""
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    temp_path = f"{CACHE_FILE}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, CACHE_FILE)
+
+def remember_driver(chrome_major, driver_path):
+    """記錄某個 Chrome 主版本可用的 chromedriver 路徑。"""
+    if not chrome_major:
+        return
+    with _lock:
+        cache = _load_cache()
+        if cache.get(chrome_major) == driver_path:
+            return
+        cache[chrome_major] = driver_path
+        try:
+            _save_cache(cache)
+        except OSError as e:
+            logging.warning(f"寫入 ChromeDriver 快取失敗: {e}")
+
+def forget_driver(chrome_major):
+    """啟動失敗（版本不符）時移除快取紀錄。"""
+    with _lock:
+        cache = _load_cache()
+        if cache.pop(chrome_major, None) is not None:
+            try:
+                _save_cache(cache)
+            except OSError as e:
+                logging.warning(f"更新 ChromeDriver 快取失敗: {e}")
+
+def _driver_major(driver_path):
+    return major_version(_run_version_command([driver_path, "--version"]))
+
+def _find_local_driver(chrome_major):
+    """在常見位置與 PATH 中找主版本相符的 chromedriver（不知道 Chrome 版本時接受第一個找到的）。"""
+    candidates = list(MANUAL_DRIVER_PATHS)
+    on_path = shutil.which("chromedriver")
+    if on_path:
+        candidates.append(on_path)
+    for path in candidates:
+        if not os.path.isfile(path):
+            continue
+        if chrome_major and _driver_major(path) != chrome_major:
+            logging.info(f"略過版本不符的 ChromeDriver: {path}")
+            continue
+        return path
+    return None
+
+def resolve_chromedriver(force_download=False):
+    """取得與本機 Chrome 相符的 chromedriver 路徑。
+    依序使用：快取 → 本機路徑 → WebDriverManager（離線模式時略過）。"""
+    chrome_major = major_version(chrome_version())
+    if not force_download:
+        cached = _load_cache().get(chrome_major) if chrome_major else None
+        if cached and os.path.isfile(cached):
+            logging.info(f"使用快取的 ChromeDriver (Chrome {chrome_major}): {cached}")
+            return cached
+        local = _find_local_driver(chrome_major)
+        if local:
+            logging.info(f"使用本機 ChromeDriver: {local}")
+            remember_driver(chrome_major, local)
+            return local
+    if is_offline():
+        raise RuntimeError(f"離線模式下找不到 Chrome {chrome_major or '未知版本'} 可用的 ChromeDriver")
+    from webdriver_manager.chrome import ChromeDriverManager
+    logging.info("本機找不到可用的 ChromeDriver，使用 WebDriverManager 下載...")
+    path = ChromeDriverManager().install()
+    remember_driver(chrome_major, path)
+    return path
@@ -10,6 +10,11 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 from crawlers.utils import download_audio, save_label, clean_romaji
+from crawlers.downloader import submit_download, drain_downloads
+from crawlers.checkpoint import Checkpoint
+from crawlers.capture import clear_captured
+from crawlers.extract import extract_records, extract_audio_map
+from crawlers.waits import wait_page_ready, wait_present, wait_invisible, wait_clickable, wait_until
 
 def clean_text(text):
     """清理文字，移除括號及其內容"""
@@ -40,10 +45,8 @@ def setup_folder_structure(root_folder, folder_name):
         audio_folder = os.path.join(topic_folder, "audio")
         os.makedirs(audio_folder, exist_ok=True)
         
-        # 創建並初始化 label.txt
+        # label.txt 由 Checkpoint.start_topic 建立或清空
         label_file = os.path.join(topic_folder, "label.txt")
-        with open(label_file, "w", encoding="utf-8") as f:
-            f.write("")
             
         logging.info(f"創建資料夾結構: {topic_folder}")
         return topic_folder, audio_folder, label_file
@@ -55,21 +58,42 @@ def get_audio_mapping(driver):
     """獲取音檔映射"""
     audio_map = {}
     try:
-        audio_set = driver.find_element(By.ID, "audioSet")
-        audio_tags = audio_set.find_elements(By.CSS_SELECTOR, "audio.player-ab")
-        for audio in audio_tags:
-            data_value = audio.get_attribute("data-value")
-            try:
-                source = audio.find_element(By.TAG_NAME, "source")
-                src = source.get_attribute("src")
-                audio_map[data_value] = src
-                logging.info(f"音檔映射: {data_value} -> {src}")
-            except Exception:
-                continue
+        audio_map = extract_audio_map(driver)
+        if not audio_map:
+            logging.warning("audioSet 中沒有音檔")
     except Exception as e:
         logging.warning(f"找不到 audioSet: {e}")
     return audio_map
 
+# 目前顯示中的學習季：第一個看得到的 section 所在的容器、容器中第一個播放按鈕的 data-value，
+# 以及 audioSet 是否已經載入這個 data-value 的音檔
+ACTIVE_SEASON_SCRIPT = """
+const visible = el => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+const section = Array.from(document.querySelectorAll('div.esa-learn-section')).find(visible);
+if (!section) return null;
+const container = section.parentElement;
+const button = container.querySelector('div.esa-learn-section button.esa-sound');
+const value = button ? button.getAttribute('data-value') : null;
+const loaded = !!value && Array.from(document.querySelectorAll('#audioSet audio.player-ab'))
+    .some(audio => audio.getAttribute('data-value') === value);
+return {container: container, value: value, loaded: loaded};
+"""
+
+def active_season(driver):
+    """回傳目前學習季的 {container, value, loaded}，還沒有內容時回傳 None。"""
+    return driver.execute_script(ACTIVE_SEASON_SCRIPT)
+
+def wait_for_season(driver, previous_value, timeout=10):
+    """點擊學習按鈕後，等到顯示的內容換成新的學習季（第一個播放按鈕的 data-value 和上一個學習季不同，
+    且 audioSet 已載入它的音檔）。上一個學習季的 DOM 可能還在，只等 section 出現會讀到舊內容。
+    逾時表示這一季沒有讀到，不校正逾時。"""
+    def changed(d):
+        season = active_season(d)
+        if season and season["value"] and season["value"] != previous_value and season["loaded"]:
+            return season
+        return False
+    return wait_until(driver, changed, timeout, "essay_season")
+
 def detect_level_type(driver):
     """檢測級別類型：初中級或中高級"""
     try:
@@ -98,116 +122,95 @@ def detect_level_type(driver):
     
     return "unknown"
 
-def crawl_elementary_middle_level(driver, audio_folder, label_file, start_idx, audio_map):
-    """爬取初、中級內容"""
+# 初、中級每個 slide：一次只顯示一張，其餘是隱藏的，句子要用 textContent 才讀得到
+SLIDE_FIELDS = {
+    "data_value": ("button.esa-sound", "@data-value"),
+    "sentence": ("div.esa-learn-sentence div", "textContent", True),
+}
+
+def crawl_elementary_middle_level(driver, audio_folder, label_file, start_idx, audio_map, root=None):
+    """爬取初、中級內容
+    所有 slide 都已經在 DOM 中（只是隱藏），音檔也在 audioSet 預先載入，
+    因此一次讀回整個學習季的 slide，不再逐頁點擊右箭頭等待切換。
+    root 是目前學習季的容器，只讀它底下的 slide。
+    回傳 (下一個編號, 是否全部成功)。"""
     label_idx = start_idx
+    ok = True
     logging.info("開始爬取初、中級內容")
 
-    while True:
+    try:
+        slides = extract_records(driver, "div.esa-learn-section.slide", SLIDE_FIELDS, root)
+    except Exception as e:
+        logging.error(f"爬取初、中級內容時出錯: {e}")
+        return label_idx, False
+    logging.info(f"找到 {len(slides)} 個slide")
+
+    for i, slide in enumerate(slides):
         try:
-            # 找到當前顯示的section
-            logging.info("尋找當前顯示的section...")
-            current_section = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 'div.esa-learn-section.slide[style*="display: block"]'))
-            )
-            logging.info("找到當前顯示的section")
-            
-            # 在當前section中找播放按鈕（不需要點擊，音檔已經加載了）
-            logging.info("在當前section中尋找播放按鈕...")
-            play_btn = current_section.find_element(By.CSS_SELECTOR, "button.esa-sound")
-            data_value = play_btn.get_attribute("data-value")
-            logging.info(f"找到播放按鈕，data-value: {data_value}（音檔已預加載，無需點擊）")
-            
-            # 在當前section中提取文字內容
-            logging.info("在當前section中提取文字內容...")
-            sentence_element = current_section.find_element(By.CSS_SELECTOR, "div.esa-learn-sentence")
-            sentence_divs = sentence_element.find_elements(By.TAG_NAME, "div")
-            
+            data_value = slide["data_value"]
+            if data_value is None:
+                logging.info(f"第 {i+1} 個slide沒有播放按鈕，跳過")
+                continue
+
+            # 隱藏的 slide 沒有排版，textContent 的換行與縮排要自己收斂
+            sentence_divs = [" ".join(text.split()) for text in slide["sentence"]]
             aboriginal_text = ""
             chinese_text = ""
-            
             if len(sentence_divs) >= 2:
-                aboriginal_text = sentence_divs[0].text.strip()
-                chinese_text = sentence_divs[1].text.strip()
+                aboriginal_text = sentence_divs[0]
+                chinese_text = sentence_divs[1]
                 logging.info(f"提取到文字 - 族語: '{aboriginal_text}', 中文: '{chinese_text}'")
             else:
-                logging.warning(f"文字提取異常，只找到 {len(sentence_divs)} 個div元素")
-            
+                logging.warning(f"第 {i+1} 個slide文字提取異常，只找到 {len(sentence_divs)} 個div元素")
+
             # 生成音檔名稱
             mp3_name = f"{label_idx:04d}.mp3"
-            
+
             # 從audio mapping下載音檔（音檔已經在進入學習時預加載了）
-            if data_value and data_value in audio_map:
-                audio_src = audio_map[data_value]
-                download_audio(audio_src, mp3_name, audio_folder)
-                logging.info(f"從audioSet下載音檔: {mp3_name}")
+            if data_value in audio_map:
+                submit_download(audio_map[data_value], mp3_name, audio_folder)
+                logging.info(f"從audioSet加入下載佇列: {mp3_name}")
             else:
                 logging.warning(f"找不到音檔 data-value: {data_value}")
-            
+
             # 清理文字
             aboriginal_clean = clean_text(aboriginal_text)
             chinese_clean = clean_text(chinese_text)
-            
+
             # 儲存文字
             combined_text = f"{chinese_clean}({aboriginal_clean})"
             with open(label_file, "a", encoding="utf-8") as f:
                 f.write(f"{mp3_name}\n{combined_text}\nmale\none\n\n")
-            
+
             logging.info(f"處理完成: {combined_text}")
             label_idx += 1
-            
-            # 檢查下一個按鈕
-            right_btn = driver.find_element(By.ID, "esa-right")
-            style = right_btn.get_attribute("style")
-            
-            if "visibility: hidden" in style or "display: none" in style:
-                logging.info("下一個按鈕已隱藏，結束爬取")
-                break
-            
-            # 點擊下一個
-            logging.info("點擊右箭頭按鈕，進入下一頁")
-            right_btn.click()
-            
-            # 等待新內容載入，檢查顯示的section是否變化
-            try:
-                # 記錄當前的data-value以檢測變化
-                current_data_value = data_value
-                logging.info(f"等待新內容載入，當前data-value: {current_data_value}")
-                
-                # 等待新的section出現且其中的播放按鈕data-value改變
-                WebDriverWait(driver, 15).until(
-                    lambda d: d.find_element(By.CSS_SELECTOR, 'div.esa-learn-section.slide[style*="display: block"] button.esa-sound').get_attribute("data-value") != current_data_value
-                )
-                logging.info("新內容已載入")
-                time.sleep(1)  # 額外等待確保內容完全載入
-                
-            except TimeoutException:
-                logging.warning("等待新內容載入超時，檢查是否已到最後一頁")
-                # 重新檢查右箭頭按鈕狀態
-                right_btn_check = driver.find_element(By.ID, "esa-right")
-                style_check = right_btn_check.get_attribute("style")
-                if "visibility: hidden" in style_check or "display: none" in style_check:
-                    logging.info("確認已到最後一頁，結束爬取")
-                    break
-                else:
-                    logging.error("等待新內容載入失敗，但右箭頭仍可見，可能出現未知錯誤")
-                    break
-            
+
         except Exception as e:
-            logging.error(f"爬取初、中級內容時出錯: {e}")
-            break
-    
-    return label_idx
+            logging.error(f"處理第 {i+1} 個slide時出錯: {e}")
+            ok = False
+            continue
+
+    logging.info(f"初、中級內容爬取完成，處理了 {label_idx - start_idx} 個句子")
+    return label_idx, ok
 
-def crawl_middle_high_level(driver, audio_folder, label_file, start_idx, audio_map):
-    """爬取中高級內容"""
+# 短文每個 section：播放按鈕的 data-value 與句子（第一個 div 是族語、第二個是中文）
+SECTION_FIELDS = {
+    "has_button": ("button.esa-sound", "exists"),
+    "has_sentence": ("div.esa-learn-sentence", "exists"),
+    "data_value": ("button.esa-sound", "@data-value"),
+    "sentence": ("div.esa-learn-sentence div", "text", True),
+}
+
+def crawl_middle_high_level(driver, audio_folder, label_file, start_idx, audio_map, root=None):
+    """爬取中高級內容，root 是目前學習季的容器，回傳 (下一個編號, 是否全部成功)"""
     label_idx = start_idx
+    ok = True
     logging.info("開始爬取中高級內容")
     
     try:
-        # 中高級一次性顯示所有內容，找到所有的section
-        logging.info("尋找所有esa-learn-section...")
-        all_sections = driver.find_elements(By.CSS_SELECTOR, "div.esa-learn-section")
+        # 中高級一次性顯示所有內容，一次讀回所有section
+        logging.info("讀取所有esa-learn-section...")
+        all_sections = extract_records(driver, "div.esa-learn-section", SECTION_FIELDS, root)
         logging.info(f"找到 {len(all_sections)} 個section")
         
         # 遍歷每個section來提取內容
@@ -216,26 +219,23 @@ def crawl_middle_high_level(driver, audio_folder, label_file, start_idx, audio_m
                 logging.info(f"處理第 {i+1} 個section...")
                 
                 # 檢查section是否有內容
-                try:
-                    play_btn = section.find_element(By.CSS_SELECTOR, "button.esa-sound")
-                    sentence_element = section.find_element(By.CSS_SELECTOR, "div.esa-learn-sentence")
-                except NoSuchElementException:
+                if not section["has_button"] or not section["has_sentence"]:
                     logging.info(f"第 {i+1} 個section沒有播放按鈕或句子，跳過")
                     continue
                 
                 # 獲取data-value
-                data_value = play_btn.get_attribute("data-value")
+                data_value = section["data_value"]
                 logging.info(f"第 {i+1} 個section，data-value: {data_value}")
                 
                 # 提取文字內容
-                sentence_divs = sentence_element.find_elements(By.TAG_NAME, "div")
+                sentence_divs = section["sentence"]
                 
                 aboriginal_text = ""
                 chinese_text = ""
                 
                 if len(sentence_divs) >= 2:
-                    aboriginal_text = sentence_divs[0].text.strip()
-                    chinese_text = sentence_divs[1].text.strip()
+                    aboriginal_text = sentence_divs[0]
+                    chinese_text = sentence_divs[1]
                     logging.info(f"提取到文字 - 族語: '{aboriginal_text}', 中文: '{chinese_text}'")
                 else:
                     logging.warning(f"第 {i+1} 個section文字提取異常，只找到 {len(sentence_divs)} 個div元素")
@@ -253,8 +253,8 @@ def crawl_middle_high_level(driver, audio_folder, label_file, start_idx, audio_m
                 audio_downloaded = False
                 if data_value and data_value in audio_map:
                     audio_src = audio_map[data_value]
-                    download_audio(audio_src, mp3_name, audio_folder)
-                    logging.info(f"從audioSet下載音檔: {mp3_name}")
+                    submit_download(audio_src, mp3_name, audio_folder)
+                    logging.info(f"從audioSet加入下載佇列: {mp3_name}")
                     audio_downloaded = True
                 else:
                     logging.warning(f"第 {i+1} 個section找不到音檔 data-value: {data_value}")
@@ -273,17 +273,22 @@ def crawl_middle_high_level(driver, audio_folder, label_file, start_idx, audio_m
                 
             except Exception as e:
                 logging.error(f"處理第 {i+1} 個section時出錯: {e}")
+                ok = False
                 continue
                 
     except Exception as e:
         logging.error(f"爬取中高級內容時出錯: {e}")
+        ok = False
     
     logging.info(f"中高級內容爬取完成，處理了 {label_idx - start_idx} 個句子")
-    return label_idx
+    return label_idx, ok
 
-def crawl_season_content(driver, season_number, audio_folder, label_file, start_idx):
-    """爬取指定學習季的內容"""
+def crawl_season_content(driver, season_number, audio_folder, label_file, start_idx, previous_value=None):
+    """爬取指定學習季的內容，回傳 (下一個編號, 這一季第一個播放按鈕的 data-value, 是否成功)。
+    previous_value 是上一個爬過的學習季的 data-value，用來判斷內容已經換成這一季。"""
     label_idx = start_idx
+    season_value = previous_value
+    ok = False
     
     try:
         # 點擊學習按鈕
@@ -291,7 +296,17 @@ def crawl_season_content(driver, season_number, audio_folder, label_file, start_
             EC.element_to_be_clickable((By.ID, f"esa-season-{season_number}"))
         )
         season_btn.click()
-        time.sleep(2)
+        # 等到內容真的換成這一季（舊的 section 可能還在 DOM 中），不再固定等 2 秒
+        season = wait_for_season(driver, previous_value)
+        if season is None:
+            season = active_season(driver)
+            if not season or not season["value"] or season["value"] == previous_value:
+                logging.error(f"學習{season_number} 的內容沒有載入，跳過")
+                return label_idx, season_value, False
+            # 內容已經換了，只是 audioSet 裡沒有第一句的音檔，照常爬取（缺的音檔會記錄警告）
+            logging.warning(f"學習{season_number} 的 audioSet 沒有第一句的音檔: {season['value']}")
+        season_value = season["value"]
+        wait_present(driver, (By.CSS_SELECTOR, "div.level_label"), 2)
         
         logging.info(f"開始爬取學習{season_number}")
         
@@ -304,28 +319,31 @@ def crawl_season_content(driver, season_number, audio_folder, label_file, start_
         logging.info(f"檢測到級別類型: {level_type}")
         
         if level_type == "elementary_middle":
-            label_idx = crawl_elementary_middle_level(driver, audio_folder, label_file, label_idx, audio_map)
+            label_idx, ok = crawl_elementary_middle_level(driver, audio_folder, label_file, label_idx, audio_map, season["container"])
         elif level_type == "middle_high":
-            label_idx = crawl_middle_high_level(driver, audio_folder, label_file, label_idx, audio_map)
+            label_idx, ok = crawl_middle_high_level(driver, audio_folder, label_file, label_idx, audio_map, season["container"])
         else:
             logging.warning(f"未知的級別類型: {level_type}")
         
     except Exception as e:
         logging.error(f"爬取學習{season_number}時出錯: {e}")
+        ok = False
     
-    return label_idx
+    return label_idx, season_value, ok
 
 def crawl_essay(driver, main_lang, dialect, folder_name):
-    """爬取族語短文內容"""
+    """爬取族語短文內容，已完成的大輪依 .checkpoint.json 跳過"""
     base_url = "https://web.klokah.tw/essay/"
     driver.get(base_url)
-    time.sleep(2)
+    wait_page_ready(driver)
     
     root_folder = os.path.join(main_lang, dialect, folder_name)
     os.makedirs(root_folder, exist_ok=True)
     logging.info(f"創建根目錄: {root_folder}")
     
+    checkpoint = Checkpoint(root_folder)
     current_number = 1
+    season_value = None  # 上一個爬過的學習季第一個播放按鈕的 data-value
     
     while True:
         try:
@@ -334,6 +352,10 @@ def crawl_essay(driver, main_lang, dialect, folder_name):
             if not current_folder:
                 logging.info("找不到下一個大輪，結束爬取")
                 break
+            if checkpoint.is_done(current_folder):
+                logging.info(f"大輪 {current_folder} 已完成，跳過")
+                current_number += 1
+                continue
                 
             logging.info(f"準備處理大輪: {current_folder}")
             
@@ -341,9 +363,11 @@ def crawl_essay(driver, main_lang, dialect, folder_name):
             topic_folder, audio_folder, label_file = setup_folder_structure(root_folder, current_folder)
             if not topic_folder:
                 break
+            # 音檔在背景下載，進度以整個大輪為單位記錄
+            checkpoint.start_topic(current_folder, label_file)
             
             # 清空 network 請求
-            driver.requests.clear()
+            clear_captured(driver)
             
             # 點擊大輪圖片
             img_selector = f'img[src="img/{current_number:02d}.png"]'
@@ -351,10 +375,11 @@ def crawl_essay(driver, main_lang, dialect, folder_name):
                 EC.element_to_be_clickable((By.CSS_SELECTOR, img_selector))
             )
             img.click()
-            time.sleep(2)
+            wait_clickable(driver, (By.ID, "esa-back"))
             logging.info(f"點擊第 {current_number:02d} 大輪圖片")
             
             label_idx = 1
+            round_ok = True  # 有任何學習季沒有爬完就不記為完成
             
             # 爬取學習一和學習二
             for season in [1, 2]:
@@ -362,18 +387,28 @@ def crawl_essay(driver, main_lang, dialect, folder_name):
                     # 檢查學習按鈕是否存在
                     season_btn = driver.find_element(By.ID, f"esa-season-{season}")
                     if season_btn.is_displayed():
-                        label_idx = crawl_season_content(driver, season, audio_folder, label_file, label_idx)
+                        label_idx, season_value, season_ok = crawl_season_content(
+                            driver, season, audio_folder, label_file, label_idx, season_value)
+                        round_ok = round_ok and season_ok
                 except Exception as e:
                     logging.error(f"處理學習{season}時出錯: {e}")
+                    round_ok = False
                     continue
             
+            # 等待本大輪的背景下載全部完成，學習季與下載全部成功才記為完成
+            done, failed = drain_downloads()
+            if round_ok and not failed:
+                checkpoint.mark_done(current_folder, label_file=label_file)
+            else:
+                logging.warning(f"大輪 {current_folder} 未完整完成，下次執行時重新爬取")
+            
             # 返回主頁面
             try:
                 back_btn = WebDriverWait(driver, 10).until(
                     EC.element_to_be_clickable((By.ID, "esa-back"))
                 )
                 back_btn.click()
-                time.sleep(2)
+                wait_invisible(driver, (By.ID, "esa-back"))
                 logging.info("返回主頁面")
             except Exception as e:
                 logging.error(f"返回主頁面失敗: {e}")
@@ -384,4 +419,5 @@ def crawl_essay(driver, main_lang, dialect, folder_name):
             logging.error(f"處理大輪時出錯: {e}")
             break
     
+    drain_downloads()
     logging.info("族語短文爬取完成") 
\ No newline at end of file
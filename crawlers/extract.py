@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+頁面資料擷取模組。
+原本每個欄位都要一次 find_element / .text / get_attribute，每次都是一趟到 chromedriver 的 HTTP 請求；
+這裡用一次 execute_script 把整頁（或整個容器）需要的欄位讀成 JSON 回傳。
+
+欄位以 {名稱: (CSS selector, 來源[, many])} 描述，selector 相對於每一筆的元素，空字串表示元素本身：
+  "text"         畫面上看得到的文字（同 WebElement.text，隱藏的元素為空字串）
+  "textContent"  包含隱藏內容的文字（同 get_attribute("textContent")）
+  "@名稱"        屬性（同 get_attribute：有同名 property 時取 property，例如 src、href 會是完整網址）
+  "exists"       元素是否存在
+  "element"      元素本身（回傳 WebElement，之後要點擊時使用）
+many=True 時回傳所有符合元素的值（list）。找不到元素時值為 None。
+extract_grouped 可以另外指定 scope：每組只在第一個符合 scope 的元素底下找（同 find_element 再 find_elements）。
+"""
+
+EXTRACT_SCRIPT = """
+const [groupSelector, selector, fields, root, scope] = arguments;
+const base = root || document;
+const visible = el => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)
+    && window.getComputedStyle(el).visibility !== 'hidden';
+const read = (el, source) => {
+    if (source === 'exists') return !!el;
+    if (!el) return null;
+    if (source === 'element') return el;
+    if (source === 'text') return visible(el) ? (el.innerText || '').trim() : '';
+    if (source === 'textContent') return (el.textContent || '').trim();
+    const name = source.slice(1);
+    const prop = name.startsWith('data-') ? undefined : el[name];
+    if (prop !== undefined && prop !== null && typeof prop !== 'object' && typeof prop !== 'function') {
+        return String(prop);
+    }
+    return el.getAttribute(name);
+};
+const pick = (el, spec) => {
+    const [sel, source, many] = spec;
+    if (many) return Array.from(sel ? el.querySelectorAll(sel) : [el]).map(node => read(node, source));
+    return read(sel ? el.querySelector(sel) : el, source);
+};
+const record = el => {
+    const result = {};
+    for (const [name, spec] of Object.entries(fields)) result[name] = pick(el, spec);
+    return result;
+};
+const records = container => {
+    const base = scope ? container.querySelector(scope) : container;
+    if (!base) return null;
+    return Array.from(base.querySelectorAll(selector)).map(record);
+};
+if (!selector) return record(base);
+if (groupSelector) return Array.from(base.querySelectorAll(groupSelector)).map(records);
+return records(base);
+"""
+
+# 閱讀類頁面（text-frame iframe 內 div#read-main）的句子區塊：
+# 播放按鈕、羅馬拼音單字、中文（中文可能是隱藏的，用 textContent 取值）
+# 圖畫故事、閱讀文本：單字取 Ab 底下所有 div.word，中文取 class 含 read-sentence 與 Ch 的元素
+READ_BLOCK_FIELDS = {
+    "play_btn": ("button.read-play-btn", "element"),
+    "words": ("div.read-sentence.Ab div.word", "text", True),
+    "chinese": ("div.read-sentence[class*='Ch']", "textContent"),
+}
+
+# 文化、讀寫的文章分頁：只抓 div.read-sentence.Ab 的直接子元素 div.word，中文取 div.read-sentence.Ch
+READ_SENTENCE_FIELDS = {
+    "play_btn": ("button.read-play-btn", "element"),
+    "words": ("div.read-sentence.Ab > div.word", "text", True),
+    "chinese": ("div.read-sentence.Ch", "textContent"),
+}
+
+# 情境族語對話練習：每個顯示中的學習季只讀第一個 dia-frame-*-inner，
+# 其中所有 div.section 的直接子 div 各是一句對話
+DIALOGUE_SEASON_SELECTOR = "div.dia-season-div[style*='display: block']"
+DIALOGUE_FRAME_SELECTOR = "div[class^='dia-frame-'][class$='-inner']"
+DIALOGUE_ROW_SELECTOR = "div.section > div"
+DIALOGUE_FIELDS = {
+    "num": (".dia-num", "text"),
+    "ab": (".dia-show-ab", "text"),
+    "ch": (".dia-show-ch", "text"),
+    "data_value": (".dia-sound", "@data-value"),
+}
+
+# 單詞頁（div.wrapper.view_vocabulary）目前顯示的單字與播放按鈕
+VOCABULARY_FIELDS = {
+    "ab": ("div.wrapper.view_vocabulary > div.Ab", "textContent"),
+    "ch": ("div.wrapper.view_vocabulary > div.Ch", "textContent"),
+    "play_btn": ("a.audio_1", "element"),
+}
+
+def _field_specs(fields):
+    return {name: list(spec) for name, spec in fields.items()}
+
+def extract_records(driver, selector, fields, root=None):
+    """一次讀回所有符合 selector 的元素的欄位，回傳 dict 的 list（依文件順序）。
+    root 是 WebElement 時只在它底下找。"""
+    return driver.execute_script(EXTRACT_SCRIPT, None, selector, _field_specs(fields), root)
+
+def extract_grouped(driver, group_selector, selector, fields, root=None, scope=None):
+    """同 extract_records，但先依 group_selector 分組（例如每個顯示中的學習季），回傳 list 的 list。
+    有 scope 時每組只在第一個符合 scope 的元素底下找，找不到 scope 的組回傳 None。"""
+    return driver.execute_script(EXTRACT_SCRIPT, group_selector, selector, _field_specs(fields), root, scope)
+
+def extract_one(driver, fields, root=None):
+    """讀取單一組欄位（selector 相對於整頁或 root），回傳 dict。"""
+    return driver.execute_script(EXTRACT_SCRIPT, None, None, _field_specs(fields), root)
+
+def extract_read_blocks(driver, fields=READ_BLOCK_FIELDS):
+    """讀回目前 iframe 中所有句子區塊，romaji 為單字以空白連接的結果。
+    fields 預設為 READ_BLOCK_FIELDS，文化與讀寫頁面傳入 READ_SENTENCE_FIELDS。"""
+    blocks = extract_records(driver, "div#read-main > div", fields)
+    for block in blocks:
+        block["romaji"] = " ".join(w for w in block["words"] if w).strip()
+    return blocks
+
+def extract_audio_map(driver, selector="#audioSet audio.player-ab"):
+    """讀取頁面預先載入的音檔對應表 {data-value: 音檔網址}。"""
+    records = extract_records(driver, selector, {
+        "data_value": ("", "@data-value"),
+        "src": ("source", "@src"),
+    })
+    return {r["data_value"]: r["src"] for r in records if r["src"]}
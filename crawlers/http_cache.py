@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+磁碟上的 HTTP 條件式快取模組。
+記錄每個網址的 ETag / Last-Modified 與內容，重新爬取時送出
+If-None-Match / If-Modified-Since，伺服器回 304 就直接使用快取的檔案。
+快取檔一律是唯讀的獨立複本，不和輸出資料夾裡的檔案共用 inode，
+避免原地改寫輸出檔時連帶改壞快取。
+"""
+
+import os
+import stat
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from .session import get_session
+
+CACHE_DIR_NAME = ".http_cache"
+CACHE_ROOT = None  # 呼叫 enable_http_cache() 後才會設定
+
+_lock = threading.Lock()
+_index = {}  # url -> {"etag", "last_modified", "sha256", "length"}
+_stats = {"hits": 0, "misses": 0}
+
+def _index_path():
+    return os.path.join(CACHE_ROOT, "index.jsonl")
+
+def _blob_path(sha256):
+    return os.path.join(CACHE_ROOT, "blobs", sha256[:2], sha256)
+
+def enable_http_cache(root=".", compact=True):
+    """在輸出根目錄啟用快取並載入索引（索引為 append-only，後寫入的紀錄優先）。
+    多個行程共用快取時只讓主行程 compact，工作行程只附加紀錄。"""
+    global CACHE_ROOT
+    CACHE_ROOT = os.path.join(root, CACHE_DIR_NAME)
+    os.makedirs(CACHE_ROOT, exist_ok=True)
+    _index.clear()
+    if os.path.exists(_index_path()):
+        with open(_index_path(), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    url = record.pop("url")
+                except (ValueError, KeyError):
+                    continue
+                if record.get("deleted"):
+                    _index.pop(url, None)
+                else:
+                    _index[url] = record
+        if compact:
+            _compact_index()
+    logging.info(f"啟用 HTTP 快取: {CACHE_ROOT}（{len(_index)} 筆紀錄）")
+
+def _compact_index():
+    """把索引重寫成每個網址只留一筆。"""
+    temp_path = _index_path() + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for url, record in _index.items():
+            f.write(json.dumps(dict(record, url=url), ensure_ascii=False) + "\n")
+    os.replace(temp_path, _index_path())
+
+def _lookup(url):
+    """取得網址的快取紀錄，快取檔不存在時視為沒有快取。"""
+    if CACHE_ROOT is None:
+        return None
+    with _lock:
+        record = _index.get(url)
+    if record and os.path.exists(_blob_path(record["sha256"])):
+        return record
+    return None
+
+def _write_blob(blob, src_path=None, data=None):
+    """把檔案（或 bytes）複製成唯讀的快取檔，已存在時不做任何事。"""
+    if os.path.exists(blob):
+        return
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    temp_path = f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        if data is None:
+            shutil.copyfile(src_path, temp_path)
+        else:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+        os.chmod(temp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(temp_path, blob)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def conditional_headers(url):
+    """回傳條件式請求標頭；沒有快取時回傳空 dict。"""
+    record = _lookup(url)
+    headers = {}
+    if record:
+        if record.get("etag"):
+            headers["If-None-Match"] = record["etag"]
+        if record.get("last_modified"):
+            headers["If-Modified-Since"] = record["last_modified"]
+    return headers
+
+def cached_entry(url):
+    """取得網址的快取紀錄（含 sha256 與 length），沒有時回傳 None。"""
+    return _lookup(url)
+
+def materialize(url, target_path):
+    """把快取內容放到目標路徑（原子性改名），回傳快取紀錄，失敗時回傳 None。"""
+    record = _lookup(url)
+    if not record:
+        return None
+    folder, name = os.path.split(target_path)
+    temp_path = os.path.join(folder, f".{name}.cache")
+    try:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        shutil.copyfile(_blob_path(record["sha256"]), temp_path)
+        os.replace(temp_path, target_path)
+    except OSError as e:
+        logging.warning(f"從快取還原檔案失敗: {target_path}, {e}")
+        return None
+    with _lock:
+        _stats["hits"] += 1
+    return record
+
+def remember(url, headers, file_path, sha256):
+    """把剛下載完成的檔案與驗證資訊存進快取；伺服器沒有給驗證資訊時不快取。"""
+    if CACHE_ROOT is None:
+        return
+    etag = headers.get("etag") or headers.get("ETag")
+    last_modified = headers.get("last_modified") or headers.get("Last-Modified")
+    if not etag and not last_modified:
+        return
+    blob = _blob_path(sha256)
+    try:
+        _write_blob(blob, src_path=file_path)
+    except OSError as e:
+        logging.warning(f"寫入 HTTP 快取失敗: {url}, {e}")
+        return
+    record = {"etag": etag, "last_modified": last_modified, "sha256": sha256, "length": os.path.getsize(blob)}
+    with _lock:
+        _index[url] = record
+        _stats["misses"] += 1
+        with open(_index_path(), "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(record, url=url), ensure_ascii=False) + "\n")
+
+def forget(url):
+    """快取內容驗證失敗時呼叫：移除索引紀錄與快取檔，下一次請求不再帶條件式標頭。"""
+    if CACHE_ROOT is None:
+        return
+    with _lock:
+        record = _index.pop(url, None)
+        with open(_index_path(), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"url": url, "deleted": True}, ensure_ascii=False) + "\n")
+    if record:
+        blob = _blob_path(record["sha256"])
+        try:
+            if os.path.exists(blob):
+                os.chmod(blob, stat.S_IWUSR | stat.S_IRUSR)
+                os.remove(blob)
+        except OSError as e:
+            logging.warning(f"刪除快取檔失敗: {blob}, {e}")
+    logging.warning(f"捨棄無效的 HTTP 快取: {url}")
+
+def cached_get(url, timeout=10):
+    """以條件式請求取得小型內容（例如 JSON），回傳 (狀態碼, bytes)；304 時回傳 (200, 快取內容)。"""
+    resp = get_session().get(url, timeout=timeout, headers=conditional_headers(url))
+    if resp.status_code == 304:
+        record = _lookup(url)
+        if record:
+            with open(_blob_path(record["sha256"]), "rb") as f:
+                data = f.read()
+            with _lock:
+                _stats["hits"] += 1
+            return 200, data
+        # 快取檔不見了，改用一般請求
+        resp = get_session().get(url, timeout=timeout)
+    if resp.status_code == 200 and CACHE_ROOT is not None:
+        data = resp.content
+        sha256 = hashlib.sha256(data).hexdigest()
+        blob = _blob_path(sha256)
+        _write_blob(blob, data=data)
+        remember(url, resp.headers, blob, sha256)
+    return resp.status_code, resp.content
+
+def cache_stats():
+    """回傳 (命中數, 未命中數)。"""
+    with _lock:
+        return _stats["hits"], _stats["misses"]
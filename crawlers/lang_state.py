@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+語言狀態保存模組。
+第一次用 select_language 點選語言後，把網站的 cookies 與 localStorage 存到 .lang_state，
+之後新開的 driver 在載入頁面前就先注入這些狀態，頁面載入後只需快速確認方言是否正確。
+"""
+
+import os
+import json
+import logging
+import threading
+import weakref
+
+STATE_DIR = ".lang_state"
+
+_lock = threading.Lock()
+_states = {}  # (main_lang, dialect) -> state
+_injected = weakref.WeakKeyDictionary()  # driver -> {"key": (main_lang, dialect), "script_id": 注入腳本的 id}
+
+# 頁面上目前方言的訊號：帶有選取狀態的方言連結或選項、語言切換按鈕本身的文字
+# （不含底下列出所有方言的選單），以及目前網域的 localStorage
+ACTIVE_DIALECT_SCRIPT = """
+const own = el => Array.from(el.childNodes)
+    .filter(node => node.nodeType === Node.TEXT_NODE)
+    .map(node => node.textContent).join(' ').replace(/\\s+/g, ' ').trim();
+const selected = Array.from(document.querySelectorAll(
+    'a.dialect.active, a.dialect.selected, a.dialect.on, a.dialect.current, .switcher option:checked'))
+    .map(node => (node.textContent || '').trim()).filter(text => text);
+const switcher = document.querySelector('.switcher');
+const storage = {};
+for (let i = 0; i < window.localStorage.length; i++) {
+    const key = window.localStorage.key(i);
+    storage[key] = window.localStorage.getItem(key);
+}
+return {
+    selected: selected,
+    switcher: switcher ? (own(switcher) || (switcher.innerText || '').split('\\n')[0].trim()) : null,
+    origin: window.location.origin,
+    storage: storage,
+};
+"""
+
+# 讀取目前網域的 localStorage
+READ_STORAGE_SCRIPT = """
+const items = {};
+for (let i = 0; i < window.localStorage.length; i++) {
+    const key = window.localStorage.key(i);
+    items[key] = window.localStorage.getItem(key);
+}
+return {origin: window.location.origin, items: items};
+"""
+
+def _key(lang_config):
+    return (lang_config["main_lang"], lang_config["dialect"])
+
+def _state_path(lang_config):
+    return os.path.join(STATE_DIR, f"{lang_config['main_lang']}_{lang_config['dialect']}.json")
+
+def load_language_state(lang_config):
+    """取得保存的語言狀態（先找記憶體再找檔案），沒有時回傳 None。"""
+    key = _key(lang_config)
+    with _lock:
+        if key in _states:
+            return _states[key]
+    try:
+        with open(_state_path(lang_config), "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with _lock:
+        _states[key] = state
+    return state
+
+def save_language_state(driver, lang_config, main_lang_name, dialect_name):
+    """在 select_language 成功後保存目前的 cookies 與 localStorage。"""
+    try:
+        storage = driver.execute_script(READ_STORAGE_SCRIPT)
+        signals = driver.execute_script(ACTIVE_DIALECT_SCRIPT)
+        state = {
+            "main_lang_name": main_lang_name,
+            "dialect_name": dialect_name,
+            "cookies": driver.get_cookies(),
+            "origin": storage["origin"],
+            "local_storage": storage["items"],
+            # 選好方言後語言切換按鈕上顯示的文字，之後用來比對目前的方言
+            "switcher_label": signals["switcher"],
+        }
+    except Exception as e:
+        logging.warning(f"讀取語言狀態失敗: {e}")
+        return None
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = _state_path(lang_config)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+    with _lock:
+        _states[_key(lang_config)] = state
+    # 瀏覽器本身已經是這個方言，移除之前注入的其他方言狀態
+    _remove_injected_script(driver)
+    _injected[driver] = {"key": _key(lang_config), "script_id": None}
+    logging.info(f"已保存語言狀態: {path}")
+    return state
+
+def forget_language_state(lang_config):
+    """狀態失效時刪除，下次重新點選。"""
+    with _lock:
+        _states.pop(_key(lang_config), None)
+    try:
+        os.remove(_state_path(lang_config))
+    except OSError:
+        pass
+
+def _remove_injected_script(driver):
+    previous = _injected.pop(driver, None)
+    if previous and previous["script_id"]:
+        try:
+            driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": previous["script_id"]})
+        except Exception as e:
+            logging.warning(f"移除舊的語言狀態腳本失敗: {e}")
+
+def inject_language_state(driver, lang_config, state):
+    """透過 DevTools 在頁面載入前設定 cookies 與 localStorage，同一個 driver 只注入一次。"""
+    current = _injected.get(driver)
+    if current and current["key"] == _key(lang_config):
+        return True
+    _remove_injected_script(driver)
+    script_id = None
+    try:
+        for cookie in state["cookies"]:
+            params = {
+                "name": cookie["name"],
+                "value": cookie["value"],
+                "domain": cookie.get("domain"),
+                "path": cookie.get("path", "/"),
+                "secure": cookie.get("secure", False),
+                "httpOnly": cookie.get("httpOnly", False),
+            }
+            if "expiry" in cookie:
+                params["expires"] = cookie["expiry"]
+            driver.execute_cdp_cmd("Network.setCookie", params)
+        if state["local_storage"]:
+            source = (f"if (window.location.origin === {json.dumps(state['origin'])}) {{"
+                      f" const items = {json.dumps(state['local_storage'], ensure_ascii=False)};"
+                      " for (const key in items) { window.localStorage.setItem(key, items[key]); } }")
+            result = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": source})
+            script_id = result.get("identifier")
+    except Exception as e:
+        logging.warning(f"注入語言狀態失敗: {e}")
+        return False
+    _injected[driver] = {"key": _key(lang_config), "script_id": script_id}
+    return True
+
+def language_active(driver, lang_config, state):
+    """快速確認頁面上目前的方言是否為保存狀態的方言；無法確定時回傳 False（改用介面重新點選）。
+    有選取狀態的方言連結或選項時比對它的文字；否則要求 localStorage 與保存時一致，
+    且語言切換按鈕本身的文字和保存時相同（只看按鈕文字，底下列出所有方言的選單不算）。"""
+    try:
+        signals = driver.execute_script(ACTIVE_DIALECT_SCRIPT)
+    except Exception:
+        return False
+    if not signals:
+        return False
+    dialect = state.get("dialect_name") or lang_config["dialect"]
+    if signals["selected"]:
+        return dialect in signals["selected"]
+    if signals["origin"] == state.get("origin"):
+        for key, value in (state.get("local_storage") or {}).items():
+            if signals["storage"].get(key) != value:
+                return False
+    expected = state.get("switcher_label")
+    return bool(expected) and signals["switcher"] == expected
@@ -1,6 +1,7 @@
 import os
 import time
-import requests
+from .session import get_session
+from .checkpoint import Checkpoint
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -10,6 +11,8 @@ def clean_romaji(romaji):
     return re.sub(r'\([^\)]*\)', '', romaji).strip()
 
 def crawl_scene_and_list(driver, audio_folder, label_file, counter):
+    """回傳是否全部成功（有任何一句失敗時為 False）。"""
+    ok = True
     # 1. 先爬 scene 區塊
     scenes = driver.find_elements(By.CSS_SELECTOR, "div.scene")
     for scene in scenes:
@@ -23,7 +26,8 @@ def crawl_scene_and_list(driver, audio_folder, label_file, counter):
             ab_clean = clean_romaji(ab)
             ch = scene.find_element(By.CSS_SELECTOR, "div.text > div.Ch").get_attribute("textContent").strip()
             mp3_name = f"{counter[0]:04d}.mp3"
-            resp = requests.get(mp3_url)
+            resp = get_session().get(mp3_url, timeout=10)
+            resp.raise_for_status()
             with open(os.path.join(audio_folder, mp3_name), "wb") as f:
                 f.write(resp.content)
             label_file.write(f"{mp3_name}\n{ch}({ab_clean})\nmale\none\n\n")
@@ -31,6 +35,7 @@ def crawl_scene_and_list(driver, audio_folder, label_file, counter):
             counter[0] += 1
         except Exception as e:
             print(f"[scene] 解析失敗: {e}")
+            ok = False
     # 2. 再爬所有 list 裡的 sentence
     lists = driver.find_elements(By.CSS_SELECTOR, "div.list")
     for lst in lists:
@@ -46,7 +51,8 @@ def crawl_scene_and_list(driver, audio_folder, label_file, counter):
                 ab_clean = clean_romaji(ab)
                 ch = sentence.find_element(By.CSS_SELECTOR, "div.text > div.Ch").get_attribute("textContent").strip()
                 mp3_name = f"{counter[0]:04d}.mp3"
-                resp = requests.get(mp3_url)
+                resp = get_session().get(mp3_url, timeout=10)
+                resp.raise_for_status()
                 with open(os.path.join(audio_folder, mp3_name), "wb") as f:
                     f.write(resp.content)
                 label_file.write(f"{mp3_name}\n{ch}({ab_clean})\nmale\none\n\n")
@@ -54,6 +60,8 @@ def crawl_scene_and_list(driver, audio_folder, label_file, counter):
                 counter[0] += 1
             except Exception as e:
                 print(f"[list] 解析失敗: {e}")
+                ok = False
+    return ok
 
 def go_to_word_tab(driver):
     try:
@@ -66,7 +74,8 @@ def go_to_word_tab(driver):
         print(f"[單字] 無法切換到單字頁: {e}")
 
 def crawl_words(driver, audio_folder, label_file, counter):
-    # 進入單字頁後，持續點擊下一個直到沒有
+    """進入單字頁後，持續點擊下一個直到沒有，回傳是否全部成功。"""
+    ok = True
     while True:
         try:
             ab = driver.find_element(By.CSS_SELECTOR, "div.wrapper > div.Ab").get_attribute("textContent").strip()
@@ -74,7 +83,8 @@ def crawl_words(driver, audio_folder, label_file, counter):
             ch = driver.find_element(By.CSS_SELECTOR, "div.wrapper > div.Ch").get_attribute("textContent").strip()
             mp3_url = driver.find_element(By.CSS_SELECTOR, "a.audio_1").get_attribute("href")
             mp3_name = f"{counter[0]:04d}.mp3"
-            resp = requests.get(mp3_url)
+            resp = get_session().get(mp3_url, timeout=10)
+            resp.raise_for_status()
             with open(os.path.join(audio_folder, mp3_name), "wb") as f:
                 f.write(resp.content)
             label_file.write(f"{mp3_name}\n{ch}({ab_clean})\nmale\none\n\n")
@@ -82,6 +92,7 @@ def crawl_words(driver, audio_folder, label_file, counter):
             counter[0] += 1
         except Exception as e:
             print(f"[單字] 解析失敗: {e}")
+            ok = False
         # 檢查下一個單字按鈕
         try:
             next_btn = driver.find_element(By.CSS_SELECTOR, "div.next_1")
@@ -91,6 +102,7 @@ def crawl_words(driver, audio_folder, label_file, counter):
             time.sleep(1.2)
         except Exception:
             break
+    return ok
 
 def go_to_dialogue_tab(driver):
     try:
@@ -143,18 +155,33 @@ def crawl_life_conversation(driver, main_lang, dialect, folder_name):
         print(f"找不到或無法點擊首頁圖片按鈕: {e}")
         return
 
-    counter = [1]
-    with open(label_txt, "w", encoding="utf-8") as label_file:
+    # 以大輪為單位記錄進度：已完成的大輪只翻頁不重抓，label.txt 與編號接續
+    checkpoint = Checkpoint(base_folder)
+    checkpoint.restore_labels(label_txt)
+    counter = [checkpoint.next_file()]
+    with open(label_txt, "a", encoding="utf-8") as label_file:
         round_idx = 1
         while True:
-            print(f"=== 開始第 {round_idx} 大輪 ===")
-            # 1. 會話頁
-            crawl_scene_and_list(driver, audio_folder, label_file, counter)
-            # 2. 切到單字頁
-            go_to_word_tab(driver)
-            crawl_words(driver, audio_folder, label_file, counter)
-            # 3. 回到會話頁
-            go_to_dialogue_tab(driver)
+            round_key = f"第{round_idx}大輪"
+            if checkpoint.is_done(round_key):
+                print(f"=== 第 {round_idx} 大輪已完成，跳過 ===")
+            else:
+                print(f"=== 開始第 {round_idx} 大輪 ===")
+                # 1. 會話頁
+                round_ok = crawl_scene_and_list(driver, audio_folder, label_file, counter)
+                # 2. 切到單字頁
+                go_to_word_tab(driver)
+                round_ok = crawl_words(driver, audio_folder, label_file, counter) and round_ok
+                # 3. 回到會話頁
+                go_to_dialogue_tab(driver)
+                label_file.flush()
+                # 有任何一句失敗就不記為完成，下次執行時重抓這一大輪
+                if round_ok:
+                    checkpoint.mark_done(round_key, counter[0], label_txt)
+                else:
+                    print(f"=== 第 {round_idx} 大輪有項目失敗，下次執行時重新爬取 ===")
+                    # 撤回這一大輪寫入的 label 與音檔，之後的大輪沿用原本的編號
+                    counter[0] = checkpoint.rollback_topic(round_key, label_txt, audio_folder)
             # 4. 檢查有沒有下一大輪
             if not has_next_round(driver):
                 break
@@ -1,7 +1,9 @@
 import os
+import json
 import logging
-import requests
 from .utils import download_audio, save_label
+from .http_cache import cached_get
+from .checkpoint import Checkpoint
 
 # 使用時 utils.py 更改BASE_DOMAIN = "web.klokah.tw"
 # main.py 中在 crawlers = {     補上
@@ -13,6 +15,12 @@ from .utils import download_audio, save_label
 
 BASE_URL = "https://web.klokah.tw/lima"
 
+# LIMA 的 JSON 與音檔路徑依語言編號區分（/json/{編號}/、/sound/{編號}/），
+# 目前只確認賽考利克泰雅語是 6；其他方言確認編號後再加入，未列出的方言不爬取
+LIMA_LANG_IDS = {
+    "賽考利克泰雅語": 6,
+}
+
 # 教材類型對應 JSON 區塊與資料夾名稱
 CONTENT_TYPES = {
     "vocabulary": "字彙",
@@ -64,7 +72,10 @@ def crawl_lima(driver, main_lang, dialect, folder_name):
     爬取 LIMA 有聲書資料。
     資料將儲存在標準的 main_lang/dialect/folder_name/folder_name-10/audio/ 結構下。
     """
-    lang_id = 6  # 預設賽考利克泰雅語，可日後改為自動查詢
+    lang_id = LIMA_LANG_IDS.get(dialect)
+    if lang_id is None:
+        logging.error(f"LIMA有聲書沒有 {dialect} 的語言編號，不爬取（請在 LIMA_LANG_IDS 加入）")
+        return
     max_lessons = 10  # 可根據實際課程數做調整
 
     # 建立標準資料夾結構
@@ -73,17 +84,19 @@ def crawl_lima(driver, main_lang, dialect, folder_name):
         logging.error("無法創建資料夾結構")
         return
 
-    # 獲取起始檔案編號
-    file_counter = get_next_counter(audio_folder)
+    # 獲取起始檔案編號（有進度紀錄時接續上次的編號）
+    checkpoint = Checkpoint(os.path.dirname(record_folder))
+    file_counter = checkpoint.next_file(get_next_counter(audio_folder))
 
     for lesson_no in range(1, max_lessons + 1):
         json_url = f"{BASE_URL}/json/{lang_id}/{lesson_no}.json"
         try:
-            resp = requests.get(json_url)
-            if resp.status_code != 200:
+            # 以條件式請求取得 JSON，內容沒變時直接使用快取
+            status, content = cached_get(json_url)
+            if status != 200:
                 logging.warning(f"無法取得 JSON：{json_url}")
                 continue
-            data = resp.json()
+            data = json.loads(content)
         except Exception as e:
             logging.error(f"下載或解析 JSON 錯誤：{json_url}, {e}")
             continue
@@ -96,9 +109,18 @@ def crawl_lima(driver, main_lang, dialect, folder_name):
             if not isinstance(entries, list):
                 continue
 
+            topic = f"{lesson_no}/{content_key}"
+            if checkpoint.is_done(topic):
+                logging.info(f"{subfolder} - 第 {lesson_no} 課已完成，跳過")
+                continue
+            last_item, file_counter = checkpoint.start_topic(topic, label_file, file_counter, fresh_label=False)
+
             logging.info(f"處理 {subfolder} - 第 {lesson_no} 課")
 
-            for i, item in enumerate(entries):
+            topic_ok = True  # 有音檔下載失敗就撤回整課，下次執行時重抓
+            for i, item in enumerate(entries, 1):
+                if i <= last_item:
+                    continue
                 if not item or "audio" not in item or not item.get("ab"):
                     continue
 
@@ -114,8 +136,11 @@ def crawl_lima(driver, main_lang, dialect, folder_name):
                 # 組合完整的下載路徑
                 audio_url = f"lima/sound/{lang_id}/{content_key}/{audio_file}"
                 
-                # 下載音檔
-                download_audio(audio_url, filename, audio_folder)
+                # 下載音檔，失敗時不寫 label、不記錄進度
+                if not download_audio(audio_url, filename, audio_folder):
+                    logging.error(f"下載音檔失敗，{subfolder} - 第 {lesson_no} 課下次執行時重新爬取：{audio_url}")
+                    topic_ok = False
+                    break
 
                 # 使用標準的 save_label 函數儲存標籤
                 text = item['ch'] + '(' + item['ab'] + ')'
@@ -123,8 +148,13 @@ def crawl_lima(driver, main_lang, dialect, folder_name):
 
                 logging.info(f"已爬取 {filename}: {text}")
                 file_counter += 1
+                checkpoint.commit_item(topic, i, file_counter, label_file)
 
-            logging.info(f"完成 {subfolder} - 第 {lesson_no} 課")
+            if topic_ok:
+                checkpoint.mark_done(topic, file_counter, label_file)
+                logging.info(f"完成 {subfolder} - 第 {lesson_no} 課")
+            else:
+                file_counter = checkpoint.rollback_topic(topic, label_file, audio_folder)
 
     logging.info(f"LIMA有聲書爬取完成，共處理 {file_counter - get_next_counter(audio_folder)} 個檔案")
 
@@ -3,28 +3,14 @@
 
 import os
 import time
-import requests
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
 from seleniumwire import webdriver  # 用於攔截 network 請求
 import re
-
-def download_mp3_from_network(driver, audio_folder, mp3_name):
-    """從 network 請求中下載最新的 mp3 檔案"""
-    for request in reversed(driver.requests):  # 反向找最新的
-        if request.response and request.url.endswith('.mp3'):
-            try:
-                resp = requests.get(request.url)
-                if resp.status_code == 200 and resp.headers.get('Content-Type', '').startswith('audio'):
-                    audio_path = os.path.join(audio_folder, mp3_name)
-                    with open(audio_path, "wb") as f:
-                        f.write(resp.content)
-                    print(f"已下載: {audio_path}")
-                else:
-                    print(f"下載失敗: {request.url} 狀態碼: {resp.status_code} Content-Type: {resp.headers.get('Content-Type')}")
-            except Exception as e:
-                print(f"下載音檔失敗: {request.url}", e)
-            break  # 只抓一個
+from .checkpoint import Checkpoint
+from .capture import download_mp3_from_network, clear_captured
+from .waits import wait_for_audio_request
+from .extract import extract_read_blocks
 
 def clean_romaji(romaji):
     return re.sub(r'\([^\)]*\)', '', romaji).strip()
@@ -50,7 +36,8 @@ def crawl_picture_stories(driver, main_lang, dialect, folder_name):
             return 1
         nums = [int(os.path.splitext(f)[0]) for f in files if os.path.splitext(f)[0].isdigit()]
         return max(nums) + 1 if nums else 1
-    counter = get_next_counter()
+    checkpoint = Checkpoint(topic_folder)
+    counter = checkpoint.next_file(get_next_counter())
 
     # 進入主頁
     start_url = "https://web.klokah.tw/extension/ps_practice/"
@@ -59,10 +46,17 @@ def crawl_picture_stories(driver, main_lang, dialect, folder_name):
     # 找到所有故事連結
     story_links = driver.find_elements(By.CSS_SELECTOR, 'a.link.text')
     print(f"共找到 {len(story_links)} 個故事")
-    for story_idx, link in enumerate(story_links):
-        href = link.get_attribute('href')
+    # 先取出網址：進入故事後原本的連結元素就失效了
+    story_hrefs = [link.get_attribute('href') for link in story_links]
+    for story_idx, href in enumerate(story_hrefs):
         if not href:
             continue
+        if checkpoint.is_done(href):
+            print(f"故事 {story_idx+1} 已完成，跳過")
+            continue
+        last_item, counter = checkpoint.start_topic(href, label_txt, counter, fresh_label=False)
+        item_idx = 0
+        story_ok = True  # 有句子失敗就撤回整個故事，下次執行時重抓
         driver.get(href)
         time.sleep(1)
         print(f"進入故事 {story_idx+1}")
@@ -74,30 +68,40 @@ def crawl_picture_stories(driver, main_lang, dialect, folder_name):
                 time.sleep(0.5)
             except Exception:
                 print("找不到iframe，跳過本頁")
+                story_ok = False
                 break
-            # 找到所有句子區塊
-            blocks = driver.find_elements(By.CSS_SELECTOR, "div#read-main > div")
+            # 一次讀回所有句子區塊的文字與播放按鈕
+            try:
+                blocks = extract_read_blocks(driver)
+            except Exception as e:
+                print(f"讀取句子區塊失敗：{e}")
+                blocks = []
+                story_ok = False
             for block in blocks:
+                item_idx += 1
+                if item_idx <= last_item:
+                    continue
                 try:
-                    play_btn = block.find_element(By.CSS_SELECTOR, "button.read-play-btn")
+                    play_btn = block["play_btn"]
+                    if play_btn is None:
+                        raise NoSuchElementException("找不到播放按鈕")
                     mp3_name = f"{str(counter).zfill(4)}.mp3"
                     # 羅馬拼音
-                    words = [w.text for w in block.find_elements(By.CSS_SELECTOR, "div.read-sentence.Ab div.word")]
-                    romaji = " ".join(words).strip()
-                    # 中文（用 XPath，抓到即使 hidden 的元素，並用 textContent 取值）
-                    try:
-                        ch_div = block.find_element(By.XPATH, ".//div[contains(@class, 'read-sentence') and contains(@class, 'Ch')]")
-                        chinese = ch_div.get_attribute('textContent').strip()
-                    except Exception as e:
-                        print(f"[錯誤] 抓不到中文，錯誤：{e}")
+                    romaji = block["romaji"]
+                    # 中文
+                    chinese = block["chinese"]
+                    if chinese is None:
+                        print("[錯誤] 抓不到中文")
                         chinese = ""
                     # 先清空 network 請求
-                    driver.requests.clear()
+                    clear_captured(driver)
                     # 點擊播放按鈕
                     play_btn.click()
-                    time.sleep(1.5)
+                    if wait_for_audio_request(driver, timeout=5, point="picture_story/audio") is None:
+                        raise Exception(f"{mp3_name} 沒有等到音檔請求")
                     # 從 network 下載 mp3
-                    download_mp3_from_network(driver, audio_folder, mp3_name)
+                    if not download_mp3_from_network(driver, audio_folder, mp3_name):
+                        raise Exception(f"{mp3_name} 音檔儲存失敗")
                     # 寫入 label.txt
                     with open(label_txt, "a", encoding="utf-8") as f:
                         if chinese:
@@ -111,10 +115,16 @@ def crawl_picture_stories(driver, main_lang, dialect, folder_name):
                         f.write("\n")
                     print(f"已爬取: {mp3_name} {chinese}({clean_romaji(romaji)})")
                     counter += 1
+                    checkpoint.commit_item(href, item_idx, counter, label_txt)
                 except Exception as e:
+                    # 之後的句子不再記錄進度，否則失敗的這一句會被跳過
                     print("句子區塊解析失敗：", e)
+                    story_ok = False
+                    break
             # 切回主頁
             driver.switch_to.default_content()
+            if not story_ok:
+                break
             # 檢查是否有下一頁按鈕
             try:
                 next_btn = driver.find_element(By.CSS_SELECTOR, "a.next_1")
@@ -126,4 +136,9 @@ def crawl_picture_stories(driver, main_lang, dialect, folder_name):
             except Exception as e:
                 print("下一頁按鈕異常：", e)
                 break
+        if story_ok:
+            checkpoint.mark_done(href, counter, label_txt)
+        else:
+            print(f"故事 {story_idx+1} 未完整完成，下次執行時重新爬取")
+            counter = checkpoint.rollback_topic(href, label_txt, audio_folder)
     print("圖畫故事篇爬取完成！") 
\ No newline at end of file
@@ -1,57 +1,42 @@
 import os
 import time
-import requests
 import re
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-
-def download_mp3_from_network(driver, audio_folder, mp3_name):
-    # 從 network 請求中下載最新的 mp3 檔案
-    for request in reversed(driver.requests):
-        if request.response and request.url.endswith('.mp3'):
-            try:
-                resp = requests.get(request.url)
-                if resp.status_code == 200 and resp.headers.get('Content-Type', '').startswith('audio'):
-                    audio_path = os.path.join(audio_folder, mp3_name)
-                    with open(audio_path, "wb") as f:
-                        f.write(resp.content)
-                    print(f"已下載: {audio_path}")
-                else:
-                    print(f"下載失敗: {request.url} 狀態碼: {resp.status_code} Content-Type: {resp.headers.get('Content-Type')}")
-            except Exception as e:
-                print(f"下載音檔失敗: {request.url}", e)
-            break
+from .capture import download_mp3_from_network, clear_captured
+from .waits import wait_for_audio_request
+from .extract import extract_read_blocks, extract_one, VOCABULARY_FIELDS, READ_SENTENCE_FIELDS
+from .checkpoint import Checkpoint
 
 def clean_romaji(romaji):
     # 移除所有括號及其內容
     return re.sub(r'\([^\)]*\)', '', romaji).strip()
 
 def crawl_article_tab(driver, audio_folder, label_file, counter):
+    """回傳是否全部成功（有任何段落失敗時為 False）。"""
+    ok = True
     # 進入 iframe
     WebDriverWait(driver, 10).until(EC.frame_to_be_available_and_switch_to_it((By.ID, "text-frame")))
-    articles = driver.find_elements(By.CSS_SELECTOR, "div#read-main > div")
+    # 一次讀回所有段落的文字與播放按鈕
+    articles = extract_read_blocks(driver, READ_SENTENCE_FIELDS)
     for block in articles:
         try:
-            play_btn = block.find_element(By.CSS_SELECTOR, "button.read-play-btn")
+            play_btn = block["play_btn"]
+            if play_btn is None:
+                raise Exception("找不到播放按鈕")
             mp3_name = f"{counter[0]:04d}.mp3"
-            # 羅馬拼音：只抓 div.read-sentence.Ab > div.word
-            ab_words = block.find_elements(By.CSS_SELECTOR, "div.read-sentence.Ab > div.word")
-            romaji = " ".join([w.text.strip() for w in ab_words if w.text.strip()]).strip()
-            romaji_clean = clean_romaji(romaji)
-            # 中文：抓同一區塊內的 div.read-sentence.Ch
-            try:
-                ch_div = block.find_element(By.CSS_SELECTOR, "div.read-sentence.Ch")
-                chinese = ch_div.get_attribute('textContent').strip()
-            except Exception:
-                chinese = ""
+            romaji_clean = clean_romaji(block["romaji"])
+            chinese = block["chinese"] or ""
             # 先清空 network 請求
-            driver.requests.clear()
+            clear_captured(driver)
             # 點擊播放按鈕
             play_btn.click()
-            time.sleep(1.5)
+            if wait_for_audio_request(driver, timeout=5, point="reading_writing/article_audio") is None:
+                raise Exception(f"沒有等到音檔請求: {mp3_name}")
             # 從 network 下載 mp3
-            download_mp3_from_network(driver, audio_folder, mp3_name)
+            if not download_mp3_from_network(driver, audio_folder, mp3_name):
+                raise Exception(f"音檔下載失敗: {mp3_name}")
             # 寫入 label.txt
             if chinese:
                 label_file.write(f"{mp3_name}\n{chinese}({romaji_clean})\nmale\none\n\n")
@@ -61,27 +46,35 @@ def crawl_article_tab(driver, audio_folder, label_file, counter):
             counter[0] += 1
         except Exception as e:
             print(f"[文章] 解析失敗: {e}")
+            ok = False
     # 切回主頁面
     driver.switch_to.default_content()
+    return ok
 
 def crawl_word_tab(driver, audio_folder, label_file, counter):
-    # 單詞頁，每頁一個單詞，音檔需點按鈕並監控 network
+    """單詞頁，每頁一個單詞，音檔需點按鈕並監控 network；回傳是否全部成功。"""
+    ok = True
     while True:
         try:
-            ab = driver.find_element(By.CSS_SELECTOR, "div.wrapper.view_vocabulary > div.Ab").get_attribute("textContent").strip()
-            ab_clean = clean_romaji(ab)
-            ch = driver.find_element(By.CSS_SELECTOR, "div.wrapper.view_vocabulary > div.Ch").get_attribute("textContent").strip()
-            play_btn = driver.find_element(By.CSS_SELECTOR, "a.audio_1")
+            word = extract_one(driver, VOCABULARY_FIELDS)
+            if word["ab"] is None or word["ch"] is None or word["play_btn"] is None:
+                raise Exception("找不到單字內容或播放按鈕")
+            ab_clean = clean_romaji(word["ab"])
+            ch = word["ch"]
+            play_btn = word["play_btn"]
             mp3_name = f"{counter[0]:04d}.mp3"
-            driver.requests.clear()
+            clear_captured(driver)
             play_btn.click()
-            time.sleep(1.2)
-            download_mp3_from_network(driver, audio_folder, mp3_name)
+            if wait_for_audio_request(driver, timeout=5, point="reading_writing/word_audio") is None:
+                raise Exception(f"沒有等到音檔請求: {mp3_name}")
+            if not download_mp3_from_network(driver, audio_folder, mp3_name):
+                raise Exception(f"音檔下載失敗: {mp3_name}")
             label_file.write(f"{mp3_name}\n{ch}({ab_clean})\nmale\none\n\n")
             print(f"[單詞] 已爬取: {mp3_name} {ch}({ab_clean})")
             counter[0] += 1
         except Exception as e:
             print(f"[單詞] 解析失敗: {e}")
+            ok = False
         # 檢查下一個單詞按鈕
         try:
             next_btn = driver.find_element(By.CSS_SELECTOR, "div.next_1")
@@ -91,6 +84,7 @@ def crawl_word_tab(driver, audio_folder, label_file, counter):
             time.sleep(1.2)
         except Exception:
             break
+    return ok
 
 def go_to_tab(driver, tab_text):
     try:
@@ -136,19 +130,39 @@ def crawl_reading_writing(driver, main_lang, dialect, folder_name):
         print(f"找不到或無法點擊首頁圖片按鈕: {e}")
         return
 
-    counter = [1]
-    with open(label_txt, "w", encoding="utf-8") as label_file:
+    # 以大輪為單位記錄進度：已完成的大輪只翻頁不重抓，label.txt 與編號接續
+    checkpoint = Checkpoint(base_folder)
+    checkpoint.restore_labels(label_txt)
+    counter = [checkpoint.next_file()]
+    with open(label_txt, "a", encoding="utf-8") as label_file:
         round_idx = 1
         while True:
-            print(f"=== 開始第 {round_idx} 大輪 ===")
-            # 1. 文章頁
-            go_to_tab(driver, "文章")
-            crawl_article_tab(driver, audio_folder, label_file, counter)
-            # 2. 單詞頁
-            go_to_tab(driver, "單詞")
-            crawl_word_tab(driver, audio_folder, label_file, counter)
-            # 3. 回到文章頁
-            go_to_tab(driver, "文章")
+            round_key = f"第{round_idx}大輪"
+            if checkpoint.is_done(round_key):
+                print(f"=== 第 {round_idx} 大輪已完成，跳過 ===")
+            else:
+                print(f"=== 開始第 {round_idx} 大輪 ===")
+                # 1. 文章頁
+                go_to_tab(driver, "文章")
+                try:
+                    round_ok = crawl_article_tab(driver, audio_folder, label_file, counter)
+                except Exception as e:
+                    print(f"[文章] 區塊解析失敗: {e}")
+                    driver.switch_to.default_content()
+                    round_ok = False
+                # 2. 單詞頁
+                go_to_tab(driver, "單詞")
+                round_ok = crawl_word_tab(driver, audio_folder, label_file, counter) and round_ok
+                # 3. 回到文章頁
+                go_to_tab(driver, "文章")
+                label_file.flush()
+                # 有任何項目失敗就不記為完成，下次執行時重抓這一大輪
+                if round_ok:
+                    checkpoint.mark_done(round_key, counter[0], label_txt)
+                else:
+                    print(f"=== 第 {round_idx} 大輪有項目失敗，下次執行時重新爬取 ===")
+                    # 撤回這一大輪寫入的 label 與音檔，之後的大輪沿用原本的編號
+                    counter[0] = checkpoint.rollback_topic(round_key, label_txt, audio_folder)
             # 4. 檢查有沒有下一大輪
             if not has_next_round(driver):
                 break
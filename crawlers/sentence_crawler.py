@@ -20,10 +20,32 @@ from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 from .state import CREATED_FOLDERS
 from .utils import download_audio, save_label, extract_romaji
+from .downloader import submit_download, drain_downloads
+from .checkpoint import Checkpoint
+from concurrent.futures import ThreadPoolExecutor
+from .sentence_parse import filter_romaji, part_entry, page_entry, parse_entries
 
 # 全域變數
 COUNTER = 1
 current_path = []
+CHECKPOINT = None  # crawl_sentences() 建立，以第一層選項為單位記錄進度
+# 設為 1 時每個選項只取一次 page_source，在背景執行緒用 BeautifulSoup 解析；
+# 否則逐一透過 WebDriver 讀取（可判斷 CSS 檔造成的隱藏，但每個節點都要一次往返）。
+# page_source 模式只看得到 inline style 的隱藏，預設關閉，由 main.py --page-source 開啟
+# （寫在環境變數裡，spawn 出來的工作行程也會沿用）
+PAGE_SOURCE_ENV = "KLOKAH_SENTENCE_PAGE_SOURCE"
+_parse_executor = None
+_parse_futures = []
+
+def use_page_source():
+    return os.environ.get(PAGE_SOURCE_ENV) == "1"
+
+def set_page_source(enabled=True):
+    """設定句型篇是否用 page_source 解析。"""
+    if enabled:
+        os.environ[PAGE_SOURCE_ENV] = "1"
+    else:
+        os.environ.pop(PAGE_SOURCE_ENV, None)
 
 def handle_dropdown(driver, dropdown_id):
     """處理下拉選單。"""
@@ -47,112 +69,83 @@ def check_for_content(driver):
     except:
         return False
 
-def get_word_and_audio_info(driver, audio_folder, label_file):
-    """獲取單字和音檔資訊。"""
-    global COUNTER
+def collect_entries(driver):
+    """逐一透過 WebDriver 讀取頁面，回傳 [(label, 音檔網址), ...]。"""
+    entries = []
     # 先抓所有顯示中的 part（如 partA、partB...）
     part_divs = [div for div in driver.find_elements(By.CSS_SELECTOR, "div[class^='part']") if div.is_displayed()]
-    found_any = False
     if part_divs:
         for part in part_divs:
             # 進到每個 part 裡的 text 區塊
-            text_divs = part.find_elements(By.CSS_SELECTOR, "div.text")
-            for text_div in text_divs:
-                # 1. 找羅馬拼音 Ab
-                ab_divs = text_div.find_elements(By.CSS_SELECTOR, "div[class*='Ab']")
-                romaji_lines = []
-                for div in ab_divs:
-                    text = div.text.strip()
-                    if not text:
-                        continue
-                    if re.match(r'^\(.*\)$', text):
-                        continue
-                    text = re.sub(r'^[A-Z]\s*[:：]\s*', '', text)
-                    if not text:
-                        continue
-                    if re.search(r'[\u4e00-\u9fff]', text):
-                        continue
-                    romaji_lines.append(text)
-                if not romaji_lines:
+            for text_div in part.find_elements(By.CSS_SELECTOR, "div.text"):
+                ab_texts = [div.text for div in text_div.find_elements(By.CSS_SELECTOR, "div[class*='Ab']")]
+                if not filter_romaji(ab_texts):
                     continue
-                romaji_text = ' '.join(romaji_lines)
-                # 2. 找中文 Ch
-                ch_divs = text_div.find_elements(By.CSS_SELECTOR, "div[class*='Ch']")
-                ch_lines = []
-                for div in ch_divs:
-                    text = div.text.strip()
-                    if not text:
-                        continue
-                    if re.match(r'^\(.*\)$', text):
-                        continue
-                    text = re.sub(r'^[A-Z]\s*[:：]\s*', '', text)
-                    if not text:
-                        continue
-                    if not re.search(r'[\u4e00-\u9fff]', text):
-                        continue
-                    text = re.sub(r'\([^)]*\)', '', text)
-                    ch_lines.append(text)
-                ch_text = ''.join(ch_lines)
-                label_line = f"{ch_text}({romaji_text})"
-                # 3. 找 mp3 連結
+                ch_texts = [div.text for div in text_div.find_elements(By.CSS_SELECTOR, "div[class*='Ch']")]
                 try:
-                    audio_tag = part.find_element(By.CSS_SELECTOR, "a[class*='audio_1']")
-                    audio_url = audio_tag.get_attribute("url")
-                except Exception as e:
-                    continue
-                if not audio_url:
+                    audio_url = part.find_element(By.CSS_SELECTOR, "a[class*='audio_1']").get_attribute("url")
+                except Exception:
                     continue
-                mp3_name = str(COUNTER).zfill(4) + ".mp3"
-                save_label(label_line, mp3_name, label_file)
-                download_audio(audio_url, mp3_name, audio_folder)
-                COUNTER += 1
-                found_any = True
-        return found_any
+                entry = part_entry(ab_texts, ch_texts, audio_url)
+                if entry:
+                    entries.append(entry)
+        return entries
     # 如果沒有 part 結構，走原本的方式
-    ab_divs = driver.find_elements(By.CSS_SELECTOR, "div.Ab")
-    romaji_lines = []
-    for div in ab_divs:
-        text = div.text.strip()
-        if not text:
-            continue
-        if re.match(r'^\(.*\)$', text):
-            continue
-        text = re.sub(r'^[A-Z]\s*[:：]\s*', '', text)
-        if not text:
-            continue
-        if re.search(r'[\u4e00-\u9fff]', text):
-            continue
-        romaji_lines.append(text)
-    ab_text = ' '.join(romaji_lines)
-    ch_divs = driver.find_elements(By.CSS_SELECTOR, "div.Ch")
-    ch_lines = []
-    for div in ch_divs:
-        text = div.text.strip()
-        if not text:
-            continue
-        if re.match(r'^\(.*\)$', text):
-            continue
-        text = re.sub(r'^[A-Z]\s*[:：]\s*', '', text)
-        if not text:
-            continue
-        if not re.search(r'[\u4e00-\u9fff]', text):
-            continue
-        text = re.sub(r'\([^)]*\)', '', text)
-        ch_lines.append(text)
-    ch_text = ''.join(ch_lines)
+    ab_texts = [div.text for div in driver.find_elements(By.CSS_SELECTOR, "div.Ab")]
+    ch_texts = [div.text for div in driver.find_elements(By.CSS_SELECTOR, "div.Ch")]
     try:
-        audio_tag = driver.find_element(By.CSS_SELECTOR, "a.audio_Ab")
-        audio_url = audio_tag.get_attribute("url")
-    except:
+        audio_url = driver.find_element(By.CSS_SELECTOR, "a.audio_Ab").get_attribute("url")
+    except Exception:
         audio_url = None
-    if not ab_text or not audio_url:
-        return False
-    label_line = f"{ch_text}({clean_romaji(ab_text)})"
-    mp3_name = str(COUNTER).zfill(4) + ".mp3"
-    save_label(label_line, mp3_name, label_file)
-    download_audio(audio_url, mp3_name, audio_folder)
-    COUNTER += 1
-    return True
+    entry = page_entry(ab_texts, ch_texts, audio_url)
+    return [entry] if entry else []
+
+def save_entries(entries, audio_folder, label_file):
+    """依序寫入 label 並排入下載，回傳是否有任何內容。"""
+    global COUNTER
+    for label_line, audio_url in entries:
+        mp3_name = str(COUNTER).zfill(4) + ".mp3"
+        save_label(label_line, mp3_name, label_file)
+        submit_download(audio_url, mp3_name, audio_folder)
+        COUNTER += 1
+    return bool(entries)
+
+def get_word_and_audio_info(driver, audio_folder, label_file):
+    """獲取單字和音檔資訊。"""
+    return save_entries(collect_entries(driver), audio_folder, label_file)
+
+def _parse_and_save(html, audio_folder, label_file, path):
+    """背景執行緒中解析並存檔；錯誤會留在 future 裡，由 flush_page_parses 回報。"""
+    if not save_entries(parse_entries(html), audio_folder, label_file):
+        logging.info(f"{path}：沒有找到內容")
+
+def submit_page_source(driver, audio_folder, label_file):
+    """取一次 page_source 交給背景執行緒解析，driver 可以馬上切換下一個選項。
+    只用一個執行緒，編號與 label 的順序和選項順序一致。"""
+    global _parse_executor
+    if _parse_executor is None:
+        _parse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sentence-parse")
+    path = ' > '.join(current_path)
+    future = _parse_executor.submit(_parse_and_save, driver.page_source, audio_folder, label_file, path)
+    _parse_futures.append((path, future))
+
+def flush_page_parses():
+    """等待已送出的頁面全部解析完成（COUNTER 之後才是最新的），回傳是否全部成功。"""
+    ok = True
+    while _parse_futures:
+        path, future = _parse_futures.pop(0)
+        try:
+            future.result()
+        except Exception as e:
+            logging.error(f"{path}：解析頁面時發生錯誤: {e}")
+            ok = False
+    return ok
+
+def topic_paths(main_lang, dialect, base_folder, topic):
+    """第一層選項對應的 (audio 資料夾, label.txt) 路徑。"""
+    topic_folder = f"{topic}-10"
+    record_folder = os.path.join(main_lang, dialect, base_folder, topic_folder) if base_folder else os.path.join(main_lang, dialect, topic_folder)
+    return os.path.join(record_folder, "audio"), os.path.join(record_folder, "label.txt")
 
 def traverse_dropdowns_recursive(driver, dropdown_ids, level=0, main_lang=None, dialect=None, base_folder=None):
     """遞迴遍歷下拉選單。"""
@@ -162,16 +155,15 @@ def traverse_dropdowns_recursive(driver, dropdown_ids, level=0, main_lang=None,
     if level >= len(dropdown_ids):
         if check_for_content(driver):
             # 以 base_folder 為基底建立子資料夾
-            topic_folder = f"{current_path[0]}-10"
-            record_folder = os.path.join(main_lang, dialect, base_folder, topic_folder) if base_folder else os.path.join(main_lang, dialect, topic_folder)
-            os.makedirs(record_folder, exist_ok=True)
-            audio_folder = os.path.join(record_folder, "audio")
-            label_file = os.path.join(record_folder, "label.txt")
+            audio_folder, label_file = topic_paths(main_lang, dialect, base_folder, current_path[0])
             os.makedirs(audio_folder, exist_ok=True)
             if not os.path.exists(label_file):
                 with open(label_file, "w", encoding="utf-8") as f:
                     f.write("")
-            get_word_and_audio_info(driver, audio_folder, label_file)
+            if use_page_source():
+                submit_page_source(driver, audio_folder, label_file)
+            else:
+                get_word_and_audio_info(driver, audio_folder, label_file)
         return
         
     options = handle_dropdown(driver, dropdown_ids[level])
@@ -182,6 +174,14 @@ def traverse_dropdowns_recursive(driver, dropdown_ids, level=0, main_lang=None,
         text = opt.text.strip()
         if not text or "請選擇" in text or opt.get_attribute("value") == "0":
             continue
+        if level == 0 and CHECKPOINT is not None:
+            if CHECKPOINT.is_done(text):
+                logging.info(f"{text} 已完成，跳過")
+                continue
+            # 中斷過的主題從頭重抓：label.txt 清空、編號接續上一個完成的主題
+            label_file = topic_paths(main_lang, dialect, base_folder, text)[1]
+            os.makedirs(os.path.dirname(label_file), exist_ok=True)
+            _, COUNTER = CHECKPOINT.start_topic(text, label_file, COUNTER)
         try:
             Select(driver.find_element(By.ID, dropdown_ids[level])).select_by_visible_text(text)
             time.sleep(1)
@@ -190,24 +190,38 @@ def traverse_dropdowns_recursive(driver, dropdown_ids, level=0, main_lang=None,
             elif len(current_path) < level:
                 current_path += [''] * (level - len(current_path))
             current_path.append(text)
+            completed = False
             try:
                 logging.info(f"正在探索：{' > '.join(current_path)}")
                 traverse_dropdowns_recursive(driver, dropdown_ids, level + 1, main_lang, dialect, base_folder)
+                completed = True
             finally:
                 current_path.pop()
+                # 每個主題（第一層選項）結束時等待背景下載完成，全部成功才記為完成
+                if level == 0:
+                    parsed = flush_page_parses()
+                    done, failed = drain_downloads()
+                    if CHECKPOINT is not None and completed and parsed and not failed:
+                        CHECKPOINT.mark_done(text, COUNTER, topic_paths(main_lang, dialect, base_folder, text)[1])
         except Exception as e:
             logging.error(f"{' > '.join(current_path)}：處理選項 '{text}' 時發生錯誤: {e}")
             continue
 
 def crawl_sentences(driver, main_lang, dialect, folder_name):
     """爬取句型內容。"""
-    global current_path
+    global current_path, COUNTER, CHECKPOINT
     current_path = []
     # 先建立主題資料夾
     base_folder = os.path.join(main_lang, dialect, folder_name)
     os.makedirs(base_folder, exist_ok=True)
+    CHECKPOINT = Checkpoint(base_folder)
+    COUNTER = CHECKPOINT.next_file()
     dropdown_ids = ['sel_type', 'sel_class', 'sel_item']
-    traverse_dropdowns_recursive(driver, dropdown_ids, 0, main_lang, dialect, folder_name)
+    try:
+        traverse_dropdowns_recursive(driver, dropdown_ids, 0, main_lang, dialect, folder_name)
+    finally:
+        flush_page_parses()
+        drain_downloads()
 
 def process_content(driver, selected_options, main_lang, dialect):
     """處理頁面內容。"""
@@ -233,6 +247,3 @@ def log_empty_branch(selected_options):
     """記錄空分支。"""
     with open("empty_branches.txt", "a", encoding="utf-8") as f:
         f.write(" -> ".join(selected_options) + "\n")
-
-def clean_romaji(romaji):
-    return re.sub(r'\([^\)]*\)', '', romaji).strip() 
\ No newline at end of file
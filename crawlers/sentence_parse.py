@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+句型篇頁面的文字整理與 page_source 解析。
+collect_entries（WebDriver 逐一讀取）與 parse_entries（BeautifulSoup 解析 page_source）
+共用同一套過濾規則，兩種模式寫出的 label 應該相同。
+"""
+
+import re
+from bs4 import BeautifulSoup
+try:
+    import lxml  # noqa: F401  有安裝時用較快的 lxml 解析
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+def clean_romaji(romaji):
+    return re.sub(r'\([^\)]*\)', '', romaji).strip()
+
+def filter_romaji(texts):
+    """從 Ab 區塊的文字中留下羅馬拼音行：去掉空白、整行括號、「A:」前綴與含中文的行。"""
+    lines = []
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        if re.match(r'^\(.*\)$', text):
+            continue
+        text = re.sub(r'^[A-Z]\s*[:：]\s*', '', text)
+        if not text:
+            continue
+        if re.search(r'[\u4e00-\u9fff]', text):
+            continue
+        lines.append(text)
+    return lines
+
+def filter_chinese(texts):
+    """從 Ch 區塊的文字中留下中文行，並移除括號內容。"""
+    lines = []
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        if re.match(r'^\(.*\)$', text):
+            continue
+        text = re.sub(r'^[A-Z]\s*[:：]\s*', '', text)
+        if not text:
+            continue
+        if not re.search(r'[\u4e00-\u9fff]', text):
+            continue
+        text = re.sub(r'\([^)]*\)', '', text)
+        lines.append(text)
+    return lines
+
+def part_entry(ab_texts, ch_texts, audio_url):
+    """part 結構中一個 text 區塊的 (label, 音檔網址)，沒有羅馬拼音或音檔時回傳 None。"""
+    romaji_lines = filter_romaji(ab_texts)
+    if not romaji_lines or not audio_url:
+        return None
+    return f"{''.join(filter_chinese(ch_texts))}({' '.join(romaji_lines)})", audio_url
+
+def page_entry(ab_texts, ch_texts, audio_url):
+    """沒有 part 結構時整頁的 (label, 音檔網址)，沒有羅馬拼音或音檔時回傳 None。"""
+    ab_text = ' '.join(filter_romaji(ab_texts))
+    if not ab_text or not audio_url:
+        return None
+    return f"{''.join(filter_chinese(ch_texts))}({clean_romaji(ab_text)})", audio_url
+
+def _is_hidden(tag):
+    """依 inline style 與 hidden 屬性判斷元素本身是否隱藏（page_source 中看不到 CSS 檔的規則）。"""
+    style = (tag.get("style") or "").replace(" ", "").lower()
+    return tag.has_attr("hidden") or "display:none" in style or "visibility:hidden" in style
+
+def _is_displayed(tag):
+    """元素與所有上層元素都沒有被隱藏。"""
+    while tag is not None and tag.name not in (None, "[document]"):
+        if _is_hidden(tag):
+            return False
+        tag = tag.parent
+    return True
+
+def _visible_text(tag):
+    """近似 WebElement.text：只取沒有被隱藏的文字，連續空白合併為一個。"""
+    if not _is_displayed(tag):
+        return ""
+    parts = []
+    for text in tag.find_all(string=True):
+        parent = text.parent
+        if parent.name in ("script", "style"):
+            continue
+        hidden = False
+        while parent is not None and parent is not tag:
+            if _is_hidden(parent):
+                hidden = True
+                break
+            parent = parent.parent
+        if not hidden:
+            parts.append(text)
+    return " ".join("".join(parts).split())
+
+def parse_entries(html):
+    """解析 page_source，規則和 collect_entries 相同，回傳 [(label, 音檔網址), ...]。"""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    entries = []
+    part_divs = [div for div in soup.select("div[class^='part']") if _is_displayed(div)]
+    if part_divs:
+        for part in part_divs:
+            audio_tag = part.select_one("a[class*='audio_1']")
+            audio_url = audio_tag.get("url") if audio_tag else None
+            for text_div in part.select("div.text"):
+                ab_texts = [_visible_text(div) for div in text_div.select("div[class*='Ab']")]
+                ch_texts = [_visible_text(div) for div in text_div.select("div[class*='Ch']")]
+                entry = part_entry(ab_texts, ch_texts, audio_url)
+                if entry:
+                    entries.append(entry)
+        return entries
+    ab_texts = [_visible_text(div) for div in soup.select("div.Ab")]
+    ch_texts = [_visible_text(div) for div in soup.select("div.Ch")]
+    audio_tag = soup.select_one("a.audio_Ab")
+    entry = page_entry(ab_texts, ch_texts, audio_tag.get("url") if audio_tag else None)
+    return [entry] if entry else []
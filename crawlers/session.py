@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+共用 HTTP 連線模組。
+所有爬蟲下載音檔與 JSON 時都透過同一個 requests.Session，
+以連線池與 keep-alive 重複使用到 web.klokah.tw 的 TCP/TLS 連線。
+"""
+
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+# 連線池設定
+POOL_CONNECTIONS = 10  # 快取的 host 連線池數量
+POOL_MAXSIZE = 16      # 每個 host 最多保留的連線數
+POOL_BLOCK = True      # 連線用完時等待釋放，不額外開新連線（等於每個 host 的連線上限）
+MAX_RETRIES = 2        # 連線層級的重試次數（連線失敗、被重置）
+
+# 個別 host 的連線上限，未列出的 host 使用 POOL_MAXSIZE
+HOST_LIMITS = {
+    "web.klokah.tw": 16,
+}
+
+_session = None
+_lock = threading.Lock()
+
+def _build_session():
+    """依照目前設定建立 Session 並掛上連線池。"""
+    session = requests.Session()
+    session.headers.update({"Connection": "keep-alive"})
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                          max_retries=MAX_RETRIES, pool_block=POOL_BLOCK)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    for host, maxsize in HOST_LIMITS.items():
+        host_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=maxsize,
+                                   max_retries=MAX_RETRIES, pool_block=POOL_BLOCK)
+        session.mount(f"https://{host}/", host_adapter)
+        session.mount(f"http://{host}/", host_adapter)
+    logging.info(f"建立共用 HTTP 連線池: pool_maxsize={POOL_MAXSIZE}, host_limits={HOST_LIMITS}")
+    return session
+
+def configure_session(pool_connections=None, pool_maxsize=None, pool_block=None, max_retries=None, host_limits=None):
+    """調整連線池設定，下一次 get_session() 會以新設定重建 Session。"""
+    global POOL_CONNECTIONS, POOL_MAXSIZE, POOL_BLOCK, MAX_RETRIES
+    if pool_connections is not None:
+        POOL_CONNECTIONS = pool_connections
+    if pool_maxsize is not None:
+        POOL_MAXSIZE = pool_maxsize
+    if pool_block is not None:
+        POOL_BLOCK = pool_block
+    if max_retries is not None:
+        MAX_RETRIES = max_retries
+    if host_limits is not None:
+        HOST_LIMITS.update(host_limits)
+    close_session()
+
+def get_session():
+    """取得共用的 requests.Session，第一次呼叫時建立。"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+def close_session():
+    """關閉共用 Session 並釋放所有連線。"""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
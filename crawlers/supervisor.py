@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+瀏覽器監控模組。
+爬蟲函式遇到 Chrome / chromedriver 當掉時只會記錄錯誤後 break，整個篇章就提早結束。
+這裡在爬蟲外面包一層：背景 watchdog 在太久沒有進度時探測 session，沒有回應就強制結束 chromedriver；
+爬蟲函式返回後若 session 已經失效，就開新的 driver 重跑，已完成的部分由 checkpoint 跳過。
+"""
+
+import os
+import time
+import signal
+import logging
+import threading
+import subprocess
+from .browser import quit_driver
+
+PAGE_LOAD_TIMEOUT = 60   # 單一頁面載入的上限（秒）
+SCRIPT_TIMEOUT = 30      # execute_async_script 的上限（秒）
+STALL_SECONDS = 300      # 超過這麼久沒有進度才探測 session
+PROBE_TIMEOUT = 60       # 探測 session 的等待上限（秒）
+CHECK_INTERVAL = 15      # watchdog 檢查間隔（秒）
+MAX_RESTARTS = 3         # 同一篇章最多重開幾次瀏覽器
+
+_progress_lock = threading.Lock()
+_last_progress = time.time()
+
+def note_progress():
+    """爬蟲有進度時呼叫（checkpoint 寫入、日誌輸出都算）。"""
+    global _last_progress
+    with _progress_lock:
+        _last_progress = time.time()
+
+def seconds_since_progress():
+    with _progress_lock:
+        return time.time() - _last_progress
+
+class _ProgressHandler(logging.Handler):
+    """把爬蟲執行緒的 INFO 以上日誌當成進度；背景下載執行緒與 debug 訊息不算，
+    否則下載一直有日誌時會蓋過卡住的瀏覽器。"""
+
+    def __init__(self, thread_id):
+        super().__init__(logging.INFO)
+        self.thread_id = thread_id
+
+    def emit(self, record):
+        if record.thread == self.thread_id:
+            note_progress()
+
+def apply_timeouts(driver):
+    """設定頁面載入與腳本的逾時，避免單一指令永遠卡住。"""
+    try:
+        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+        driver.set_script_timeout(SCRIPT_TIMEOUT)
+    except Exception as e:
+        logging.warning(f"設定 driver 逾時失敗: {e}")
+
+def is_session_alive(driver, timeout=PROBE_TIMEOUT):
+    """在另一個 daemon 執行緒執行簡單的腳本，逾時或出錯都視為 session 失效。
+    卡住的探測執行緒不會擋住程式結束。"""
+    result = {}
+
+    def probe():
+        try:
+            result["value"] = driver.execute_script("return 1")
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=probe, name="session-probe", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        logging.warning(f"瀏覽器 {timeout} 秒沒有回應")
+        return False
+    if "error" in result:
+        e = result["error"]
+        logging.warning(f"瀏覽器 session 已失效: {e.__class__.__name__}: {e}")
+        return False
+    return result.get("value") == 1
+
+def _descendant_pids(pid):
+    """用 ps 列出 pid 底下所有子孫行程（Chrome 的各個行程），無法取得時回傳空 list。"""
+    try:
+        output = subprocess.run(["ps", "-e", "-o", "pid=,ppid="], capture_output=True, text=True,
+                                timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+    children = {}
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
+            children.setdefault(int(parts[1]), []).append(int(parts[0]))
+    descendants = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            descendants.append(child)
+            stack.append(child)
+    return descendants
+
+def kill_process_tree(pid):
+    """強制結束行程與它的所有子孫行程。要在結束父行程前先列出子行程，否則它們會變成孤兒。"""
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/PID", str(pid), "/T", "/F"], capture_output=True, timeout=30)
+        return
+    for target in [pid] + _descendant_pids(pid):
+        try:
+            os.kill(target, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+def kill_driver(driver):
+    """強制結束 chromedriver 與它開的 Chrome，讓卡住的指令立刻失敗。"""
+    try:
+        process = driver.service.process
+        if process and process.poll() is None:
+            kill_process_tree(process.pid)
+            logging.warning(f"已強制結束 chromedriver 與 Chrome (pid {process.pid})")
+    except Exception as e:
+        logging.warning(f"強制結束 chromedriver 失敗: {e}")
+
+def close_driver(driver):
+    """關閉瀏覽器；driver.quit() 失敗時強制結束 chromedriver 與 Chrome，不拋出例外。"""
+    if not quit_driver(driver):
+        kill_driver(driver)
+
+class Watchdog:
+    """背景監控：太久沒有進度且 session 沒有回應時強制結束 chromedriver。"""
+
+    def __init__(self, driver, stall_seconds=STALL_SECONDS):
+        self.driver = driver
+        self.stall_seconds = stall_seconds
+        self.killed = False
+        self._stop = threading.Event()
+        # 建立 Watchdog 的就是執行爬蟲的執行緒
+        self._handler = _ProgressHandler(threading.get_ident())
+        self._thread = threading.Thread(target=self._run, name="driver-watchdog", daemon=True)
+
+    def __enter__(self):
+        note_progress()
+        logging.getLogger().addHandler(self._handler)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        logging.getLogger().removeHandler(self._handler)
+        self._thread.join(timeout=CHECK_INTERVAL)
+        return False
+
+    def _run(self):
+        while not self._stop.wait(CHECK_INTERVAL):
+            idle = seconds_since_progress()
+            if idle < self.stall_seconds:
+                continue
+            if is_session_alive(self.driver):
+                note_progress()  # 只是這一步比較久，瀏覽器仍有回應
+                continue
+            logging.error(f"已經 {idle:.0f} 秒沒有進度且瀏覽器沒有回應，強制重啟")
+            self.killed = True
+            kill_driver(self.driver)
+            return
+
+def supervise(driver, start_driver, crawl, max_restarts=MAX_RESTARTS):
+    """執行 crawl(driver)，session 失效時用 start_driver() 開新的 driver 重跑。
+    回傳 (最後使用的 driver, crawl 的結果)，呼叫端之後要改用回傳的 driver。"""
+    restarts = 0
+    while True:
+        error = None
+        result = None
+        with Watchdog(driver) as watchdog:
+            try:
+                result = crawl(driver)
+            except Exception as e:
+                error = e
+        if not watchdog.killed and is_session_alive(driver):
+            if error is not None:
+                raise error
+            return driver, result
+        if restarts >= max_restarts:
+            logging.error(f"瀏覽器已重啟 {restarts} 次仍失敗，放棄本篇章")
+            return driver, result
+        restarts += 1
+        logging.warning(f"瀏覽器 session 失效，開新的瀏覽器從進度紀錄繼續（第 {restarts} 次）")
+        close_driver(driver)
+        driver = start_driver()
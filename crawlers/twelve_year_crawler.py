@@ -4,7 +4,6 @@
 import os
 import time
 import re
-import requests
 import logging
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
@@ -12,6 +11,10 @@ from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import NoSuchElementException
 from .state import CREATED_FOLDERS
 from .utils import download_audio, save_label, extract_romaji
+from .checkpoint import Checkpoint
+from .capture import url_path, save_captured_audio, clear_captured, captured_requests
+from .waits import wait_until
+from .extract import extract_records, extract_one
 from selenium.webdriver.support.ui import WebDriverWait
 from bs4 import BeautifulSoup
 from selenium.webdriver.chrome.options import Options
@@ -22,10 +25,10 @@ def wait_for_network_idle(driver, idle_time=1.0, check_interval=0.2, timeout=15)
     等待 network 沒有新請求 idle_time 秒，最多 timeout 秒。
     """
     start = time.time()
-    last_count = len(driver.requests)
+    last_count = len(captured_requests(driver))
     last_change = time.time()
     while True:
-        now_count = len(driver.requests)
+        now_count = len(captured_requests(driver))
         if now_count != last_count:
             last_change = time.time()
             last_count = now_count
@@ -36,6 +39,71 @@ def wait_for_network_idle(driver, idle_time=1.0, check_interval=0.2, timeout=15)
             break
         time.sleep(check_interval)
 
+def lesson_mp3_requests(driver, lesson_prefix):
+    """從 network 記錄中取出本課的 XX-A.mp3 與 XX-B-n.mp3，回傳 {檔名: 請求}。"""
+    pattern = re.compile(rf'^{lesson_prefix}-(A|B-\d+)\.mp3$')
+    found = {}
+    for r in captured_requests(driver):
+        if not r.response or '/twelve/sound/' not in r.url:
+            continue
+        filename = os.path.basename(url_path(r.url))
+        if pattern.match(filename):
+            found[filename] = r
+    return found
+
+def expected_lesson_mp3s(driver, lesson_prefix):
+    """依頁面上 B 段 play-btn 的數量算出本課應該有的音檔名稱。"""
+    b_count = len(driver.find_elements(By.CSS_SELECTOR, 'a.play-btn[id^="play-btn-"]'))
+    return {f"{lesson_prefix}-A.mp3"} | {f"{lesson_prefix}-B-{i}.mp3" for i in range(1, b_count + 1)}
+
+def lesson_title(driver):
+    """目前課文標題的文字，用來判斷頁面是否已換成新的一課。"""
+    titles = driver.find_elements(By.ID, "nine-learn-title")
+    return titles[0].text.strip() if titles else ""
+
+def wait_for_lesson_mp3s(driver, lesson_prefix, previous_title="", timeout=15):
+    """等到本課預期的 mp3 全部攔截到就立刻回傳 {檔名: 請求}；逾時回傳目前攔截到的部分。
+    標題還是上一課時 play-btn 也還是上一課的，不能用來計算數量。"""
+    def all_captured(d):
+        found = lesson_mp3_requests(d, lesson_prefix)
+        if f"{lesson_prefix}-A.mp3" not in found:
+            return False
+        if previous_title and lesson_title(d) == previous_title:
+            return False
+        return found if expected_lesson_mp3s(d, lesson_prefix) <= found.keys() else False
+    found = wait_until(driver, all_captured, timeout, "twelve_year/lesson_mp3")
+    if found is None:
+        found = lesson_mp3_requests(driver, lesson_prefix)
+        expected = expected_lesson_mp3s(driver, lesson_prefix)
+        print(f"mp3 載入數量不足({len(found.keys() & expected)}/{len(expected)})，"
+              f"缺少: {', '.join(sorted(expected - found.keys()))}")
+    return found
+
+# 主課文標題：第一個 div 的第一行是羅馬拼音，span 是中文
+TITLE_FIELDS = {
+    "text": ("#nine-learn-title div", "text"),
+    "chinese": ("#nine-learn-title div span", "text"),
+}
+
+# B 段每一句：所有 text-* 區塊中的單字與中文（包含隱藏的內容）
+LESSON_ITEM_FIELDS = {
+    "words": ("div.lesson-text > div[id^='text-'] div.textWord", "textContent", True),
+    "chinese": ("div[id^='chs-']", "textContent"),
+}
+
+def read_lesson_items(driver):
+    """一次讀回所有 B 段句子的 (羅馬拼音, 中文)，讀取失敗時回傳空 list。"""
+    try:
+        records = extract_records(driver, "div.lesson-item", LESSON_ITEM_FIELDS)
+    except Exception as e:
+        print(f"讀取 B 段文字失敗: {e}")
+        return []
+    items = []
+    for record in records:
+        romaji = " ".join(w or "" for w in record["words"]).strip()
+        items.append((romaji, record["chinese"] or ""))
+    return items
+
 def clean_label_line(label_line):
     # 把所有換行符號都換成空白
     return label_line.replace('\n', '').replace('\r', '').strip()
@@ -73,7 +141,8 @@ def crawl_twelve_year_course(driver, main_lang, dialect, folder_name):
             return 1
         nums = [int(os.path.splitext(f)[0]) for f in files if os.path.splitext(f)[0].isdigit()]
         return max(nums) + 1 if nums else 1
-    counter = get_next_counter()
+    checkpoint = Checkpoint(topic_folder)
+    counter = checkpoint.next_file(get_next_counter())
 
     start_url = "https://web.klokah.tw/twelve/learn.php"
     driver.get(start_url)
@@ -88,52 +157,49 @@ def crawl_twelve_year_course(driver, main_lang, dialect, folder_name):
         lesson_btns = driver.find_elements(By.CSS_SELECTOR, 'div#nine-learn-class > a.nine-class-btn')
         for lesson_btn in lesson_btns:
             lesson_text = lesson_btn.text.strip()
+            lesson_key = f"{level_text}/{lesson_text}"
+            if checkpoint.is_done(lesson_key):
+                print(f"  課程 {lesson_text} 已完成，跳過")
+                continue
+            # 以整課為單位記錄進度，中斷的課程從頭重抓並沿用上次的編號
+            _, counter = checkpoint.start_topic(lesson_key, (label_txt, audio_map_txt), counter, fresh_label=False)
             print(f"  進入課程: {lesson_text}")
             driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", lesson_btn)
-            driver.requests.clear()  # 先清空
-            lesson_btn.click()       # 再點擊
-            wait_for_network_idle(driver, idle_time=1.0, check_interval=0.2, timeout=15)
-            # 這時候所有 mp3 請求都已經送出
             # 取得課程編號（如01、02...）
             lesson_code = re.search(r'第(\d+)課', lesson_text)
             if lesson_code:
                 lesson_prefix = lesson_code.group(1).zfill(2)
             else:
                 lesson_prefix = ''
-            # 取得所有 mp3 請求
-            mp3_requests = [
-                r for r in driver.requests
-                if r.response and '/twelve/sound/' in r.url and r.url.split('?')[0].endswith('.mp3')
-            ]
-            b_btns = driver.find_elements(By.CSS_SELECTOR, 'a.play-btn[id^="play-btn-"]')
-            if len(mp3_requests) < len(b_btns) + 1:  # +1 for A 段
-                print(f"mp3 載入數量不足({len(mp3_requests)}/{len(b_btns)+1})，再等 2 秒重抓")
-                time.sleep(2)
-                mp3_requests = [
-                    r for r in driver.requests
-                    if r.response and '/twelve/sound/' in r.url and r.url.split('?')[0].endswith('.mp3')
-                ]
-            # 過濾只要 XX-A.mp3 和 XX-B-1.mp3, XX-B-2.mp3 ...
-            filtered_mp3 = {}
-            for req in mp3_requests:
-                filename = os.path.basename(req.url.split('?')[0])
-                if re.match(rf'^{lesson_prefix}-A\.mp3$', filename) or re.match(rf'^{lesson_prefix}-B-\d+\.mp3$', filename):
-                    filtered_mp3[filename] = req.url
+            previous_title = lesson_title(driver)
+            clear_captured(driver)  # 先清空
+            lesson_btn.click()       # 再點擊
+            if lesson_prefix:
+                # 依 play-btn 數量知道要等哪些 XX-A / XX-B-n.mp3，到齊就繼續
+                filtered_mp3 = wait_for_lesson_mp3s(driver, lesson_prefix, previous_title)
+            else:
+                # 不知道課程編號時只能等 network 安靜下來
+                wait_for_network_idle(driver, idle_time=1.0, check_interval=0.2, timeout=15)
+                filtered_mp3 = lesson_mp3_requests(driver, lesson_prefix)
             # 取得主課文羅馬拼音和中文
             try:
-                a_div = driver.find_element(By.ID, "nine-learn-title")
-                # 取出下層第一個 div 的 text
-                inner_div = a_div.find_element(By.TAG_NAME, "div")
-                main_romaji = inner_div.text.split('\n')[0].replace('"', '').strip()
-                # 中文
-                main_chinese = inner_div.find_element(By.TAG_NAME, "span").text.strip()
+                title = extract_one(driver, TITLE_FIELDS)
+                main_romaji = (title["text"] or "").split('\n')[0].replace('"', '').strip()
+                main_chinese = title["chinese"] or ''
             except Exception:
                 main_romaji = ''
                 main_chinese = ''
-            # 取得所有 B 段的 play-btn
-            lesson_items = driver.find_elements(By.CSS_SELECTOR, 'div.lesson-item')
+            # 一次讀回所有 B 段的文字
+            lesson_items = read_lesson_items(driver)
             downloaded = set()  # 確保每一課都初始化
-            for filename, url in filtered_mp3.items():
+            # 音檔不齊、儲存失敗或抓不到文字時不記為完成，下次重新執行時重抓整課
+            lesson_ok = bool(filtered_mp3)
+            if lesson_prefix:
+                missing = expected_lesson_mp3s(driver, lesson_prefix) - filtered_mp3.keys()
+                if missing:
+                    print(f"  課程 {lesson_text} 缺少音檔: {', '.join(sorted(missing))}")
+                    lesson_ok = False
+            for filename, req in filtered_mp3.items():
                 if filename in downloaded:
                     continue
                 for attempt in range(3):
@@ -142,26 +208,20 @@ def crawl_twelve_year_course(driver, main_lang, dialect, folder_name):
                         label_line = f"{main_chinese}({clean_romaji(main_romaji)})" if main_chinese and main_romaji else main_chinese or (f"({clean_romaji(main_romaji)})" if main_romaji else "")
                     elif re.match(rf'^{lesson_prefix}-B-(\d+)\.mp3$', filename):
                         b_idx = int(re.match(rf'^{lesson_prefix}-B-(\d+)\.mp3$', filename).group(1)) - 1
-                        try:
-                            lesson_item = lesson_items[b_idx]
-                            lesson_text_div = lesson_item.find_element(By.CSS_SELECTOR, 'div.lesson-text')
-                            text_blocks = lesson_text_div.find_elements(By.XPATH, './div[starts-with(@id, "text-")]')
-                            words = []
-                            for block in text_blocks:
-                                words += [w.get_attribute("textContent") for w in block.find_elements(By.CSS_SELECTOR, 'div.textWord')]
-                            romaji = " ".join(words).strip()
-                            chs_div = lesson_item.find_element(By.CSS_SELECTOR, f'div[id^="chs-"]')
-                            chinese = chs_div.get_attribute("textContent").strip()
-                        except Exception:
+                        if attempt > 0:
+                            # 文字可能還沒載入，重試時重新讀取
+                            lesson_items = read_lesson_items(driver)
+                        if 0 <= b_idx < len(lesson_items):
+                            romaji, chinese = lesson_items[b_idx]
+                        else:
                             romaji = ""
                             chinese = ""
                         label_line = f"{chinese}({clean_romaji(romaji)})" if chinese and romaji else chinese or (f"({clean_romaji(romaji)})" if romaji else "")
                     if label_line.strip():
-                        audio_path = os.path.join(audio_folder, f"{str(counter).zfill(4)}.mp3")
                         try:
-                            resp = requests.get(url)
-                            with open(audio_path, "wb") as f:
-                                f.write(resp.content)
+                            # 直接寫入攔截到的內容，缺漏時才重新下載
+                            if not save_captured_audio(req, f"{str(counter).zfill(4)}.mp3", audio_folder):
+                                raise Exception("音檔儲存失敗")
                             print("下載:", f"{str(counter).zfill(4)}.mp3")
                             downloaded.add(filename)
                             with open(label_txt, "a", encoding="utf-8") as f:
@@ -175,13 +235,21 @@ def crawl_twelve_year_course(driver, main_lang, dialect, folder_name):
                             counter += 1
                         except Exception as e:
                             print(f"下載失敗: {filename}, {e}")
+                            lesson_ok = False
                         break
                     else:
                         print(f"{filename} 文字標籤抓不到，重試第{attempt+1}次")
                         time.sleep(1)
                 else:
                     print(f"{filename} 文字標籤最終還是抓不到，跳過")
+                    lesson_ok = False
                     with open(error_txt, "a", encoding="utf-8") as f:
                         f.write(f"{str(counter).zfill(4)}.mp3\t階級:{level_text}\t課程:{lesson_text}\t原始檔名:{filename}\n")
+            if lesson_ok:
+                checkpoint.mark_done(lesson_key, counter, (label_txt, audio_map_txt))
+            else:
+                print(f"  課程 {lesson_text} 未完整完成，下次執行時重新爬取")
+                # 撤回這一課寫入的 label、audio_map 與音檔，之後的課程沿用原本的編號
+                counter = checkpoint.rollback_topic(lesson_key, (label_txt, audio_map_txt), audio_folder)
     print("所有音檔下載完成！")
 
@@ -8,27 +8,244 @@
 
 import os
 import logging
-import requests
+import json
+import hashlib
+import tempfile
 from urllib.parse import urljoin
 import re
+from .session import get_session
+from .audio_store import store_file
+from . import http_cache
+from .audio_check import InvalidAudioError, check_audio_file, record_audio_info
 
 # 全域設定
 BASE_DOMAIN = "web.klokah.tw"
+CHUNK_SIZE = 64 * 1024  # 串流下載時每次寫入的大小
+RESUME_RETRIES = 2      # 下載中斷時以 Range 續傳的次數
+STATUS_BAD_CONTENT = 0  # 內容錯誤（無效音檔、續傳範圍不符）時回報的狀態碼，不是伺服器壓力
 
-def download_audio(audio_url, filename, audio_folder):
-    """下載音檔並儲存為指定檔名。"""
+class HTTPStatusError(Exception):
+    """HTTP 回應狀態碼不是預期的值。"""
+
+    def __init__(self, status_code):
+        super().__init__(f"狀態碼：{status_code}")
+        self.status_code = status_code
+
+def open_temp_file(target_path):
+    """在目標檔案同一資料夾建立暫存檔，回傳 (檔案物件, 暫存路徑)。"""
+    folder, name = os.path.split(target_path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".part", dir=folder or ".")
+    return os.fdopen(fd, "wb"), temp_path
+
+def discard_temp_file(temp_path):
+    """刪除沒用完的暫存檔。"""
+    try:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+    except OSError:
+        pass
+
+def atomic_write_bytes(data, target_path):
+    """先寫暫存檔再改名，避免留下寫到一半的檔案，回傳 SHA-256。"""
+    f, temp_path = open_temp_file(target_path)
+    try:
+        with f:
+            f.write(data)
+        os.replace(temp_path, target_path)
+    except Exception:
+        discard_temp_file(temp_path)
+        raise
+    return hashlib.sha256(data).hexdigest()
+
+def partial_paths(audio_path):
+    """回傳續傳用的部分檔案路徑與其 journal 路徑。"""
+    folder, name = os.path.split(audio_path)
+    part_path = os.path.join(folder, f".{name}.part")
+    return part_path, part_path + ".json"
+
+def load_partial_journal(journal_path):
+    """讀取部分下載的 journal，不存在或損毀時回傳 None。"""
+    try:
+        with open(journal_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_partial_journal(journal_path, journal):
+    """原子性寫入部分下載的 journal。"""
+    atomic_write_bytes(json.dumps(journal, ensure_ascii=False).encode("utf-8"), journal_path)
+
+def discard_partial(audio_path):
+    """刪除部分下載檔與 journal。"""
+    for path in partial_paths(audio_path):
+        discard_temp_file(path)
+
+def parse_content_range(value):
+    """解析 Content-Range: bytes start-end/total，回傳 (start, total)，total 不明時為 None。"""
     try:
-        full_url = urljoin(f"https://{BASE_DOMAIN}/", audio_url)
-        resp = requests.get(full_url, timeout=10)
-        if resp.status_code == 200:
-            audio_path = os.path.join(audio_folder, filename)
-            with open(audio_path, "wb") as f:
-                f.write(resp.content)
-            logging.info("成功下載音檔：%s" % filename)
+        span, total = value.split(" ", 1)[1].split("/")
+        start = int(span.split("-")[0])
+        return start, (None if total == "*" else int(total))
+    except (IndexError, ValueError, AttributeError):
+        return None, None
+
+def _resume_once(full_url, audio_path, timing=None):
+    """下載一次（可從部分檔續傳），回傳 (是否完成, 大小, SHA-256)；連線中斷時會拋出例外並保留部分檔。
+    timing 是 dict 時寫入 "ttfb"（收到回應標頭的秒數）。"""
+    part_path, journal_path = partial_paths(audio_path)
+    journal = load_partial_journal(journal_path)
+    offset = 0
+    headers = {}
+    if journal and journal.get("url") == full_url and os.path.exists(part_path):
+        offset = os.path.getsize(part_path)
+        validator = journal.get("etag") or journal.get("last_modified")
+        if offset and validator:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        else:
+            offset = 0
+    if not offset:
+        # 重新爬取時帶上快取的驗證資訊，內容沒變就不必再下載
+        headers.update(http_cache.conditional_headers(full_url))
+
+    with get_session().get(full_url, timeout=10, stream=True, headers=headers) as resp:
+        if timing is not None:
+            timing["ttfb"] = resp.elapsed.total_seconds()
+        if resp.status_code == 304:
+            record = http_cache.materialize(full_url, audio_path)
+            if record:
+                discard_partial(audio_path)
+                try:
+                    info = check_audio_file(audio_path)
+                except InvalidAudioError:
+                    # 快取內容壞了：捨棄快取，下一次不帶條件式標頭重新下載
+                    discard_temp_file(audio_path)
+                    http_cache.forget(full_url)
+                    raise
+                store_file(audio_path, record["sha256"])
+                record_audio_info(audio_path, info)
+                logging.info("內容未變更，使用快取：%s", os.path.basename(audio_path))
+                return True, record["length"], record["sha256"]
+            raise Exception("伺服器回傳 304 但快取檔案不存在")
+        if resp.status_code == 416:
+            if not (journal and offset and journal.get("length") == offset):
+                # 伺服器不接受這個範圍，部分檔已經沒用，下一次從頭下載
+                logging.warning("續傳範圍無效（416），從頭下載：%s", full_url)
+                discard_partial(audio_path)
+                return False, 0, None
+            # 部分檔其實已經完整
+        elif resp.status_code == 206 and offset:
+            start, total = parse_content_range(resp.headers.get("Content-Range"))
+            etag = resp.headers.get("ETag")
+            if start != offset or (etag and journal.get("etag") and etag != journal["etag"]):
+                logging.warning("續傳回應不符，從頭下載：%s", full_url)
+                discard_partial(audio_path)
+                return False, 0, None
+            logging.info("從第 %d bytes 續傳：%s", offset, os.path.basename(audio_path))
+            journal["length"] = total or journal.get("length")
+        elif resp.status_code == 200:
+            offset = 0
+            length = resp.headers.get("Content-Length")
+            journal = {
+                "url": full_url,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "length": int(length) if length and length.isdigit() else None,
+            }
         else:
-            logging.warning("下載音檔失敗，狀態碼：%s, URL: %s", resp.status_code, audio_url)
+            raise HTTPStatusError(resp.status_code)
+
+        save_partial_journal(journal_path, journal)
+        # SHA-256 邊下載邊計算；續傳時先讀入已下載的部分
+        digest = hashlib.sha256()
+        if offset:
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        if resp.status_code != 416:
+            with open(part_path, "ab" if offset else "wb") as f:
+                for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+
+    size = os.path.getsize(part_path)
+    expected = journal.get("length")
+    if expected is not None and size != expected:
+        if size > expected:
+            discard_partial(audio_path)
+        raise Exception(f"檔案大小不符（{size}/{expected} bytes）")
+
+    # 改名前先驗證內容，壞檔直接丟掉重新下載
+    try:
+        info = check_audio_file(part_path, audio_path)
+    except InvalidAudioError:
+        discard_partial(audio_path)
+        raise
+
+    # 改名為正式檔名
+    os.replace(part_path, audio_path)
+    discard_temp_file(journal_path)
+    store_file(audio_path, digest.hexdigest())
+    record_audio_info(audio_path, info)
+    http_cache.remember(full_url, journal, audio_path, digest.hexdigest())
+    return True, size, digest.hexdigest()
+
+def download_audio_status(audio_url, filename, audio_folder, resume_retries=RESUME_RETRIES, timing=None):
+    """同 download_audio，但回傳 (是否成功, 最後的 HTTP 狀態碼)。
+    最後一次失敗是連線錯誤時狀態碼為 None，內容錯誤時為 STATUS_BAD_CONTENT；
+    timing 是 dict 時寫入最後一次請求的 "ttfb"。"""
+    full_url = urljoin(f"https://{BASE_DOMAIN}/", audio_url)
+    audio_path = os.path.join(audio_folder, filename)
+    status = None
+    for attempt in range(resume_retries + 1):
+        try:
+            done, size, sha256 = _resume_once(full_url, audio_path, timing)
+            if done:
+                logging.info("成功下載音檔：%s (%d bytes, sha256=%s)", filename, size, sha256[:12])
+                return True, 200
+            status = STATUS_BAD_CONTENT  # 續傳不符，部分檔已丟掉
+        except InvalidAudioError as e:
+            status = STATUS_BAD_CONTENT
+            logging.warning("音檔內容無效：%s，重新下載第 %d 次, URL: %s", e, attempt + 1, audio_url)
+        except HTTPStatusError as e:
+            # 狀態碼錯誤不是連線中斷，續傳沒有意義
+            logging.warning("下載音檔失敗，狀態碼：%s, URL: %s", e.status_code, audio_url)
+            return False, e.status_code
+        except Exception as e:
+            status = None
+            if attempt == resume_retries:
+                logging.error("下載音檔時出錯：%s, URL: %s", e, audio_url)
+            else:
+                logging.warning("下載音檔中斷：%s，續傳第 %d 次, URL: %s", e, attempt + 1, audio_url)
+    return False, status
+
+def download_audio(audio_url, filename, audio_folder, resume_retries=RESUME_RETRIES):
+    """串流下載音檔並原子性儲存為指定檔名，中斷時以 Range 續傳。成功時回傳 True。"""
+    ok, _ = download_audio_status(audio_url, filename, audio_folder, resume_retries)
+    return ok
+
+def save_audio_bytes(data, filename, audio_folder):
+    """把已取得的音檔內容驗證後原子性寫入資料夾，成功時回傳 True。"""
+    temp_path = None
+    try:
+        audio_path = os.path.join(audio_folder, filename)
+        f, temp_path = open_temp_file(audio_path)
+        with f:
+            f.write(data)
+        info = check_audio_file(temp_path, audio_path)
+        os.replace(temp_path, audio_path)
+        store_file(audio_path, hashlib.sha256(data).hexdigest())
+        record_audio_info(audio_path, info)
+        return True
+    except InvalidAudioError as e:
+        discard_temp_file(temp_path)
+        logging.warning("音檔內容無效：%s, 檔名: %s", e, filename)
+        return False
     except Exception as e:
-        logging.error("下載音檔時出錯：%s, URL: %s", e, audio_url)
+        discard_temp_file(temp_path)
+        logging.error("寫入音檔時出錯：%s, 檔名: %s", e, filename)
+        return False
 
 def clean_romaji(romaji):
     return re.sub(r'\([^\)]*\)', '', romaji).strip()
@@ -9,52 +9,56 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from crawlers.utils import download_audio, save_label, clean_romaji
+from crawlers.utils import download_audio, save_label, clean_romaji, open_temp_file, discard_temp_file
+from crawlers.session import get_session
+from crawlers.checkpoint import Checkpoint
+from crawlers.capture import find_latest_request, get_captured_body, clear_captured
+from crawlers.extract import extract_one
+from crawlers.waits import (wait_page_ready, wait_present, wait_visible, wait_invisible, wait_clickable,
+                            wait_for_change, wait_for_audio_request)
+from crawlers.audio_store import store_file
+from crawlers.audio_check import check_audio_file, record_audio_info
 import subprocess
 import tempfile
-import requests
 
 def convert_wav_to_mp3(wav_data, output_mp3_path):
-    """將 WAV 數據轉換為 MP3 文件"""
+    """將 WAV 數據轉換為 MP3 文件（先輸出到暫存檔，完成後才改名）"""
+    temp_wav_path = None
+    temp_mp3_path = None
     try:
         # 創建臨時 WAV 文件
         with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_wav:
             temp_wav.write(wav_data)
             temp_wav_path = temp_wav.name
 
-        # 使用 ffmpeg 轉換為 MP3
+        # 使用 ffmpeg 轉換為 MP3，輸出到同資料夾的暫存檔
+        temp_mp3, temp_mp3_path = open_temp_file(output_mp3_path)
+        temp_mp3.close()
         subprocess.run([
             'ffmpeg', '-i', temp_wav_path,
-            '-acodec', 'libmp3lame', '-y',
-            output_mp3_path
+            '-acodec', 'libmp3lame', '-f', 'mp3', '-y',
+            temp_mp3_path
         ], check=True, capture_output=True)
-
-        # 刪除臨時文件
-        os.unlink(temp_wav_path)
+        info = check_audio_file(temp_mp3_path, output_mp3_path)
+        os.replace(temp_mp3_path, output_mp3_path)
+        store_file(output_mp3_path)
+        record_audio_info(output_mp3_path, info)
         return True
     except Exception as e:
         logging.error(f"轉換音檔格式失敗: {e}")
+        discard_temp_file(temp_mp3_path)
         return False
+    finally:
+        # 刪除臨時文件
+        discard_temp_file(temp_wav_path)
 
 def wait_for_vocabulary_content(driver, timeout=10):
-    """等待詞表頁面的內容完全加載"""
-    try:
-        # 等待阿美語文字出現
-        WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "div#vo-show-ab"))
-        )
-        # 等待中文翻譯出現
-        WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "div#vo-show-ch"))
-        )
-        # 等待播放按鈕出現
-        WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "button#vo-btn-ab"))
-        )
-        return True
-    except Exception as e:
-        logging.warning(f"等待詞表內容超時: {e}")
-        return False
+    """等待詞表頁面的內容完全加載（族語文字、中文翻譯、播放按鈕）"""
+    for selector in ("div#vo-show-ab", "div#vo-show-ch", "button#vo-btn-ab"):
+        if wait_present(driver, (By.CSS_SELECTOR, selector), timeout, point="vocabulary/content") is None:
+            logging.warning(f"等待詞表內容超時: {selector}")
+            return False
+    return True
 
 def get_folder_name(driver):
     """獲取當前大輪的資料夾名稱"""
@@ -73,32 +77,31 @@ def clean_text(text):
     return cleaned.strip()
 
 def wait_for_wav_file(driver, current_folder, page_counter, max_retries=5, wait_time=3):
-    """等待並檢查 WAV 檔案是否出現在 network 中"""
+    """點擊播放並等待 WAV 檔案出現在 network 中，回傳攔截到的請求。
+    wait_time 是每次點擊後等待的上限（逾時會再點一次，所以不依等待紀錄縮短）。"""
     expected_wav = f"{current_folder[:2]}_{page_counter:02d}.wav"
     
     for retry in range(max_retries):
         # 清除之前的請求記錄
-        driver.requests.clear()
+        clear_captured(driver)
         
         # 點擊播放按鈕觸發音檔載入
+        play_btn = wait_clickable(driver, (By.CSS_SELECTOR, "button#vo-btn-ab"), point="vocabulary/play_button")
+        if play_btn is None:
+            logging.warning("播放按鈕無法點擊")
+            continue
         try:
-            play_btn = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "button#vo-btn-ab"))
-            )
             play_btn.click()
-            time.sleep(wait_time)  # 增加等待時間
         except Exception as e:
             logging.warning(f"點擊播放按鈕失敗: {e}")
-            time.sleep(1)  # 失敗後稍等一下
             continue
             
-        # 檢查 network 中的 WAV 文件
-        for request in driver.requests:
-            if request.response and request.url.endswith(expected_wav):
-                return request.url
+        # 音檔一出現在 network 中就回傳
+        request = wait_for_audio_request(driver, ('.wav',), expected_wav, wait_time)
+        if request is not None:
+            return request
                 
-        logging.info(f"第 {retry + 1} 次嘗試未找到音檔 {expected_wav}，等待後重試")
-        time.sleep(1)  # 每次重試之間增加額外等待
+        logging.info(f"第 {retry + 1} 次嘗試未找到音檔 {expected_wav}，重試")
     
     return None
 
@@ -109,18 +112,19 @@ def process_vocabulary_page(driver, audio_folder, label_file, jump_file, current
             return False, file_counter
 
         # 等待並檢查 WAV 檔案
-        wav_url = wait_for_wav_file(driver, current_folder, page_counter)
+        wav_request = wait_for_wav_file(driver, current_folder, page_counter)
 
         # 如果找不到預期的 WAV 文件，記錄到 jump.txt 並繼續下一個
-        if not wav_url:
+        if wav_request is None:
             with open(jump_file, "a", encoding="utf-8") as f:
                 f.write(f"跳過：大輪 {current_folder[:2]} 小輪 {page_counter:02d}\n")
             logging.info(f"找不到音檔 {current_folder[:2]}_{page_counter:02d}.wav，跳過")
             return True, file_counter
 
-        # 獲取羅馬拼音和中文
-        ab = driver.find_element(By.CSS_SELECTOR, "div#vo-show-ab").text.strip()
-        ch = driver.find_element(By.CSS_SELECTOR, "div#vo-show-ch").text.strip()
+        # 獲取羅馬拼音和中文（一次讀回）
+        texts = extract_one(driver, {"ab": ("div#vo-show-ab", "text"), "ch": ("div#vo-show-ch", "text")})
+        ab = texts["ab"] or ""
+        ch = texts["ch"] or ""
         
         if not ab or not ch:
             with open(jump_file, "a", encoding="utf-8") as f:
@@ -132,16 +136,23 @@ def process_vocabulary_page(driver, audio_folder, label_file, jump_file, current
         ch_clean = clean_text(ch)
         ab_clean = clean_romaji(ab)  # 保留原有的 clean_romaji 函數
         
-        # 下載 WAV 文件
+        # 取得 WAV 內容：優先使用攔截到的回應，缺漏時才重新下載
+        wav_url = wav_request.url
         try:
-            response = requests.get(wav_url)
-            if response.status_code == 200:
+            wav_data = get_captured_body(wav_request)
+            if wav_data is None:
+                response = get_session().get(wav_url, timeout=10)
+                if response.status_code != 200:
+                    logging.error(f"下載 WAV 文件失敗: {response.status_code}")
+                    return False, file_counter
+                wav_data = response.content
+            if wav_data:
                 # 生成檔案名稱 (例如: 0001.mp3)
                 mp3_name = f"{file_counter:04d}.mp3"
                 mp3_path = os.path.join(audio_folder, mp3_name)
 
                 # 轉換並保存為 MP3
-                if convert_wav_to_mp3(response.content, mp3_path):
+                if convert_wav_to_mp3(wav_data, mp3_path):
                     with open(label_file, "a", encoding="utf-8") as f:
                         f.write(f"{mp3_name}\n{ch_clean}({ab_clean})\nmale\none\n\n")
                     logging.info(f"已爬取 {wav_url} 並保存為 {mp3_name}: {ch_clean}({ab_clean})")
@@ -150,7 +161,7 @@ def process_vocabulary_page(driver, audio_folder, label_file, jump_file, current
                     logging.error(f"音檔轉換失敗: {wav_url}")
                     return False, file_counter
             else:
-                logging.error(f"下載 WAV 文件失敗: {response.status_code}")
+                logging.error(f"WAV 內容為空: {wav_url}")
                 return False, file_counter
         except Exception as e:
             logging.error(f"處理音檔時出錯: {e}")
@@ -184,10 +195,8 @@ def setup_folder_structure(root_folder, folder_name):
         audio_folder = os.path.join(topic_folder, "audio")
         os.makedirs(audio_folder, exist_ok=True)
         
-        # 創建並初始化 label.txt
+        # label.txt 由 Checkpoint.start_topic 建立或切回上次記錄的長度
         label_file = os.path.join(topic_folder, "label.txt")
-        with open(label_file, "w", encoding="utf-8") as f:
-            f.write("")
             
         logging.info(f"創建資料夾結構: {topic_folder}")
         return topic_folder, audio_folder, label_file
@@ -195,11 +204,11 @@ def setup_folder_structure(root_folder, folder_name):
         logging.error(f"創建資料夾結構失敗: {e}")
         return None, None, None
 
-def crawl_vocabulary(driver, main_lang, dialect, folder_name, start_number=32):
-    """爬取學習詞表內容"""
+def crawl_vocabulary(driver, main_lang, dialect, folder_name, start_number=1):
+    """爬取學習詞表內容，已完成的大輪依 .checkpoint.json 跳過，中斷的大輪從最後完成的小輪繼續"""
     base_url = "https://web.klokah.tw/vocabulary/"
     driver.get(base_url)
-    time.sleep(2)
+    wait_page_ready(driver)
     
     # 創建學習詞表根目錄
     root_folder = os.path.join(main_lang, dialect, folder_name)
@@ -211,6 +220,7 @@ def crawl_vocabulary(driver, main_lang, dialect, folder_name, start_number=32):
     if not os.path.exists(jump_file):
         with open(jump_file, "w", encoding="utf-8") as f:
             f.write("")
+    checkpoint = Checkpoint(root_folder)
     
     current_number = start_number  # 使用傳入的起始編號
     while True:  # 大輪迴圈
@@ -221,6 +231,11 @@ def crawl_vocabulary(driver, main_lang, dialect, folder_name, start_number=32):
                 logging.info("找不到下一個大輪，結束爬取")
                 break
             
+            if checkpoint.is_done(current_folder):
+                logging.info(f"大輪 {current_folder} 已完成，跳過")
+                current_number += 1
+                continue
+            
             logging.info(f"準備處理大輪: {current_folder}")
             
             # 創建資料夾結構
@@ -234,42 +249,56 @@ def crawl_vocabulary(driver, main_lang, dialect, folder_name, start_number=32):
                 EC.element_to_be_clickable((By.CSS_SELECTOR, img_selector))
             )
             img.click()
-            time.sleep(2)
+            wait_visible(driver, (By.CSS_SELECTOR, "div#vo-show-ab"), point="vocabulary/open_topic")
             logging.info(f"點擊第 {current_number:02d} 大輪圖片")
             
-            # 處理小輪
+            # 處理小輪（中斷過的大輪跳過已完成的小輪，編號接續）
+            last_page, file_counter = checkpoint.start_topic(current_folder, label_file)
             page_counter = 1
-            file_counter = 1
+            finished = False
             
             while True:  # 小輪迴圈
-                logging.info(f"處理小輪: {page_counter:02d}")
-                driver.requests.clear()
-                
-                success, file_counter = process_vocabulary_page(
-                    driver, audio_folder, label_file, jump_file,
-                    current_folder, page_counter, file_counter
-                )
-                
-                if not success:
-                    logging.error(f"處理小輪 {page_counter:02d} 失敗")
-                    break
+                if page_counter <= last_page:
+                    logging.info(f"小輪 {page_counter:02d} 已完成，跳過")
+                else:
+                    logging.info(f"處理小輪: {page_counter:02d}")
+                    clear_captured(driver)
+                    
+                    success, file_counter = process_vocabulary_page(
+                        driver, audio_folder, label_file, jump_file,
+                        current_folder, page_counter, file_counter
+                    )
+                    
+                    if not success:
+                        logging.error(f"處理小輪 {page_counter:02d} 失敗")
+                        break
+                    checkpoint.commit_item(current_folder, page_counter, file_counter, label_file)
                     
                 # 檢查下一頁按鈕
                 next_btn = driver.find_element(By.CSS_SELECTOR, "button#vo-right")
                 if next_btn.get_attribute("style") and "hidden" in next_btn.get_attribute("style"):
                     logging.info(f"當前大輪 {current_folder} 的所有小輪處理完成")
+                    finished = True
                     break
                     
+                # 換頁後等族語文字變化，變化時就繼續
+                try:
+                    old_ab = driver.find_element(By.CSS_SELECTOR, "div#vo-show-ab").text.strip()
+                except NoSuchElementException:
+                    old_ab = ""
                 next_btn.click()
-                time.sleep(1.5)
+                wait_for_change(driver, "div#vo-show-ab", old_ab, timeout=5)
                 page_counter += 1
             
+            if finished:
+                checkpoint.mark_done(current_folder, file_counter, label_file)
+            
             # 返回主頁面
             back_btn = WebDriverWait(driver, 10).until(
                 EC.element_to_be_clickable((By.CSS_SELECTOR, "button#vo-back"))
             )
             back_btn.click()
-            time.sleep(1.5)
+            wait_invisible(driver, (By.CSS_SELECTOR, "button#vo-back"), point="vocabulary/back")
             logging.info("返回主頁面")
             
             # 準備處理下一個大輪
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+條件等待模組。
+取代點擊、切換分頁、切換 iframe、按「下一個」之後固定的 time.sleep：
+以較短的間隔檢查條件，頁面一準備好就繼續，超過上限才放棄。
+換頁、換單字這類變化可用 wait_for_change：在頁面裡掛 MutationObserver，
+變化發生時連同新內容一次回傳，整個等待只需要一次 WebDriver 呼叫。
+每一種等待都會記錄花費的時間與逾時次數，結束時由 log_wait_stats 輸出。
+
+帶有 point（例如 "vocabulary/wav"）的等待會把實際等到的時間記到 .wait_profile.json，
+樣本足夠後，之後的執行改用 p95 乘上安全係數當作逾時、依中位數決定檢查間隔，
+網站快的時候就跟著快，不必再改程式裡的秒數；程式裡寫的秒數仍是上限。
+逾時後會再點一次或結束迴圈的等待不要加 point，逾時一律用程式裡寫的秒數；
+逾時就放棄這一項的等待（例如 wait_for_audio_request）用 shorten=False，只校正檢查間隔。
+"""
+
+import os
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import (TimeoutException, NoSuchElementException,
+                                        StaleElementReferenceException, WebDriverException)
+from .capture import find_latest_request
+from .supervisor import SCRIPT_TIMEOUT
+
+POLL_INTERVAL = 0.1    # 檢查條件的間隔（秒），WebDriverWait 預設是 0.5
+DEFAULT_TIMEOUT = 10   # 預設的等待上限（秒）
+
+PROFILE_FILE = ".wait_profile.json"
+PROFILE_SAMPLES = 200           # 每個等待點保留最近幾筆成功的等待時間
+PROFILE_MIN_SAMPLES = 20        # 樣本少於這個數量時仍使用程式裡寫的逾時
+PROFILE_MARGIN = 1.5            # p95 乘上的安全係數
+PROFILE_MIN_TIMEOUT = 1.0       # 校正後的逾時下限（秒）
+PROFILE_MAX_TIMEOUT_RATE = 0.2  # 最近逾時比例超過這個值時改回程式裡寫的逾時
+MIN_POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.5
+PROFILE_LOCK_TIMEOUT = 10.0     # 等待其他行程釋放 .wait_profile.json.lock 的上限（秒），超過視為殘留的鎖
+
+# 檢查條件時可以忽略、下一輪再試的例外
+IGNORED_EXCEPTIONS = (NoSuchElementException, StaleElementReferenceException)
+
+# 在頁面中等待 selector 的文字（或屬性）和舊值不同，回傳 {value, fields}，逾時回傳 null。
+# fields 的規格若帶第三個元素（舊值），該欄位也必須和舊值不同才會回傳。
+# 文字比對前先把連續空白合併，和 WebElement.text 的結果一致。
+CHANGE_OBSERVER_SCRIPT = """
+const [selector, attribute, oldValue, fields, timeoutMs] = arguments;
+const done = arguments[arguments.length - 1];
+const norm = v => v == null ? null : String(v).replace(/\\s+/g, ' ').trim();
+const read = (sel, attr) => {
+    const el = document.querySelector(sel);
+    if (!el) return null;
+    return attr ? el.getAttribute(attr) : norm(el.innerText);
+};
+const old = attribute ? oldValue : norm(oldValue);
+let finished = false, observer = null, timer = null;
+const finish = result => {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    if (timer) clearTimeout(timer);
+    done(result);
+};
+const check = () => {
+    const value = read(selector, attribute);
+    if (value === null || value === old) return false;
+    const extra = {};
+    for (const [name, spec] of Object.entries(fields || {})) {
+        extra[name] = read(spec[0], spec[1]);
+        // 有第三個元素（舊值）的欄位也要和舊值不同才算完成
+        if (spec.length > 2 && (extra[name] === null || extra[name] === (spec[1] ? spec[2] : norm(spec[2])))) return false;
+    }
+    finish({value: value, fields: extra});
+    return true;
+};
+if (!check()) {
+    observer = new MutationObserver(check);
+    observer.observe(document.body || document.documentElement,
+                     {subtree: true, childList: true, characterData: true, attributes: true});
+    timer = setTimeout(() => finish(null), timeoutMs);
+}
+"""
+
+_stats_lock = threading.Lock()
+_stats = {}  # 等待名稱 -> {"count", "timeouts", "total", "max"}
+
+_profile_lock = threading.Lock()
+_profile = None  # 等待點 -> {"samples": [秒數...], "count": 次數, "timeouts": 逾時次數}（含這次執行）
+_pending = {}    # 這次執行新增、尚未寫回檔案的紀錄，格式同上
+
+def _load_profile_file():
+    try:
+        with open(PROFILE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _profile_entries():
+    """第一次使用時讀取等待紀錄檔。呼叫時須持有 _profile_lock。"""
+    global _profile
+    if _profile is None:
+        _profile = _load_profile_file()
+    return _profile
+
+def _trim(entry):
+    """次數超過 PROFILE_SAMPLES 時等比例縮小，讓逾時比例反映最近的情況。"""
+    if entry["count"] > PROFILE_SAMPLES:
+        entry["timeouts"] = round(entry["timeouts"] * PROFILE_SAMPLES / entry["count"], 2)
+        entry["count"] = PROFILE_SAMPLES
+
+def _add_sample(entries, point, seconds, ok, censored=False):
+    entry = entries.setdefault(point, {"samples": [], "count": 0, "timeouts": 0})
+    entry["count"] += 1
+    if ok or censored:
+        entry["samples"] = (entry["samples"] + [round(seconds, 3)])[-PROFILE_SAMPLES:]
+    if not ok:
+        entry["timeouts"] += 1
+    if entries is not _pending:
+        _trim(entry)
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def record_latency(point, seconds, ok=True, censored=False):
+    """記錄某個等待點實際花費的時間；逾時只計次數，不當成樣本。
+    censored=True 表示是被校正後縮短的逾時切斷的，實際時間至少是 seconds，
+    也當成樣本記錄，避免紀錄只剩快的樣本而讓逾時越縮越短。"""
+    with _profile_lock:
+        _add_sample(_profile_entries(), point, seconds, ok, censored)
+        _add_sample(_pending, point, seconds, ok, censored)
+
+def calibrated(point, timeout):
+    """依等待紀錄回傳 (逾時, 檢查間隔)。樣本不足或最近常逾時時使用傳入的 timeout。"""
+    with _profile_lock:
+        entry = _profile_entries().get(point)
+        if not entry or len(entry["samples"]) < PROFILE_MIN_SAMPLES:
+            return timeout, POLL_INTERVAL
+        samples = entry["samples"]
+        if entry["timeouts"] / max(entry["count"], 1) > PROFILE_MAX_TIMEOUT_RATE:
+            return timeout, POLL_INTERVAL
+    p95 = _percentile(samples, 0.95)
+    median = _percentile(samples, 0.5)
+    tuned = min(timeout, max(PROFILE_MIN_TIMEOUT, p95 * PROFILE_MARGIN))
+    poll = min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, median / 5))
+    return tuned, poll
+
+@contextmanager
+def _profile_file_lock():
+    """跨行程的檔案鎖（以 O_EXCL 建立 .lock 檔），平行的工作行程輪流合併等待紀錄。"""
+    lock_path = PROFILE_FILE + ".lock"
+    deadline = time.time() + PROFILE_LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > PROFILE_LOCK_TIMEOUT:
+                    os.remove(lock_path)  # 持有的行程已經當掉
+                    continue
+            except OSError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"無法取得 {lock_path}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+def save_wait_profile():
+    """把這次執行新增的紀錄合併回 .wait_profile.json（其他工作行程可能也寫過，讀取到改名之間持有檔案鎖）。"""
+    with _profile_lock:
+        if not _pending:
+            return
+        try:
+            with _profile_file_lock():
+                _merge_pending_into_file()
+        except (OSError, TimeoutError) as e:
+            logging.warning(f"寫入等待紀錄失敗: {e}")
+            return
+        _pending.clear()
+    logging.info(f"已更新等待紀錄: {PROFILE_FILE}")
+
+def _merge_pending_into_file():
+    """讀取檔案、加上 _pending 後原子性寫回。呼叫時須持有 _profile_lock 與檔案鎖。"""
+    merged = _load_profile_file()
+    for point, new in _pending.items():
+        entry = merged.setdefault(point, {"samples": [], "count": 0, "timeouts": 0})
+        entry["samples"] = (entry["samples"] + new["samples"])[-PROFILE_SAMPLES:]
+        entry["count"] += new["count"]
+        entry["timeouts"] += new["timeouts"]
+        _trim(entry)
+    temp_path = f"{PROFILE_FILE}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(merged, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, PROFILE_FILE)
+
+def record_wait(name, seconds, ok=True):
+    """記錄一次等待花費的時間。"""
+    with _stats_lock:
+        stat = _stats.setdefault(name, {"count": 0, "timeouts": 0, "total": 0.0, "max": 0.0})
+        stat["count"] += 1
+        stat["total"] += seconds
+        stat["max"] = max(stat["max"], seconds)
+        if not ok:
+            stat["timeouts"] += 1
+
+def wait_stats():
+    """回傳目前為止各種等待的統計（複本）。"""
+    with _stats_lock:
+        return {name: dict(stat) for name, stat in _stats.items()}
+
+def log_wait_stats():
+    """把等待統計寫進日誌，依總花費時間排序，並寫回等待紀錄檔。"""
+    save_wait_profile()
+    stats = wait_stats()
+    if not stats:
+        return
+    logging.info("等待統計（次數 / 逾時 / 平均 / 最長 / 合計）:")
+    for name, stat in sorted(stats.items(), key=lambda item: item[1]["total"], reverse=True):
+        average = stat["total"] / stat["count"]
+        logging.info(f"  {name}: {stat['count']} 次 / {stat['timeouts']} 次 / "
+                     f"{average:.2f}s / {stat['max']:.2f}s / {stat['total']:.1f}s")
+
+def wait_until(driver, condition, timeout=DEFAULT_TIMEOUT, name="wait_until", point=None, shorten=True):
+    """每 POLL_INTERVAL 秒檢查一次 condition(driver)，回傳第一個為真的結果，逾時回傳 None。
+    driver 也可以是 WebElement，在元素範圍內檢查。
+    有 point 時逾時與檢查間隔依等待紀錄校正，並記錄這次的等待時間；
+    shorten=False 時只校正檢查間隔，逾時維持傳入的秒數。"""
+    poll = POLL_INTERVAL
+    shortened = False
+    if point:
+        name = point
+        coded = timeout
+        tuned, poll = calibrated(point, timeout)
+        if shorten:
+            timeout = tuned
+        shortened = timeout < coded
+    start = time.time()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=poll,
+                               ignored_exceptions=IGNORED_EXCEPTIONS).until(condition)
+        ok = True
+    except TimeoutException:
+        result = None
+        ok = False
+        logging.debug(f"等待 {name} 逾時（{timeout:.1f} 秒）")
+    elapsed = time.time() - start
+    record_wait(name, elapsed, ok)
+    if point:
+        record_latency(point, elapsed, ok, censored=shortened)
+    return result
+
+def wait_page_ready(driver, timeout=DEFAULT_TIMEOUT, point=None):
+    """等待 document.readyState 變成 complete。"""
+    return wait_until(driver, lambda d: d.execute_script("return document.readyState") == "complete",
+                      timeout, "page_ready", point)
+
+def wait_present(driver, locator, timeout=DEFAULT_TIMEOUT, point=None):
+    """等待元素出現在 DOM，回傳元素或 None。"""
+    return wait_until(driver, EC.presence_of_element_located(locator), timeout, "present", point)
+
+def wait_visible(driver, locator, timeout=DEFAULT_TIMEOUT, point=None):
+    """等待元素可見，回傳元素或 None。"""
+    return wait_until(driver, EC.visibility_of_element_located(locator), timeout, "visible", point)
+
+def wait_invisible(driver, locator, timeout=DEFAULT_TIMEOUT, point=None):
+    """等待元素消失或隱藏（例如返回按鈕），成功時回傳 True。"""
+    return bool(wait_until(driver, EC.invisibility_of_element_located(locator), timeout, "invisible", point))
+
+def wait_clickable(driver, locator, timeout=DEFAULT_TIMEOUT, point=None):
+    """等待元素可以點擊，回傳元素或 None。"""
+    return wait_until(driver, EC.element_to_be_clickable(locator), timeout, "clickable", point)
+
+def wait_text_change(driver, locator, old_text, timeout=DEFAULT_TIMEOUT, point=None):
+    """等待元素的文字和 old_text 不同（換頁、換單字），回傳新的文字或 None。"""
+    def changed(d):
+        text = d.find_element(*locator).text.strip()
+        return text if text != old_text else False
+    return wait_until(driver, changed, timeout, "text_change", point)
+
+def wait_attribute_change(driver, locator, attribute, old_value, timeout=DEFAULT_TIMEOUT, point=None):
+    """等待元素的屬性和 old_value 不同（例如 iframe 的 src、按鈕的 data-value），回傳新值或 None。"""
+    def changed(d):
+        value = d.find_element(*locator).get_attribute(attribute)
+        return value if value != old_value else False
+    return wait_until(driver, changed, timeout, "attribute_change", point)
+
+def wait_for_audio_request(driver, suffixes=('.mp3',), name=None, timeout=DEFAULT_TIMEOUT, point=None):
+    """點擊播放後等待 network 記錄出現有回應的音檔請求，回傳該請求或 None。
+    呼叫前應先 clear_captured，避免拿到上一次的請求。
+    逾時時呼叫端會直接放棄這一項，因此 point 只校正檢查間隔，逾時一律用 timeout。"""
+    return wait_until(driver, lambda d: find_latest_request(d, suffixes, name), timeout, "audio_request", point,
+                      shorten=False)
+
+def wait_frame_ready(driver, locator, timeout=DEFAULT_TIMEOUT, point=None):
+    """等待 iframe 可用並切換進去，再等 iframe 內的文件載入完成。成功時回傳 True。"""
+    if not wait_until(driver, EC.frame_to_be_available_and_switch_to_it(locator), timeout, "frame_available", point):
+        return False
+    return wait_page_ready(driver, timeout) is not None
+
+def wait_for_change(driver, selector, old_value, attribute=None, fields=None, timeout=DEFAULT_TIMEOUT, point=None):
+    """點擊「下一個」之後等待 selector 的文字（或 attribute 屬性）和 old_value 不同。
+    fields 是 {名稱: (CSS selector, 屬性或 None 表示文字)}，變化時一起讀回來；
+    規格寫成 (selector, 屬性, 舊值) 時，要等該欄位也和舊值不同才算完成。
+    回傳 {"value": 新值, "fields": {...}}，逾時回傳 None。
+    頁面不支援 execute_async_script 時改用一般的輪詢。"""
+    shortened = False
+    if point:
+        coded = timeout
+        timeout, _ = calibrated(point, timeout)
+        shortened = timeout < coded
+    # 不能超過 driver 的 script timeout，否則會被 WebDriver 先中斷
+    timeout = min(timeout, SCRIPT_TIMEOUT - 1)
+    start = time.time()
+    try:
+        result = driver.execute_async_script(CHANGE_OBSERVER_SCRIPT, selector, attribute, old_value,
+                                             {name: list(spec) for name, spec in (fields or {}).items()},
+                                             int(timeout * 1000))
+    except TimeoutException:
+        result = None
+    except WebDriverException as e:
+        logging.debug(f"MutationObserver 無法使用，改用輪詢: {e}")
+        return _poll_for_change(driver, selector, old_value, attribute, fields, timeout, point)
+    elapsed = time.time() - start
+    record_wait(point or "mutation", elapsed, ok=result is not None)
+    if point:
+        record_latency(point, elapsed, ok=result is not None, censored=shortened)
+    return result
+
+def _poll_for_change(driver, selector, old_value, attribute, fields, timeout, point=None):
+    """wait_for_change 的備用做法：用 WebDriverWait 輪詢 selector 與 fields，條件同 CHANGE_OBSERVER_SCRIPT。"""
+    def read(field_selector, field_attribute):
+        try:
+            element = driver.find_element(By.CSS_SELECTOR, field_selector)
+        except NoSuchElementException:
+            return None
+        return element.get_attribute(field_attribute) if field_attribute else element.text.strip()
+
+    def changed(d):
+        value = read(selector, attribute)
+        if value is None or value == old_value:
+            return False
+        extra = {}
+        for name, spec in (fields or {}).items():
+            extra[name] = read(spec[0], spec[1])
+            if len(spec) > 2 and extra[name] in (None, spec[2]):
+                return False
+        return {"value": value, "fields": extra}
+    return wait_until(driver, changed, timeout, "mutation", point)
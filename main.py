@@ -4,9 +4,11 @@
 import os
 import time
 import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import requests
 from datetime import datetime
-from seleniumwire import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select, WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -17,13 +19,26 @@ from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
 
 # Import specialized modules from crawlers directory
 from crawlers.alphabet_crawler import crawl_alphabet_words
-from crawlers.sentence_crawler import crawl_sentences
+from crawlers.sentence_crawler import crawl_sentences, set_page_source
 from crawlers.twelve_year_crawler import crawl_twelve_year_course
 from crawlers.state import CREATED_FOLDERS
+from crawlers import session as http_session, downloader
+from crawlers.session import get_session, close_session, configure_session
+from crawlers.downloader import drain_downloads, shutdown_downloads, configure_downloads
+from crawlers.audio_store import enable_audio_store, write_dedupe_report
+from crawlers.http_cache import enable_http_cache, cache_stats
+from crawlers.audio_check import INFO_FILE_NAME, load_audio_info, recorded_duration
+from crawlers.driver_cache import resolve_chromedriver, forget_driver, chrome_version, major_version, set_offline
+from crawlers.capture import create_driver, apply_capture_scope, set_capture_backend, CAPTURE_BACKENDS
+from crawlers.lang_state import (load_language_state, save_language_state, forget_language_state,
+                                 inject_language_state, language_active)
+from crawlers.supervisor import supervise, apply_timeouts, close_driver
+from crawlers.waits import log_wait_stats
+from crawlers.browser import (HEADED_SECTIONS, add_lean_options, register_profile_dir,
+                              apply_resource_blocking, lean_block_for)
 from crawlers.picture_story_crawler import crawl_picture_stories
 from crawlers.life_conversation_crawler import crawl_life_conversation
 from crawlers.reading_writing_crawler import crawl_reading_writing
@@ -32,13 +47,28 @@ from crawlers.vocabulary_crawler import crawl_vocabulary
 from crawlers.dialogue_crawler import crawl_dialogue
 from crawlers.essay_crawler import crawl_essay
 from crawlers.reading_text_crawler import crawl_reading_text
-from crawlers.lima_audiobook_crawler import crawl_lima
+from crawlers.lima_audiobook_crawler import crawl_lima, LIMA_LANG_IDS
 # ---------------------------
 # Global Settings
 # ---------------------------
 
 BASE_DOMAIN = "klokah.tw"
 
+# 啟用內容定址音檔庫：相同錄音只存一份，各資料夾的 NNNN.mp3 改為硬連結
+USE_AUDIO_STORE = False
+
+# 啟用磁碟 HTTP 快取：重新爬取時以 ETag/Last-Modified 確認，內容沒變就不重新下載
+USE_HTTP_CACHE = True
+
+# 要爬取的方言清單（--all-dialects 時全部爬取），未指定時只爬 DEFAULT_LANG_CONFIG
+LANG_CONFIGS = [
+    {"main_lang": "排灣語", "dialect": "東排灣語"},
+    {"main_lang": "泰雅語", "dialect": "賽考利克泰雅語"},
+    {"main_lang": "阿美語", "dialect": "海岸阿美語"},
+]
+DEFAULT_LANG_CONFIG = LANG_CONFIGS[1]
+MATRIX_REPORT_FILE = "matrix_stat.txt"
+
 # 設定日誌
 logging.basicConfig(
     level=logging.INFO,
@@ -53,7 +83,7 @@ def download_audio(audio_url, filename, audio_folder):
     """Download audio file and save with specified filename."""
     try:
         full_url = urljoin(f"https://{BASE_DOMAIN}/", audio_url)
-        resp = requests.get(full_url, timeout=10)
+        resp = get_session().get(full_url, timeout=10)
         if resp.status_code == 200:
             audio_path = os.path.join(audio_folder, filename)
             with open(audio_path, "wb") as f:
@@ -146,6 +176,19 @@ def select_language(driver, lang_config):
 
     return True, main_lang_name, dialect_name
 
+def ensure_language(driver, lang_config, state=None):
+    """確認頁面已是目標方言：注入的狀態有效就直接使用，否則用 select_language 點選並保存狀態。"""
+    if state and language_active(driver, lang_config, state):
+        logging.info(f"沿用已保存的語言狀態: {lang_config['main_lang']}/{lang_config['dialect']}")
+        return True, state["main_lang_name"], state["dialect_name"]
+    if state:
+        logging.info("保存的語言狀態無效，重新選擇語言")
+        forget_language_state(lang_config)
+    ok, main_lang_name, dialect_name = select_language(driver, lang_config)
+    if ok:
+        save_language_state(driver, lang_config, main_lang_name, dialect_name)
+    return ok, main_lang_name, dialect_name
+
 def write_stat_file(main_lang=None, dialect=None, url=None, elapsed_time=None):
     """Write statistics to file."""
     outer_folder = os.path.join(main_lang, dialect)
@@ -194,196 +237,443 @@ def write_stat_file(main_lang=None, dialect=None, url=None, elapsed_time=None):
     with open(stat_path, 'w', encoding='utf-8') as f:
         f.writelines(lines)
 
-def setup_driver():
-    """設定並返回 Chrome WebDriver。"""
+def setup_driver(headless=False, shm_profile=False):
+    """設定並返回 Chrome WebDriver。headless=True 時使用精簡的無頭模式。"""
     chrome_options = Options()
-    # chrome_options.add_argument('--headless')  # 移除無頭模式!!! 不開正在爬的畫面可以爬得更快  移除無頭模式!!! 不開正在爬的畫面可以爬得更快  
-    # 有時候 Selenium 會抓不到裡面的內容（尤其是 headless 模式或某些驅動）。
+    # 無頭模式不開畫面可以爬得更快，但有時候 Selenium 會抓不到裡面的內容，
+    # 需要完整畫面的篇章列在 crawlers/browser.py 的 HEADED_SECTIONS
     chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
+    if not shm_profile:
+        chrome_options.add_argument('--disable-dev-shm-usage')
+    profile_dir = add_lean_options(chrome_options, headless=headless, shm_profile=shm_profile)
     
-    # 優先使用手動指定的 ChromeDriver 路徑
-    manual_paths = [
-        r"C:\chromedriver-win64\chromedriver.exe",  # 您的 ChromeDriver 位置
-        r"C:\chromedriver\chromedriver.exe",  # 備用位置
-        r".\chromedriver.exe",  # 當前目錄
-    ]
-    
-    service = None
-    # 先嘗試手動路徑
-    for path in manual_paths:
-        try:
-            if os.path.exists(path):
-                service = Service(path)
-                logging.info(f"使用手動指定的 ChromeDriver 路徑: {path}")
-                break
-        except Exception as e:
-            logging.warning(f"嘗試路徑 {path} 失敗: {e}")
-            continue
+    # ChromeDriver 路徑依 Chrome 主版本快取，清單與離線模式見 crawlers/driver_cache.py
+    service = Service(resolve_chromedriver())
     
-    # 如果手動路徑都失敗，嘗試 WebDriverManager
-    if service is None:
-        try:
-            logging.info("手動路徑不可用，嘗試使用 WebDriverManager...")
-            service = Service(ChromeDriverManager().install())
-            logging.info("WebDriverManager 成功")
-        except Exception as e:
-            logging.error(f"WebDriverManager 也失敗: {e}")
-            # 最後嘗試系統 PATH
-            try:
-                service = Service("chromedriver")
-                logging.info("使用系統 PATH 中的 chromedriver")
-            except:
-                logging.error("所有 ChromeDriver 來源都失敗")
-                raise Exception("無法找到可用的 ChromeDriver")
-    
-    # 嘗試啟動瀏覽器，如果版本不匹配，回退到 WebDriverManager
+    # 嘗試啟動瀏覽器，如果版本不匹配，清掉快取並回退到 WebDriverManager
     try:
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        driver.maximize_window()
-        return driver
+        driver = create_driver(service, chrome_options)
     except Exception as e:
         if "version" in str(e).lower() or "supports" in str(e).lower():
             logging.warning(f"版本不匹配，嘗試使用 WebDriverManager 自動下載匹配版本: {e}")
+            forget_driver(major_version(chrome_version()))
             try:
-                service = Service(ChromeDriverManager().install())
-                driver = webdriver.Chrome(service=service, options=chrome_options)
-                driver.maximize_window()
-                return driver
+                service = Service(resolve_chromedriver(force_download=True))
+                driver = create_driver(service, chrome_options)
             except Exception as e2:
                 logging.error(f"WebDriverManager 備用方案也失敗: {e2}")
                 raise e2
         else:
             raise e
+    apply_capture_scope(driver)
+    apply_timeouts(driver)
+    if not headless:
+        driver.maximize_window()
+    register_profile_dir(driver, profile_dir)
+    return driver
 
 
-def main():
-    """主程式。"""
-    # 初始化 WebDriver
-    driver = setup_driver()
-    
-    # 語言設定
-    # LANG_CONFIG = {
-    #     "main_lang": "排灣語",
-    #     "dialect": "東排灣語"
-    # }
-    # 賽考利克泰雅語
-    LANG_CONFIG = {
-        "main_lang": "泰雅語",
-        "dialect": "賽考利克泰雅語"
+def get_crawlers():
+    """要爬取的篇章設定，不需要的篇章註解掉即可。"""
+    return {
+        # '字母篇': {
+        #     'url': 'https://web.klokah.tw/extension/ab_practice/index.php',
+        #     'func': crawl_alphabet_words,
+        #     'folder': '字母篇'
+        # }
+        # ,
+        # '句型篇國中版': {
+        #     'url': 'https://web.klokah.tw/extension/sp_junior/practice.php',
+        #     'func': crawl_sentences,
+        #     'folder': '句型篇國中版'
+        # }
+        # ,
+        # '句型篇高中版': {
+        #     'url': 'https://web.klokah.tw/extension/sp_senior/practice.php',
+        #     'func': crawl_sentences,
+        #     'folder': '句型篇高中版'
+        # }
+        # ,
+        # '十二年國教課程': {
+        #     'url': 'https://web.klokah.tw/twelve/learn.php',
+        #     'func': crawl_twelve_year_course,
+        #     'folder': '十二年國教課程'
+        # }
+        # ,
+        # '圖畫故事篇': {
+        #     'url': 'https://web.klokah.tw/extension/ps_practice/',
+        #     'func': crawl_picture_stories,
+        #     'folder': '圖畫故事篇'
+        # }
+        # ,
+        # '生活會話篇': {
+        #     'url': 'https://web.klokah.tw/extension/con_practice/',
+        #     'func': crawl_life_conversation,
+        #     'folder': '生活會話篇'
+        # }
+        # ,
+        # '閱讀書寫篇': {
+        #     'url': 'https://web.klokah.tw/extension/rd_practice/',
+        #     'func': crawl_reading_writing,
+        #     'folder': '閱讀書寫篇'
+        # }
+        # ,
+        # '文化篇': {
+        #     'url': 'https://web.klokah.tw/extension/cu_practice/',
+        #     'func': crawl_culture,
+        #     'folder': '文化篇'
+        # }
+        # ,
+        # '學習詞表': {
+        #     'url': 'https://web.klokah.tw/vocabulary/', # 中斷後重新執行會依 .checkpoint.json 從斷掉的大輪繼續
+        #     'func': crawl_vocabulary,
+        #     'folder': '學習詞表'
+        # },
+        # '情境族語': {
+        #     'url': 'https://web.klokah.tw/dialogue/', 
+        #     'func': crawl_dialogue,
+        #     'folder': '情境族語'  # 學習三 的 單詞學習 爬不出來 明明學習二的單詞學習就爬的到 
+        # },
+        # '族語短文': {
+        #     'url': 'https://web.klokah.tw/essay/',
+        #     'func': crawl_essay,
+        #     'folder': '族語短文'
+        # },  
+        # '閱讀文本': {
+        #     'url': 'https://web.klokah.tw/extension/readingtext/',
+        #     'func': crawl_reading_text,
+        #     'folder': '閱讀文本'
+        # },
+        'LIMA有聲書': {   # 輸出格式跟別人不太一樣
+            'url': 'https://web.klokah.tw/lima/',
+            'func': crawl_lima,
+            'folder': 'LIMA有聲書',
+            'dialects': set(LIMA_LANG_IDS),  # 只有已知語言編號的方言，其他方言略過
+        },
+
+        # 還有 10 個 不然就是超長的那種 30幾分鐘 的影片
+        # 補充教材： 閱讀文本 
+        # 教材教具學習： WAWA點點樂 、 主題式掛圖的身體 親屬 山川自然 動物 、 LIMA有聲書 
+        # 開放平台： 繪本平台 、 動畫平台 、 影音中心 、 自編教材 、 教案平台 、 句法演練平台  
     }
-    
-    
-    # LANG_CONFIG = {
-    #     "main_lang": "阿美語",
-    #     "dialect": "海岸阿美語"
-    # }
-    
-    try:
-        # 只建立語言和方言資料夾
-        lang_folder = LANG_CONFIG["main_lang"]
-        dialect_folder = os.path.join(lang_folder, LANG_CONFIG["dialect"])
-        os.makedirs(dialect_folder, exist_ok=True)
-
-        crawlers = {
-            # '字母篇': {
-            #     'url': 'https://web.klokah.tw/extension/ab_practice/index.php',
-            #     'func': crawl_alphabet_words,
-            #     'folder': '字母篇'
-            # }
-            # ,
-            # '句型篇國中版': {
-            #     'url': 'https://web.klokah.tw/extension/sp_junior/practice.php',
-            #     'func': crawl_sentences,
-            #     'folder': '句型篇國中版'
-            # }
-            # ,
-            # '句型篇高中版': {
-            #     'url': 'https://web.klokah.tw/extension/sp_senior/practice.php',
-            #     'func': crawl_sentences,
-            #     'folder': '句型篇高中版'
-            # }
-            # ,
-            # '十二年國教課程': {
-            #     'url': 'https://web.klokah.tw/twelve/learn.php',
-            #     'func': crawl_twelve_year_course,
-            #     'folder': '十二年國教課程'
-            # }
-            # ,
-            # '圖畫故事篇': {
-            #     'url': 'https://web.klokah.tw/extension/ps_practice/',
-            #     'func': crawl_picture_stories,
-            #     'folder': '圖畫故事篇'
-            # }
-            # ,
-            # '生活會話篇': {
-            #     'url': 'https://web.klokah.tw/extension/con_practice/',
-            #     'func': crawl_life_conversation,
-            #     'folder': '生活會話篇'
-            # }
-            # ,
-            # '閱讀書寫篇': {
-            #     'url': 'https://web.klokah.tw/extension/rd_practice/',
-            #     'func': crawl_reading_writing,
-            #     'folder': '閱讀書寫篇'
-            # }
-            # ,
-            # '文化篇': {
-            #     'url': 'https://web.klokah.tw/extension/cu_practice/',
-            #     'func': crawl_culture,
-            #     'folder': '文化篇'
-            # }
-            # ,
-            # '學習詞表': {
-            #     'url': 'https://web.klokah.tw/vocabulary/', # 到第32個小輪就會斷掉 爬不到 所有要再改 start_number=1 變成32開始繼續爬
-            #     'func': crawl_vocabulary,
-            #     'folder': '學習詞表'
-            # },
-            # '情境族語': {
-            #     'url': 'https://web.klokah.tw/dialogue/', 
-            #     'func': crawl_dialogue,
-            #     'folder': '情境族語'  # 學習三 的 單詞學習 爬不出來 明明學習二的單詞學習就爬的到 
-            # },
-            # '族語短文': {
-            #     'url': 'https://web.klokah.tw/essay/',
-            #     'func': crawl_essay,
-            #     'folder': '族語短文'
-            # },  
-            # '閱讀文本': {
-            #     'url': 'https://web.klokah.tw/extension/readingtext/',
-            #     'func': crawl_reading_text,
-            #     'folder': '閱讀文本'
-            # },
-            'LIMA有聲書': {   # 輸出格式跟別人不太一樣
-                'url': 'https://web.klokah.tw/lima/',
-                'func': crawl_lima,
-                'folder': 'LIMA有聲書'
-            },
-
-            # 還有 10 個 不然就是超長的那種 30幾分鐘 的影片
-            # 補充教材： 閱讀文本 
-            # 教材教具學習： WAWA點點樂 、 主題式掛圖的身體 親屬 山川自然 動物 、 LIMA有聲書 
-            # 開放平台： 繪本平台 、 動畫平台 、 影音中心 、 自編教材 、 教案平台 、 句法演練平台  
-        }
-        for name, config in crawlers.items():
+
+def share_host_limits(workers):
+    """平行模式下每個工作行程各有自己的連線池與下載佇列，
+    把連線池大小、每個 host 的連線上限與下載並行上限除以行程數，總量維持單一行程時的上限。"""
+    if workers <= 1:
+        return
+    configure_session(
+        pool_maxsize=max(1, http_session.POOL_MAXSIZE // workers),
+        host_limits={host: max(1, limit // workers) for host, limit in http_session.HOST_LIMITS.items()})
+    configure_downloads(max_workers=max(1, downloader.MAX_WORKERS // workers))
+    logging.info(f"平行 {workers} 個行程，本行程連線池 {http_session.POOL_MAXSIZE}、"
+                 f"host 上限 {http_session.HOST_LIMITS}、下載並行上限 {downloader.MAX_WORKERS}")
+
+def start_services(compact_cache=True):
+    """啟用音檔庫與 HTTP 快取等共用服務。"""
+    if USE_AUDIO_STORE:
+        enable_audio_store(".")
+    if USE_HTTP_CACHE:
+        enable_http_cache(".", compact=compact_cache)
+
+def stop_services(report_file="dedupe_report.txt"):
+    """等待背景下載完成並關閉共用服務。"""
+    shutdown_downloads()
+    close_session()
+    if USE_AUDIO_STORE:
+        write_dedupe_report(report_file)
+    if USE_HTTP_CACHE:
+        hits, misses = cache_stats()
+        logging.info(f"HTTP 快取: 命中 {hits} 個，新下載 {misses} 個")
+    log_wait_stats()
+
+def start_section_driver(name, headless=False, shm_profile=False):
+    """為篇章開一個新的 driver（headless 時套用該篇章的資源封鎖）。"""
+    driver = setup_driver(headless=headless, shm_profile=shm_profile)
+    if headless:
+        apply_resource_blocking(driver, lean_block_for(name))
+    return driver
+
+def crawl_section(driver, name, config, lang_config):
+    """在指定的 driver 上爬取單一篇章，選擇語言失敗時回傳 False。"""
+    logging.info(f"開始爬取 {name}")
+    state = load_language_state(lang_config)
+    if state:
+        inject_language_state(driver, lang_config, state)
+    driver.get(config['url'])
+    time.sleep(2)
+    ok, main_lang, dialect = ensure_language(driver, lang_config, state)
+    if not ok:
+        logging.error(f"{name} 選擇語言失敗")
+        return False
+    # 不要再呼叫 create_base_folders
+    config['func'](driver, main_lang, dialect, config['folder'])
+    drain_downloads()
+    logging.info(f"完成爬取 {name}")
+    return True
+
+def setup_worker_logging(name, log_dir):
+    """平行模式下每個工作行程各自寫一個日誌檔。"""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    formatter = logging.Formatter(f'%(asctime)s - %(levelname)s - [{name}] %(message)s')
+    file_handler = logging.FileHandler(os.path.join(log_dir, f"{name}.log"), encoding='utf-8')
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+def section_audio_stats(section_folder):
+    """統計篇章資料夾內的 mp3 數量與總時長；audio_info.txt 的紀錄與檔案目前的大小、修改時間相符時直接使用記錄的時長。"""
+    total_files = 0
+    total_duration = 0.0
+    for dirpath, dirnames, filenames in os.walk(section_folder):
+        mp3_files = [f for f in filenames if f.lower().endswith('.mp3')]
+        if not mp3_files:
+            continue
+        recorded = load_audio_info(os.path.join(os.path.dirname(dirpath), INFO_FILE_NAME))
+        for fname in mp3_files:
+            total_files += 1
+            fpath = os.path.join(dirpath, fname)
+            duration = recorded_duration(recorded, fpath)
+            if duration is not None:
+                total_duration += duration
+                continue
             try:
-                logging.info(f"開始爬取 {name}")
-                driver.get(config['url'])
-                time.sleep(2)
-                ok, main_lang, dialect = select_language(driver, LANG_CONFIG)
-                if not ok:
-                    logging.error("選擇語言失敗，程式終止")
-                    return
-                # 不要再呼叫 create_base_folders
-                config['func'](driver, main_lang, dialect, config['folder'])
-                logging.info(f"完成爬取 {name}")
+                total_duration += MP3(fpath).info.length
             except Exception as e:
-                logging.error(f"爬取 {name} 時出錯：{e}")
-                continue
-                
+                logging.warning(f"無法讀取音檔時長 {fpath}: {e}")
+    return total_files, total_duration
+
+def skip_reason(name, config, lang_config):
+    """篇章不支援這個方言時回傳略過的原因（寫進合併報告），否則回傳 None。"""
+    dialects = config.get('dialects')
+    if dialects is not None and lang_config["dialect"] not in dialects:
+        return f"{name} 只支援 {'、'.join(sorted(dialects))}"
+    return None
+
+def job_result(lang_config, name, ok, elapsed, skipped=None):
+    """整理單一 (方言, 篇章) 工作的結果，供合併報告使用。
+    skipped 是略過的原因，略過的工作不統計資料夾內的音檔。"""
+    if skipped:
+        files, duration = 0, 0.0
+    else:
+        folder = get_crawlers()[name]['folder']
+        section_folder = os.path.join(lang_config["main_lang"], lang_config["dialect"], folder)
+        files, duration = section_audio_stats(section_folder)
+    return {
+        "main_lang": lang_config["main_lang"],
+        "dialect": lang_config["dialect"],
+        "section": name,
+        "ok": ok,
+        "skipped": skipped,
+        "elapsed": elapsed,
+        "files": files,
+        "duration": duration,
+    }
+
+def run_section_worker(name, lang_config, shm_profile=False, log_dir="logs", workers=1):
+    """平行模式的工作行程：自己開一個 headless 瀏覽器爬取某方言的單一篇章，回傳 job_result()。
+    workers 是同時執行的行程數，用來分攤每個 host 的並行上限。"""
+    setup_worker_logging(f"{lang_config['dialect']}_{name}", log_dir)
+    share_host_limits(workers)
+    start_services(compact_cache=False)
+    start_time = time.time()
+    driver = None
+    ok = False
+    try:
+        headless = name not in HEADED_SECTIONS
+        start = lambda: start_section_driver(name, headless, shm_profile)
+        driver = start()
+        driver, ok = supervise(driver, start, lambda d: crawl_section(d, name, get_crawlers()[name], lang_config))
+    except Exception as e:
+        logging.error(f"爬取 {lang_config['dialect']} {name} 時出錯：{e}")
+    finally:
+        if driver is not None:
+            close_driver(driver)
+        stop_services(os.path.join(log_dir, f"dedupe_report_{lang_config['dialect']}_{name}.txt"))
+    return job_result(lang_config, name, ok, time.time() - start_time)
+
+def run_parallel(lang_configs, workers, shm_profile=False, log_dir="logs"):
+    """把 (方言 × 篇章) 的每個工作分給獨立的瀏覽器行程平行爬取，回傳各工作的結果。"""
+    os.makedirs(log_dir, exist_ok=True)
+    jobs = []
+    results = []
+    for lang_config in lang_configs:
+        for name, config in get_crawlers().items():
+            reason = skip_reason(name, config, lang_config)
+            if reason:
+                logging.info(f"略過 {lang_config['dialect']} {name}：{reason}")
+                results.append(job_result(lang_config, name, False, 0.0, skipped=reason))
+            else:
+                jobs.append((lang_config, name))
+    logging.info(f"平行爬取 {len(lang_configs)} 個方言共 {len(jobs)} 個工作，工作行程數: {workers}，日誌目錄: {log_dir}")
+    # 先在主行程整理快取索引，工作行程只附加紀錄
+    start_services()
+    running = max(1, min(workers, len(jobs)))
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = {pool.submit(run_section_worker, name, lang_config, shm_profile, log_dir, running): (lang_config, name)
+                       for lang_config, name in jobs}
+            for future in as_completed(futures):
+                lang_config, name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.error(f"工作行程 {lang_config['dialect']} {name} 異常結束：{e}")
+                    result = job_result(lang_config, name, False, 0.0)
+                logging.info(f"{result['dialect']} {name} {'完成' if result['ok'] else '失敗'}，"
+                             f"耗時 {result['elapsed']:.1f} 秒，音檔 {result['files']} 個")
+                results.append(result)
+    finally:
+        stop_services()
+    return results
+
+def run_sequential(lang_configs, headless=False, shm_profile=False):
+    """用同一個瀏覽器依序爬取每個方言的每個篇章，回傳各工作的結果。"""
+    driver = setup_driver(headless=headless, shm_profile=shm_profile)
+    headed_driver = None  # headless 模式下給 HEADED_SECTIONS 使用的有畫面瀏覽器
+    start_services()
+    results = []
+    try:
+        for lang_config in lang_configs:
+            logging.info(f"開始爬取方言 {lang_config['main_lang']}/{lang_config['dialect']}")
+            for name, config in get_crawlers().items():
+                reason = skip_reason(name, config, lang_config)
+                if reason:
+                    logging.info(f"略過 {name}：{reason}")
+                    results.append(job_result(lang_config, name, False, 0.0, skipped=reason))
+                    continue
+                start_time = time.time()
+                ok = False
+                try:
+                    crawl = lambda d: crawl_section(d, name, config, lang_config)
+                    if headless and name in HEADED_SECTIONS:
+                        logging.info(f"{name} 需要完整畫面，改用有畫面的瀏覽器")
+                        if headed_driver is None:
+                            headed_driver = setup_driver(shm_profile=shm_profile)
+                        headed_driver, ok = supervise(headed_driver, lambda: setup_driver(shm_profile=shm_profile), crawl)
+                    else:
+                        if headless:
+                            apply_resource_blocking(driver, lean_block_for(name))
+                        # 瀏覽器當掉或卡住時換新的 driver，從進度紀錄繼續
+                        driver, ok = supervise(driver, lambda: start_section_driver(name, headless, shm_profile), crawl)
+                except Exception as e:
+                    logging.error(f"爬取 {name} 時出錯：{e}")
+                results.append(job_result(lang_config, name, ok, time.time() - start_time))
     finally:
-        # 關閉 WebDriver
-        driver.quit()
+        # 關閉 WebDriver（session 已失效時也要繼續關閉另一個瀏覽器與共用服務）
+        close_driver(driver)
+        if headed_driver is not None:
+            close_driver(headed_driver)
+        stop_services()
+    return results
+
+def format_seconds(seconds):
+    """把秒數轉成「X 小時 Y 分 Z 秒」。"""
+    seconds = int(seconds)
+    return f"{seconds // 3600} 小時 {(seconds % 3600) // 60} 分 {seconds % 60} 秒"
+
+def write_matrix_report(results, report_path, elapsed_time):
+    """把所有 (方言, 篇章) 工作的結果寫成一份合併報告。"""
+    lines = [
+        "=== 多方言爬取報告 ===\n",
+        f"時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+        f"總爬取時間: {format_seconds(elapsed_time)}\n",
+        "=" * 50 + "\n",
+    ]
+    by_dialect = {}
+    for result in results:
+        by_dialect.setdefault((result["main_lang"], result["dialect"]), []).append(result)
+    total_files = 0
+    total_duration = 0.0
+    failed = []
+    for (main_lang, dialect), rows in by_dialect.items():
+        files = sum(row["files"] for row in rows)
+        duration = sum(row["duration"] for row in rows)
+        total_files += files
+        total_duration += duration
+        lines.append(f"\n{main_lang}/{dialect}: 音檔 {files} 個，總時長 {format_seconds(duration)}\n")
+        for row in sorted(rows, key=lambda r: r["section"]):
+            if row.get("skipped"):
+                lines.append(f"  {row['section']}: 略過（{row['skipped']}）\n")
+                continue
+            status = "完成" if row["ok"] else "失敗"
+            lines.append(f"  {row['section']}: {status}，音檔 {row['files']} 個，"
+                         f"時長 {row['duration']:.2f} 秒，爬取 {row['elapsed']:.1f} 秒\n")
+            if not row["ok"]:
+                failed.append(f"{main_lang}/{dialect} {row['section']}")
+    lines.append("\n" + "=" * 50 + "\n")
+    lines.append(f"合計: {len(by_dialect)} 個方言，音檔 {total_files} 個，總時長 {format_seconds(total_duration)}\n")
+    if failed:
+        lines.append(f"失敗的工作 ({len(failed)}):\n")
+        lines += [f"  {job}\n" for job in failed]
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    logging.info(f"合併報告已保存至: {report_path}")
+
+def parse_dialect(value):
+    """把「主語言/方言」字串轉成語言設定（argparse 的 type），例如 泰雅語/賽考利克泰雅語。"""
+    main_lang, sep, dialect = value.partition('/')
+    if not sep or not main_lang.strip() or not dialect.strip():
+        raise argparse.ArgumentTypeError(f"方言格式應為 主語言/方言：{value}")
+    return {"main_lang": main_lang.strip(), "dialect": dialect.strip()}
+
+def main(headless=False, shm_profile=False, workers=1, log_dir="logs", lang_configs=None,
+         report_path=MATRIX_REPORT_FILE):
+    """主程式。依序或平行（workers 大於 1）爬取 lang_configs 中每個方言的每個篇章，最後寫出合併報告。"""
+    lang_configs = lang_configs or [DEFAULT_LANG_CONFIG]
+    # 只建立語言和方言資料夾
+    for lang_config in lang_configs:
+        os.makedirs(os.path.join(lang_config["main_lang"], lang_config["dialect"]), exist_ok=True)
+
+    start_time = time.time()
+    if workers > 1:
+        results = run_parallel(lang_configs, workers, shm_profile=shm_profile, log_dir=log_dir)
+    else:
+        results = run_sequential(lang_configs, headless=headless, shm_profile=shm_profile)
+    write_matrix_report(results, report_path, time.time() - start_time)
+
+def parse_args():
+    """解析命令列參數。"""
+    parser = argparse.ArgumentParser(description="klokah 族語音檔爬蟲")
+    parser.add_argument('--headless', action='store_true',
+                        help='使用無頭精簡模式（靜音、封鎖不需要的資源），HEADED_SECTIONS 仍以有畫面模式執行')
+    parser.add_argument('--shm-profile', action='store_true',
+                        help='把 Chrome 設定檔放在 /dev/shm（僅 Linux）')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='平行爬取的瀏覽器行程數，大於 1 時每個篇章各用一個 headless 瀏覽器')
+    parser.add_argument('--log-dir', default='logs',
+                        help='平行模式下每個篇章日誌檔的目錄')
+    parser.add_argument('--dialects', nargs='+', type=parse_dialect, metavar='主語言/方言',
+                        help='要爬取的方言清單，例如 泰雅語/賽考利克泰雅語 排灣語/東排灣語')
+    parser.add_argument('--all-dialects', action='store_true',
+                        help='爬取 LANG_CONFIGS 中的所有方言')
+    parser.add_argument('--capture', choices=CAPTURE_BACKENDS, default='wire',
+                        help='攔截音檔的方式：wire（selenium-wire proxy）或 devtools（Chrome performance log，不經 proxy）')
+    parser.add_argument('--offline-driver', action='store_true',
+                        help='只使用快取或本機的 ChromeDriver，不連網下載')
+    parser.add_argument('--report', default=MATRIX_REPORT_FILE,
+                        help='合併統計報告的路徑')
+    parser.add_argument('--page-source', action='store_true',
+                        help='句型篇每個選項只取一次 page_source 用 BeautifulSoup 解析（只判斷 inline style 的隱藏）')
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    args = parse_args()
+    if args.offline_driver:
+        set_offline()
+    set_capture_backend(args.capture)
+    set_page_source(args.page_source)
+    if args.all_dialects:
+        lang_configs = LANG_CONFIGS
+    elif args.dialects:
+        lang_configs = args.dialects
+    else:
+        lang_configs = None
+    main(headless=args.headless, shm_profile=args.shm_profile, workers=args.workers, log_dir=args.log_dir,
+         lang_configs=lang_configs, report_path=args.report)
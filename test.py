@@ -1,6 +1,7 @@
 import os
 import shutil
 from pathlib import Path
+from crawlers.audio_store import link_or_copy
 
 def find_target_folders(root_dir: Path):
     """尋找所有以 '-10' 結尾的資料夾"""
@@ -10,15 +11,21 @@ def find_target_folders(root_dir: Path):
             target_folders.append(folder)
     return target_folders
 
-def copy_folder_structure(src_folder: Path, dest_folder: Path, record_num: int):
-    """複製資料夾結構並重新命名"""
+def link_audio_or_copy(src, dst):
+    """只有 mp3 用硬連結；label.txt、audio_info.txt、.checkpoint.json 等會被原地修改的檔案一律複製"""
+    if str(src).lower().endswith('.mp3'):
+        return link_or_copy(src, dst)
+    return shutil.copy2(src, dst)
+
+def copy_folder_structure(src_folder: Path, dest_folder: Path, record_num: int, use_links: bool = True):
+    """複製資料夾結構並重新命名（同一磁碟時以硬連結取代複製音檔）"""
     new_folder_name = f"record{record_num}-10"
     dest_path = dest_folder / new_folder_name
 
     if dest_path.exists():
         shutil.rmtree(dest_path)
 
-    shutil.copytree(src_folder, dest_path)
+    shutil.copytree(src_folder, dest_path, copy_function=link_audio_or_copy if use_links else shutil.copy2)
     print(f"已複製 {src_folder} 到 {dest_path}")
     return new_folder_name
 
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Checkpoint 斷點續爬：大輪失敗後繼續下一輪，再重新執行時不應出現重複的 label 或音檔。"""
+
+import os
+from crawlers.checkpoint import Checkpoint
+
+# 每一大輪的句子；第 2 大輪第一次執行時在第 2 句失敗
+ROUNDS = {1: ["a1", "a2"], 2: ["b1", "b2", "b3"], 3: ["c1", "c2"]}
+
+def _crawl(base_folder, fail=None):
+    """仿照 culture / reading_writing 的流程：共用 label.txt 與編號，一大輪一個主題。"""
+    audio_folder = os.path.join(base_folder, "audio")
+    os.makedirs(audio_folder, exist_ok=True)
+    label_txt = os.path.join(base_folder, "label.txt")
+    checkpoint = Checkpoint(base_folder)
+    checkpoint.restore_labels(label_txt)
+    counter = [checkpoint.next_file()]
+    with open(label_txt, "a", encoding="utf-8") as label_file:
+        for round_idx, sentences in ROUNDS.items():
+            round_key = f"第{round_idx}大輪"
+            if checkpoint.is_done(round_key):
+                continue
+            round_ok = True
+            for sentence in sentences:
+                if (round_idx, sentence) == fail:
+                    round_ok = False
+                    continue
+                mp3_name = f"{counter[0]:04d}.mp3"
+                with open(os.path.join(audio_folder, mp3_name), "w", encoding="utf-8") as f:
+                    f.write(sentence)
+                label_file.write(f"{mp3_name}\n{sentence}\nmale\none\n\n")
+                counter[0] += 1
+            label_file.flush()
+            if round_ok:
+                checkpoint.mark_done(round_key, counter[0], label_txt)
+            else:
+                counter[0] = checkpoint.rollback_topic(round_key, label_txt, audio_folder)
+    return label_txt, audio_folder
+
+def _labels(label_txt):
+    with open(label_txt, encoding="utf-8") as f:
+        blocks = [b.split("\n") for b in f.read().strip().split("\n\n") if b]
+    return [(b[0], b[1]) for b in blocks]
+
+def test_failed_round_is_rolled_back_and_recrawled_once(tmp_path):
+    base_folder = str(tmp_path)
+    label_txt, audio_folder = _crawl(base_folder, fail=(2, "b2"))
+
+    # 第 2 大輪被撤回，第 3 大輪接在第 1 大輪之後
+    assert _labels(label_txt) == [("0001.mp3", "a1"), ("0002.mp3", "a2"),
+                                  ("0003.mp3", "c1"), ("0004.mp3", "c2")]
+    assert sorted(os.listdir(audio_folder)) == ["0001.mp3", "0002.mp3", "0003.mp3", "0004.mp3"]
+    assert not Checkpoint(base_folder).is_done("第2大輪")
+
+    # 重新執行：只重抓第 2 大輪，編號接在最後
+    _crawl(base_folder)
+    labels = _labels(label_txt)
+    assert [text for _, text in labels] == ["a1", "a2", "c1", "c2", "b1", "b2", "b3"]
+    assert [name for name, _ in labels] == [f"{i:04d}.mp3" for i in range(1, 8)]
+    for name, text in labels:
+        with open(os.path.join(audio_folder, name), encoding="utf-8") as f:
+            assert f.read() == text
+    assert sorted(os.listdir(audio_folder)) == [name for name, _ in labels]
+    assert all(Checkpoint(base_folder).is_done(f"第{i}大輪") for i in ROUNDS)
+
+def test_rollback_undoes_committed_items_of_failed_topic(tmp_path):
+    """仿照 lima / 圖畫故事：每一項 commit_item，主題中途失敗時整個主題撤回。"""
+    base_folder = str(tmp_path)
+    audio_folder = os.path.join(base_folder, "audio")
+    os.makedirs(audio_folder)
+    label_txt = os.path.join(base_folder, "label.txt")
+
+    def crawl_topic(checkpoint, topic, sentences, counter, fail=None):
+        last_item, counter = checkpoint.start_topic(topic, label_txt, counter, fresh_label=False)
+        for i, sentence in enumerate(sentences, 1):
+            if i <= last_item:
+                continue
+            if sentence == fail:
+                return checkpoint.rollback_topic(topic, label_txt, audio_folder)
+            mp3_name = f"{counter:04d}.mp3"
+            with open(os.path.join(audio_folder, mp3_name), "w", encoding="utf-8") as f:
+                f.write(sentence)
+            with open(label_txt, "a", encoding="utf-8") as f:
+                f.write(f"{mp3_name}\n{sentence}\nmale\none\n\n")
+            counter += 1
+            checkpoint.commit_item(topic, i, counter, label_txt)
+        checkpoint.mark_done(topic, counter, label_txt)
+        return counter
+
+    checkpoint = Checkpoint(base_folder)
+    counter = crawl_topic(checkpoint, "a", ["a1"], 1)
+    counter = crawl_topic(checkpoint, "b", ["b1", "b2", "b3"], counter, fail="b3")
+    counter = crawl_topic(checkpoint, "c", ["c1"], counter)
+    assert [text for _, text in _labels(label_txt)] == ["a1", "c1"]
+
+    checkpoint = Checkpoint(base_folder)
+    assert not checkpoint.is_done("b")
+    crawl_topic(checkpoint, "b", ["b1", "b2", "b3"], checkpoint.next_file())
+    labels = _labels(label_txt)
+    assert [text for _, text in labels] == ["a1", "c1", "b1", "b2", "b3"]
+    assert [name for name, _ in labels] == [f"{i:04d}.mp3" for i in range(1, 6)]
+    assert sorted(os.listdir(audio_folder)) == [name for name, _ in labels]
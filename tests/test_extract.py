@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""extract 的欄位規格要和原本逐一 find_element 的讀法得到相同的資料（以存下來的頁面比對）。"""
+
+import os
+from bs4 import BeautifulSoup
+from crawlers.extract import (DIALOGUE_FIELDS, DIALOGUE_SEASON_SELECTOR,
+                              DIALOGUE_FRAME_SELECTOR, DIALOGUE_ROW_SELECTOR)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def _load(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return BeautifulSoup(f.read(), "html.parser")
+
+def _read(element, spec):
+    """對應 EXTRACT_SCRIPT 的單一欄位讀取（靜態頁面沒有排版，text 以文字內容代替）。"""
+    selector, source = spec[0], spec[1]
+    node = element.select_one(selector) if selector else element
+    if node is None:
+        return None
+    if source.startswith("@"):
+        return node.get(source[1:])
+    return node.get_text().strip()
+
+def _extract_grouped(soup, group_selector, selector, fields, scope=None):
+    """對應 extract_grouped：每組先取第一個 scope，再讀所有 selector。"""
+    groups = []
+    for group in soup.select(group_selector):
+        base = group.select_one(scope) if scope else group
+        if base is None:
+            groups.append(None)
+            continue
+        groups.append([{name: _read(row, spec) for name, spec in fields.items()}
+                       for row in base.select(selector)])
+    return groups
+
+def _old_dialogue_rows(soup):
+    """原本 crawl_dialogue_texts 的讀法：第一個 frame-inner → 所有 div.section → 直接子 div。"""
+    groups = []
+    for season_div in soup.select("div.dia-season-div[style*='display: block']"):
+        frame_inner = season_div.select_one("div[class^='dia-frame-'][class$='-inner']")
+        rows = []
+        for section in frame_inner.select("div.section"):
+            for item in section.find_all("div", recursive=False):
+                rows.append({
+                    "num": item.select_one(".dia-num").get_text().strip(),
+                    "ab": item.select_one(".dia-show-ab").get_text().strip(),
+                    "ch": item.select_one(".dia-show-ch").get_text().strip(),
+                    "data_value": item.select_one(".dia-sound").get("data-value"),
+                })
+        groups.append(rows)
+    return groups
+
+def test_dialogue_rows_match_old_extraction():
+    soup = _load("dialogue_page.html")
+    new = _extract_grouped(soup, DIALOGUE_SEASON_SELECTOR, DIALOGUE_ROW_SELECTOR, DIALOGUE_FIELDS,
+                           scope=DIALOGUE_FRAME_SELECTOR)
+    assert new == _old_dialogue_rows(soup)
+    # 隱藏的重複 frame 與隱藏的學習季都不會多出對話
+    assert [row["data_value"] for row in new[0]] == ["d-2", "d-1", "d-3"]
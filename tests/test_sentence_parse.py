@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""句型篇 page_source 模式（parse_entries）要和 WebDriver 模式（collect_entries）寫出相同的 label。"""
+
+import os
+from crawlers.sentence_parse import parse_entries
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def _parse(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return parse_entries(f.read())
+
+def test_parts_match_webdriver_rows():
+    # collect_entries 在瀏覽器中讀到的結果：WebElement.text 合併連續空白、不含隱藏的 span，
+    # 隱藏的 partB、沒有音檔的 partC 與沒有羅馬拼音的區塊都不寫入
+    audio = "https://web.klokah.tw/extension/sp_junior/sound/1-A.mp3"
+    assert _parse("sentence_parts.html") == [
+        ("你是誰？(Nanu sun?)", audio),
+        ("我是Kui。(Ti Kui aken. Kui)", audio),
+    ]
+
+def test_page_without_parts_matches_webdriver_rows():
+    assert _parse("sentence_page.html") == [
+        ("有哥哥。(Maisu  a kaka. Maisu ita.)", "https://web.klokah.tw/extension/sp_senior/sound/2.mp3"),
+    ]